@@ -1,88 +1,306 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+if __name__ == '__main__':
+    # `python app/app.py` runs the dev server through app/serve.py. Password pool children
+    # (multiprocessing spawn) re-import the __main__ script, and that must be the small
+    # serve.py rather than this module, or every child would redo the whole app setup.
+    import os
+    import sys
+    os.environ['SERVE_MODE'] = 'dev'
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')])
+
+from startup import StartupTimer
+
+# Startup phases are timed from here; /readyz answers 503 until warm() has preloaded the hot data
+startup = StartupTimer()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import atexit
 import os
-import json
-from werkzeug.security import check_password_hash
+import io
+import logging
+import threading
+from datetime import datetime
+from docs_index import DocsIndex
+import search_index
+from user_store import UserStore, UserStoreError
+from password_pool import PasswordVerifier, PoolSaturated
+from login_throttle import LoginThrottle
+from submission_store import SubmissionStore
+from http_cache import ResponseCache
+from jinja2 import FileSystemBytecodeCache
+import prerender
+from static_pipeline import StaticAssets
+from image_pipeline import ResponsiveImages
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry, RequestMetrics
+from structured_log import StructuredLogging
+from openapi_validation import OpenAPIValidator
+
+startup.mark('imports')
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'appworld-2026-secret-key')
 
-# Module 3: Demo form submissions stored in memory
-contact_submissions = []
+# Prometheus metrics at /metrics, aggregated across gunicorn workers (prometheus_client multiprocess mode)
+metrics_registry = MetricsRegistry.from_env()
+request_metrics = RequestMetrics(metrics_registry)
+if os.environ.get('METRICS_ENABLED', 'True') == 'True':
+    request_metrics.init_app(app)
+
+# On-demand profiling of sampled requests (PROFILE_ENABLED) or ones sending X-Profile-Token (PROFILE_TOKEN).
+# Not imported or installed at all when both are unset.
+request_profiler = None
+if os.environ.get('PROFILE_ENABLED', 'False') == 'True' or os.environ.get('PROFILE_TOKEN'):
+    from request_profiler import RequestProfiler
+    request_profiler = RequestProfiler.from_env()
+    request_profiler.init_app(app)
+
+# JSON-lines logging for the lab.* loggers: sampled, rate-capped and redacted, written off the
+# request thread. Installed last so every request (and log line) gets its X-Request-ID first.
+structured_logging = StructuredLogging.from_env()
+structured_logging.init_app(app)
+log = logging.getLogger('lab.app')
+contact_log = logging.getLogger('lab.contact')
+
+# Behind the F5 XC load balancer every connection comes from the LB, so take the client IP from the
+# X-Forwarded-For entries its TRUSTED_PROXY_HOPS proxies appended (0 = not behind a proxy, header ignored)
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+# Module 3: Demo form submissions, recent ones in memory and batched to an append-only JSONL file
+CONTACT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'contact_submissions.jsonl')
+contact_submissions = SubmissionStore.from_env(CONTACT_STORE_PATH)
+# The writer is a daemon thread: write out queued submissions when the process exits
+atexit.register(contact_submissions.close)
+
+# Conditional GET + Cache-Control for pages and read-only APIs (see http_cache.py)
+response_cache = ResponseCache()
+
+# Logged-in-only APIs answer anonymous requests with 401 before request validation runs,
+# so a bad parameter from a caller without a session is still a 401, not a 400
+LOGIN_REQUIRED_ENDPOINTS = {'api_contact_submissions'}
+
+@app.before_request
+def require_login():
+    if request.endpoint in LOGIN_REQUIRED_ENDPOINTS and not session.get('user'):
+        return jsonify({"error": "Login required"}), 401
+
+# /api/* requests are checked against openapi/openapi.json before the view runs (400 on mismatch);
+# OPENAPI_VALIDATE_RESPONSES=True also checks responses when testing
+api_validator = OpenAPIValidator.from_env()
+api_validator.init_app(app)
+
+# Module 3: Flat-file users, parsed once and reloaded when the file changes (or on SIGHUP)
+USERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'users.json')
+user_store = UserStore(USERS_PATH)
+user_store.install_sighup_handler()
 
 def load_users():
-    """Load users from flat file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, 'data', 'users.json')
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    """Return the cached username -> password hash mapping."""
+    with request_metrics.timed('load_users'):
+        return user_store.users()
+
+# Module 3: PBKDF2 verification runs in a bounded process pool, off the request threads
+password_verifier = PasswordVerifier.from_env()
+
+# Intentional lab weakness: no login rate limiting unless LOGIN_THROTTLE_ENABLED=True.
+# When enabled, attempts are throttled per client IP and username before any hash work.
+login_throttle = LoginThrottle.from_env() if os.environ.get('LOGIN_THROTTLE_ENABLED', 'False') == 'True' else None
+
+startup.mark('app')
+
+# Module 3: Section index over docs/Vibe-Coding.txt, parsed once and reloaded on change.
+# If app.py is in /app/app.py, then docs is at /docs/Vibe-Coding.txt
+# So from app/app.py, it's ../docs/Vibe-Coding.txt
+VIBE_DOC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docs', 'Vibe-Coding.txt')
+vibe_index = DocsIndex(VIBE_DOC_PATH)
+
+VIBE_TOPICS = {
+    'definition': "Definition and History",
+    'ai-assisted': "Popular Tools and Platforms for Vibe Coding",
+}
+
+VIBE_FALLBACK = "AI-generated synthesis (no direct quote)."
 
 def get_vibe_content(topic):
-    """Utility to parse docs/Vibe-Coding.txt and return content for a topic."""
-    # Adjusted path for local development vs container structure
-    # If app.py is in /app/app.py, then docs is at /docs/Vibe-Coding.txt
-    # So from app/app.py, it's ../docs/Vibe-Coding.txt
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, '..', 'docs', 'Vibe-Coding.txt')
-    
-    # Debug: print the path being tried
-    # print(f"DEBUG: Looking for file at {file_path}")
-    
-    try:
-        # Using errors='replace' to handle potential non-UTF-8 characters in the lab doc
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
-            
-        if topic == 'definition':
-            # Extract Definition and History section
-            start = content.find("Definition and History")
-            end = content.find("Benefits of Vibe Coding")
-            if start != -1 and end != -1:
-                return content[start:end].strip()
-        elif topic == 'ai-assisted':
-            # Extract something related to AI assisted coding or tools
-            start = content.find("Popular Tools and Platforms for Vibe Coding")
-            end = content.find("Best Practices for Safe and Effective Vibe Coding")
-            if start != -1 and end != -1:
-                return content[start:end].strip()
-    except Exception as e:
-        # print(f"DEBUG: Error reading file: {e}")
-        pass
-    
-    return "AI-generated synthesis (no direct quote)."
+    """Utility to return the docs/Vibe-Coding.txt section for a topic."""
+    with request_metrics.timed('get_vibe_content'):
+        heading = VIBE_TOPICS.get(topic)
+        content = vibe_index.section(heading) if heading else None
+        return content or VIBE_FALLBACK
+
+def vibe_docs_version():
+    """Cache version for doc-backed routes; refreshes first, since cache hits never run the view."""
+    vibe_index.refresh()
+    return vibe_index.version
+
+# Prebuilt JSON bodies for the doc-backed endpoints, keyed by topic and index version
+_vibe_payloads = {}
+
+def vibe_json_response(topic, title):
+    """Serve the JSON body for a doc topic, encoding it only once per document version."""
+    vibe_index.refresh()
+    cached = _vibe_payloads.get(topic)
+    if cached is None or cached[0] != vibe_index.version:
+        content = get_vibe_content(topic)
+        body = app.json.dumps({
+            "topic": title,
+            "content": content,
+            "source": "docs/Vibe-Coding.txt" if content != VIBE_FALLBACK else "None"
+        }).encode('utf-8') + b"\n"
+        cached = (vibe_index.version, body)
+        _vibe_payloads[topic] = cached
+    return app.response_class(cached[1], mimetype='application/json')
+
+# Module 3: Full-text search over the docs, loaded from disk (or built) by warm() or on first use
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', search_index.DEFAULT_INDEX_PATH)
+_search = {"version": None, "index": None}
+
+def get_search_index():
+    """Return the search index, rebuilding it if the docs changed on disk."""
+    vibe_index.refresh()
+    if _search["index"] is None:
+        _search["index"] = search_index.load_or_build(vibe_index, SEARCH_INDEX_PATH)
+        _search["version"] = vibe_index.version
+    elif _search["version"] != vibe_index.version:
+        _search["index"] = search_index.SearchIndex.build(vibe_index.sections)
+        _search["version"] = vibe_index.version
+    return _search["index"]
+
+def warm():
+    """Preload hot data and compile templates, then report ready (called by app/serve.py)."""
+    with startup.phase('preload'):
+        user_store.refresh(force=True)
+        vibe_index.refresh(force=True)
+        get_search_index()
+        if contact_submissions.index is not None:
+            contact_submissions.index.catch_up()
+        for topic in VIBE_TOPICS:
+            get_vibe_content(topic)
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    startup.complete('preload')
+
+def start_worker():
+    """Per-worker startup (gunicorn post_worker_init): re-arm SIGHUP and spawn the password pool.
+
+    The pool takes a few hundred milliseconds to spawn, so it starts in the
+    background: /healthz answers at once and /readyz waits for the pool.
+    """
+    user_store.install_sighup_handler()
+    startup.require('password_pool')
+
+    def start_pool():
+        try:
+            with startup.phase('password_pool'):
+                password_verifier.start()
+        except Exception as e:
+            log.warning("password pool did not start ahead of the first login", extra={"fields": {"error": str(e)}})
+        finally:
+            startup.complete('password_pool')
+
+    threading.Thread(target=start_pool, name='password-pool-start', daemon=True).start()
+
+startup.mark('data')
 
 # Intentional security weakness: Debug mode enabled for "lab-only visibility"
 # In a real app, this would be False in production.
 app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'True') == 'True'
 
+# Content-hashed, precompressed static assets built by app/static_pipeline.py
+static_assets = StaticAssets()
+static_assets.init_app(app)
+
+# srcset/sizes markup for image derivatives built by app/image_pipeline.py
+responsive_images = ResponsiveImages()
+responsive_images.init_app(app)
+
+# Persistent Jinja bytecode cache so cold workers skip compiling the dynamic templates
+JINJA_BYTECODE_DIR = os.environ.get('JINJA_BYTECODE_DIR', prerender.DEFAULT_BYTECODE_DIR)
+if JINJA_BYTECODE_DIR:
+    try:
+        os.makedirs(JINJA_BYTECODE_DIR, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_BYTECODE_DIR)
+    except OSError:
+        pass
+
+# Pages prerendered at build time by app/prerender.py (skipped in debug, where templates auto-reload)
+if app.config['DEBUG']:
+    prerendered = prerender.PrerenderedPages()
+else:
+    prerendered = prerender.PrerenderedPages.load(
+        os.environ.get('PRERENDER_DIR', prerender.DEFAULT_OUTPUT_DIR),
+        os.path.join(app.root_path, app.template_folder))
+
+startup.mark('templates')
+
+def render_page(endpoint, template):
+    """Serve a prerendered page variant from memory, falling back to Jinja."""
+    body = prerendered.render(endpoint, session.get('user'))
+    if body is not None:
+        return app.response_class(body, mimetype='text/html')
+    return render_template(template)
+
 @app.route('/')
+@response_cache.cached(per_user=True)
 def home():
     """Home page: Overview of the Vibe Coding experiment."""
-    return render_template('home.html')
+    return render_page('home', 'home.html')
 
 @app.route('/about')
+@response_cache.cached(per_user=True)
 def about():
     """About page: Why this application exists for AppWorld 2026."""
-    return render_template('about.html')
+    return render_page('about', 'about.html')
 
 @app.route('/docs')
+@response_cache.cached(per_user=True)
 def docs():
     """Docs page: Educational content on Vibe Coding with citations."""
-    return render_template('docs.html')
+    return render_page('docs', 'docs.html')
 
 @app.route('/healthz')
 def healthz():
     """Simple health endpoint returning 200, plain text."""
     return "OK", 200
 
+@app.route('/readyz')
+def readyz():
+    """Readiness endpoint: 200 once startup preloading is done, 503 (with what is pending) before."""
+    if 'preload' not in startup.begun:
+        warm()  # started without app/serve.py (flask run, tests): warm on the first probe
+    return jsonify(startup.report()), 200 if startup.ready else 503
+
 @app.route('/alive')
+@response_cache.cached(max_age=0, s_maxage=0)
 def alive():
     """Simple alive endpoint returning alive.html content."""
     return render_template('alive.html')
 
+@app.route('/internal/password-pool')
+def password_pool_stats():
+    """Password verification pool queue depth and latency, for capacity sizing."""
+    return jsonify(password_verifier.stats())
+
+@app.route('/internal/login-throttle')
+def login_throttle_stats():
+    """Allowed/rejected login attempt counters, shared across workers."""
+    if login_throttle is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(enabled=True, **login_throttle.stats()))
+
+@app.route('/internal/logging')
+def logging_stats():
+    """Log records written, dropped, sampled out and rate limited in this worker."""
+    return jsonify(structured_logging.stats())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, summed over every worker process."""
+    return app.response_class(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/status')
+@response_cache.cached()
 def api_status():
     """Module 3: API Status endpoint."""
     return jsonify({
@@ -93,23 +311,97 @@ def api_status():
     })
 
 @app.route('/api/vibe-coding')
+@response_cache.cached(version=vibe_docs_version)
 def api_vibe_coding():
     """Module 3: Get Vibe Coding definition."""
-    content = get_vibe_content('definition')
-    return jsonify({
-        "topic": "Vibe Coding Definition",
-        "content": content,
-        "source": "docs/Vibe-Coding.txt" if "AI-generated" not in content else "None"
-    })
+    return vibe_json_response('definition', "Vibe Coding Definition")
 
 @app.route('/api/ai-assisted-coding')
+@response_cache.cached(version=vibe_docs_version)
 def api_ai_assisted_coding():
     """Module 3: Get AI-assisted coding tools/info."""
-    content = get_vibe_content('ai-assisted')
+    return vibe_json_response('ai-assisted', "AI-Assisted Coding Tools")
+
+@app.route('/api/search')
+@response_cache.cached(version=vibe_docs_version)
+def api_search():
+    """Module 3: Ranked full-text search over the Vibe Coding docs."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required"}), 400
+    # limit is an integer in 1..50: openapi/openapi.json rejects anything else before the view runs
+    limit = int(request.args.get('limit', 10))
+    results = get_search_index().query(query, limit)
     return jsonify({
-        "topic": "AI-Assisted Coding Tools",
-        "content": content,
-        "source": "docs/Vibe-Coding.txt" if "AI-generated" not in content else "None"
+        "query": query,
+        "count": len(results),
+        "results": results
+    })
+
+CONTACT_EXPORT_FIELDS = ["id", "submitted_at", "first_name", "last_name", "email", "message"]
+
+def parse_time_arg(name):
+    """Parse an epoch-seconds or ISO 8601 query parameter; raises ValueError."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def encode_cursor(key):
+    return f"{key[0]!r}_{key[1]}" if key else None
+
+def decode_cursor(value):
+    ts, seq = value.rsplit('_', 1)
+    return (float(ts), int(seq))
+
+def export_csv(records):
+    import csv  # only needed by the rarely used CSV export
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CONTACT_EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(record)
+    yield buffer.getvalue()
+
+@app.route('/api/contact-submissions')
+def api_contact_submissions():
+    """Module 3: Page through or export stored contact submissions (logged-in users only, see require_login)."""
+    index = contact_submissions.index
+    if index is None:
+        return jsonify({"error": "Contact submissions are not persisted (CONTACT_STORE_PATH is empty)"}), 503
+    try:
+        since = parse_time_arg('since')
+        until = parse_time_arg('until')
+        limit = int(request.args.get('limit', 50))  # 1..500, checked against the OpenAPI spec
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"error": "Invalid since, until, limit or cursor parameter"}), 400
+    email = request.args.get('email') or None
+    export_format = request.args.get('format', 'json')
+
+    if export_format == 'ndjson':
+        records = index.iter_records(email, since, until)
+        body = (app.json.dumps(record) + "\n" for record in records)
+        return app.response_class(stream_with_context(body), mimetype='application/x-ndjson')
+    if export_format == 'csv':
+        records = index.iter_records(email, since, until)
+        response = app.response_class(stream_with_context(export_csv(records)), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename="contact-submissions.csv"'
+        return response
+    if export_format != 'json':
+        return jsonify({"error": "format must be one of json, ndjson, csv"}), 400
+
+    records, last_key = index.page(email, since, until, after, limit)
+    return jsonify({
+        "items": records,
+        "count": len(records),
+        "next_cursor": encode_cursor(last_key)
     })
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -119,9 +411,28 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        users = load_users()
+        if login_throttle is not None:
+            allowed, retry_after = login_throttle.check(request.remote_addr, username)
+            if not allowed:
+                response = app.make_response((render_template('login.html', error="Too many login attempts, please retry later"), 429))
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+        
+        try:
+            with request_metrics.timed('load_users'):
+                stored_hash = user_store.get(username)
+        except UserStoreError:
+            return render_template('login.html', error="Login is temporarily unavailable, please try again"), 503
+        
+        try:
+            with request_metrics.timed('password_verify'):
+                valid = bool(stored_hash) and password_verifier.verify(stored_hash, password or "")
+        except PoolSaturated as e:
+            response = app.make_response((render_template('login.html', error="Too many login attempts in progress, please retry shortly"), 503))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         
-        if username in users and check_password_hash(users[username], password):
+        if valid:
             session['user'] = username
             return redirect(url_for('home'))
         
@@ -148,15 +459,21 @@ def contact():
         if not first_name or not last_name or not email:
             return render_template('contact.html', error="Please fill in all required fields")
         
-        # In-memory storage and logging
+        # Ring buffer + background persistence, and a redacted log line
         submission = {
             "first_name": first_name,
             "last_name": last_name,
             "email": email,
             "message": message
         }
-        contact_submissions.append(submission)
-        print(f"CONTACT SUBMISSION: {submission}")
+        persisted = contact_submissions.add(submission)
+        contact_log.info("contact submission", extra={"fields": {
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "message_chars": len(message or ""),
+            "persisted": persisted,
+        }})
         
         return render_template('contact.html', success=True, first_name=first_name)
     
@@ -168,9 +485,4 @@ def page_not_found(e):
     # This might leak internal info in a real scenario
     return render_template('404.html', error=str(e)), 404
 
-if __name__ == '__main__':
-    # Binding to 0.0.0.0 for container compatibility
-    # Using port 5001 for local host testing as requested in prompt instructions
-    # (Container still exposes 5000 internally)
-    port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port, debug=app.config['DEBUG'])
+startup.mark('routes')
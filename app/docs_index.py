@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+
+def is_heading(line):
+    """Headings in the lab doc are short standalone lines without sentence punctuation."""
+    line = line.strip()
+    if not line or len(line) >= 80:
+        return False
+    if line.endswith('.') or line[0].isdigit():
+        return False
+    return True
+
+
+class DocsIndex:
+    """In-memory section index over a plain-text document.
+
+    The file is read and split into sections once; afterwards it is only
+    re-read when its mtime or size changes. Each reload bumps ``version`` so
+    callers can cache anything derived from the sections.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.text = ""
+        self.sections = {}
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _parse(self, text):
+        """Map each heading to the section text that follows it, heading included."""
+        sections = {}
+        heading = None
+        start = 0
+        pos = 0
+        for line in text.splitlines(keepends=True):
+            if is_heading(line):
+                if heading is not None:
+                    sections.setdefault(heading, text[start:pos].strip())
+                heading = line.strip()
+                start = pos
+            pos += len(line)
+        if heading is not None:
+            sections.setdefault(heading, text[start:pos].strip())
+        return sections
+
+    def refresh(self, force=False):
+        """Reload the document if it changed on disk. Returns True on reload."""
+        now = time.monotonic()
+        if not force and self._stamp is not None and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            stamp = self._stat()
+            if not force and stamp == self._stamp:
+                return False
+            text = ""
+            if stamp is not None:
+                try:
+                    # Using errors='replace' to handle non-UTF-8 characters in the lab doc
+                    with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                        text = f.read()
+                except OSError:
+                    stamp = None
+            self.text = text
+            self.sections = self._parse(text)
+            self._stamp = stamp
+            self.version += 1
+            return True
+
+    def section(self, heading):
+        """Return the text of a section, or None if the heading is absent."""
+        self.refresh()
+        return self.sections.get(heading)
+
+    def headings(self):
+        self.refresh()
+        return list(self.sections)
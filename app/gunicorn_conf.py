@@ -0,0 +1,98 @@
+"""Gunicorn settings for serving the lab app (used by app/serve.py).
+
+Worker and thread counts are sized from the CPUs actually available to the
+container (cgroup quota, then CPU affinity), and can be overridden with
+WEB_CONCURRENCY / GUNICORN_THREADS. SERVE_MODE picks the worker class:
+
+    gthread - threaded sync workers (default)
+    async   - gevent workers, falls back to gthread if gevent is missing
+"""
+
+import importlib.util
+import logging
+import math
+import os
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = logging.getLogger('lab.gunicorn_conf')
+
+
+def available_cpus():
+    """CPUs this process may use, honoring a cgroup CPU quota when one is set."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_worker_class(mode):
+    if mode == 'async':
+        if importlib.util.find_spec('gevent') is not None:
+            return 'gevent'
+        log.warning("SERVE_MODE=async requires gevent; falling back to gthread workers")
+    return 'gthread'
+
+
+cpus = available_cpus()
+serve_mode = os.environ.get('SERVE_MODE', 'gthread')
+
+chdir = APP_DIR
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+worker_class = resolve_worker_class(serve_mode)
+# PBKDF2 runs in the password pool, so request workers are mostly I/O bound
+workers = int(os.environ.get('WEB_CONCURRENCY', cpus + 1 if worker_class == 'gthread' else cpus))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Import the app and warm its caches once in the master; workers fork warm
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def when_ready(server):
+    server.log.info("Serving in %s mode: %d %s workers x %d threads (%d CPUs available)",
+                    serve_mode, workers, worker_class, threads, cpus)
+
+
+def post_worker_init(worker):
+    # Gunicorn resets worker signal handlers on boot, so re-arm SIGHUP reloads;
+    # the per-worker password pool spawns in the background and gates /readyz.
+    import app as app_module
+    app_module.start_worker()
+
+
+def worker_exit(server, worker):
+    # Runs in the exiting worker (max_requests recycling, SIGTERM on redeploy):
+    # queued contact submissions are written before the process goes away
+    import app as app_module
+    app_module.contact_submissions.close()
+
+
+def child_exit(server, worker):
+    # Runs in the master: drop the exited worker's in-flight gauge files, so
+    # live-process gauges stop counting it (its counters stay in the totals)
+    import app as app_module
+    app_module.metrics_registry.mark_process_dead(worker.pid)
@@ -0,0 +1,115 @@
+import collections
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app, make_response, request, session
+from werkzeug.http import http_date
+
+
+class ResponseCache:
+    """Per-route response cache with strong ETags and conditional GET.
+
+    A view decorated with ``cache.cached(...)`` is rendered once per content
+    version and variant; later requests are served from memory, and a
+    matching If-None-Match / If-Modified-Since gets a 304 without running
+    the view at all. Routes whose output depends on ``session['user']`` are
+    cached per user and marked private so shared caches never store them.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, max_age=60, s_maxage=300, per_user=False, version=None):
+        """Decorator applying a caching policy to a GET view.
+
+        ``version`` is a callable returning the current content version; when
+        it changes the cached body and its ETag are rebuilt. It defaults to
+        ``templates_version``.
+        """
+        version = version or templates_version
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+                user = session.get('user') if per_user else None
+                key = (request.endpoint, request.query_string, user)
+                current = version()
+                entry = self._get(key)
+                if entry is None or entry[0] != current:
+                    self.misses += 1
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    etag = hashlib.sha256(body).hexdigest()[:32]
+                    entry = (current, etag, time.time(), body, response.mimetype)
+                    self._put(key, entry)
+                else:
+                    self.hits += 1
+                _, etag, built_at, body, mimetype = entry
+
+                if request.if_none_match:
+                    fresh = request.if_none_match.contains(etag)
+                else:
+                    fresh = request.if_modified_since is not None and int(built_at) <= request.if_modified_since.timestamp()
+                if fresh:
+                    self.not_modified += 1
+                    response = current_app.response_class(status=304)
+                else:
+                    response = current_app.response_class(body, mimetype=mimetype)
+                response.set_etag(etag)
+                response.headers['Last-Modified'] = http_date(int(built_at))
+                if user is not None:
+                    response.headers['Cache-Control'] = "private, max-age=0, must-revalidate"
+                else:
+                    response.headers['Cache-Control'] = f"public, max-age={max_age}, s-maxage={s_maxage}"
+                    response.headers['Surrogate-Control'] = f"max-age={s_maxage}"
+                if per_user:
+                    response.vary.add('Cookie')
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+def templates_version():
+    """Content version for template-rendered pages.
+
+    Templates are fixed for the life of a production process, so this is a
+    constant there; with template auto-reload (debug) it follows the newest
+    template mtime so edits invalidate cached pages.
+    """
+    if not (current_app.debug or current_app.config.get('TEMPLATES_AUTO_RELOAD')):
+        return 0
+    folder = os.path.join(current_app.root_path, current_app.template_folder)
+    return max((entry.stat().st_mtime_ns for entry in os.scandir(folder) if entry.is_file()), default=0)
@@ -0,0 +1,209 @@
+"""Responsive image derivatives for the raster images the templates use.
+
+The build step resizes each PNG/JPEG/WebP source in app/static/images that
+a template references to a set of widths in
+AVIF and WebP, caching the results in app/static/dist/img under names that
+include a hash of the source and of the encoder settings (widths,
+quality), so a derivative is only regenerated when either changes. ResponsiveImages exposes a ``responsive_image`` template
+helper that emits <picture> markup with srcset/sizes, and falls back to a
+plain <img> when no derivatives were built (for example without Pillow).
+Pillow is a build-only dependency (requirements-build.txt): the Dockerfile
+runs the build in its assets stage and ships only the derivatives.
+
+Usage:
+    python app/image_pipeline.py build
+    python app/image_pipeline.py report
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from flask import url_for
+from markupsafe import Markup, escape
+
+
+def load_pillow():
+    """Import Pillow on first use, so serving never pays for it; (None, None) if not installed."""
+    try:
+        from PIL import Image, features
+    except ImportError:  # optional: without Pillow templates keep the original images
+        return None, None
+    return Image, features
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+TEMPLATE_DIR = os.path.join(APP_DIR, 'templates')
+OUTPUT_SUBDIR = 'dist/img'
+MANIFEST = 'dist/images.json'
+
+SOURCE_DIR = 'images'
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+WIDTHS = (480, 768, 1280, 1920)
+QUALITY = {'avif': 50, 'webp': 75}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def available_formats():
+    Image, features = load_pillow()
+    if Image is None:
+        return []
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+IMAGE_REF_RE = re.compile(r"""(?:responsive_image\(|filename=)\s*['"](images/[^'"]+)['"]""")
+
+
+def template_images(template_dir=TEMPLATE_DIR):
+    """Image paths (relative to static/) referenced by each template, as {template: [paths]}."""
+    refs = {}
+    for name in sorted(os.listdir(template_dir)) if os.path.isdir(template_dir) else []:
+        with open(os.path.join(template_dir, name)) as f:
+            found = IMAGE_REF_RE.findall(f.read())
+        if found:
+            refs[name] = found
+    return refs
+
+
+def settings_digest(widths, quality):
+    """Encoder settings as bytes, hashed into derivative names so changing them rebuilds."""
+    return json.dumps({"widths": sorted(widths), "quality": quality}, sort_keys=True).encode('utf-8')
+
+
+def build(static_dir=STATIC_DIR, widths=WIDTHS, template_dir=TEMPLATE_DIR, quality=QUALITY):
+    """Generate missing derivatives for referenced images, prune stale ones and write the manifest."""
+    formats = available_formats()
+    Image, _ = load_pillow()
+    out_dir = os.path.join(static_dir, OUTPUT_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    keep = set()
+    used = {ref for refs in template_images(template_dir).values() for ref in refs}
+    settings = settings_digest(widths, quality)
+    source_root = os.path.join(static_dir, SOURCE_DIR)
+    for name in sorted(os.listdir(source_root)) if os.path.isdir(source_root) else []:
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in SOURCE_EXTENSIONS or f"{SOURCE_DIR}/{name}" not in used:
+            continue
+        path = os.path.join(source_root, name)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read() + settings).hexdigest()[:12]
+        entry = {"hash": digest, "size": os.path.getsize(path), "derivatives": {}}
+        if formats:
+            with Image.open(path) as source:
+                source.load()
+                entry["width"], entry["height"] = source.size
+                targets = sorted({w for w in widths if w < source.width} | {source.width})
+                for fmt in formats:
+                    variants = []
+                    for width in targets:
+                        filename = f"{stem}.{digest}.{width}w.{fmt}"
+                        out_path = os.path.join(out_dir, filename)
+                        keep.add(filename)
+                        if not os.path.exists(out_path):
+                            height = round(source.height * width / source.width)
+                            resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+                            resized.save(out_path + ".tmp", format=fmt.upper(), quality=quality[fmt])
+                            os.replace(out_path + ".tmp", out_path)
+                        variants.append([width, f"{OUTPUT_SUBDIR}/{filename}", os.path.getsize(out_path)])
+                    entry["derivatives"][fmt] = variants
+        manifest[f"{SOURCE_DIR}/{name}"] = entry
+    for filename in os.listdir(out_dir):
+        if filename not in keep:
+            os.remove(os.path.join(out_dir, filename))
+    with open(os.path.join(static_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class ResponsiveImages:
+    """Loads the derivative manifest and renders <picture> markup for templates."""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self.images = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.static_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        images = {}
+        for filename, entry in manifest.items():
+            try:
+                if os.path.getsize(os.path.join(self.static_dir, filename)) != entry["size"]:
+                    continue  # source replaced since the build
+            except OSError:
+                continue
+            if entry["derivatives"]:
+                images[filename] = entry
+        self.images = images
+
+    def init_app(self, app):
+        app.add_template_global(self.picture, 'responsive_image')
+
+    def picture(self, filename, alt, sizes='100vw', loading='lazy', **attrs):
+        """<picture> with AVIF/WebP srcsets and the original as the <img> fallback."""
+        img_attrs = {'src': url_for('static', filename=filename), 'alt': alt, 'loading': loading, 'decoding': 'async'}
+        img_attrs.update({key.rstrip('_'): value for key, value in attrs.items()})
+        entry = self.images.get(filename)
+        if entry is None:
+            return Markup("<img {}>").format(Markup(format_attrs(img_attrs)))
+        img_attrs.setdefault('width', entry["width"])
+        img_attrs.setdefault('height', entry["height"])
+        sources = []
+        for fmt in ('avif', 'webp'):
+            variants = entry["derivatives"].get(fmt)
+            if variants:
+                srcset = ", ".join(f"{url_for('static', filename=path)} {width}w" for width, path, _ in variants)
+                sources.append(f'<source type="{MIME_TYPES[fmt]}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">')
+        # display: contents keeps the <img> laid out as if <picture> were not there
+        return Markup('<picture style="display: contents">{}<img {}></picture>'.format(
+            "".join(sources), format_attrs(img_attrs)))
+
+
+def format_attrs(attrs):
+    return " ".join(f'{key}="{escape(value)}"' for key, value in attrs.items())
+
+
+def report(manifest, template_dir=TEMPLATE_DIR, static_dir=STATIC_DIR, viewport_widths=(480, 1280)):
+    """Print image bytes per template before and after, at mobile and desktop widths."""
+    header = f"{'page':<16} {'original':>10}" + "".join(f" {str(w) + 'w':>10}" for w in viewport_widths)
+    print(header)
+    for name, refs in template_images(template_dir).items():
+        before = 0
+        after = [0] * len(viewport_widths)
+        for ref in refs:
+            size = os.path.getsize(os.path.join(static_dir, ref))
+            before += size
+            entry = manifest.get(ref)
+            for i, viewport in enumerate(viewport_widths):
+                best = size
+                if entry:
+                    for variants in entry["derivatives"].values():
+                        fitting = [v for v in variants if v[0] >= viewport] or variants[-1:]
+                        best = min(best, min(v[2] for v in fitting[:1]))
+                after[i] += best
+        print(f"{name:<16} {before:>10}" + "".join(f" {n:>10}" for n in after))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Responsive image pipeline')
+    parser.add_argument('command', choices=['build', 'report'])
+    args = parser.parse_args()
+    if args.command == 'build':
+        if load_pillow()[0] is None:
+            print("WARNING: Pillow is not installed (pip install -r requirements-build.txt); no image derivatives were generated")
+        manifest = build()
+    else:
+        with open(os.path.join(STATIC_DIR, MANIFEST)) as f:
+            manifest = json.load(f)
+    report(manifest)
+
+
+if __name__ == "__main__":
+    main()
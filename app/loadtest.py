@@ -0,0 +1,307 @@
+"""Load-test and benchmark harness with per-route latency percentiles.
+
+A scenario is a JSONL file with one request per line:
+
+    {"name": "home", "method": "GET", "path": "/", "weight": 5, "expect": 200}
+    {"name": "login", "method": "POST", "path": "/login",
+     "form": {"username": "f5user", "password": "f5password"}, "expect": 302}
+
+Optional keys: "headers" (dict), "form" (dict, urlencoded body), "json"
+(body), "weight" (relative frequency, default 1) and "expect" (status code
+or list of codes, default 200). Requests are replayed by N concurrent
+clients either in-process through the Flask test client or against a
+running server (--url). The report has throughput, error count and
+p50/p95/p99 per route, and can be saved as a baseline; comparing a run to
+a baseline flags routes whose p95 grew or throughput fell beyond a
+threshold.
+
+Usage:
+    python app/loadtest.py run [--scenario FILE] [--url URL] [--clients N] [--requests N | --duration S]
+                               [--baseline FILE] [--write-baseline] [--threshold 0.5]
+"""
+
+import argparse
+import atexit
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(APP_DIR, 'benchmarks')
+DEFAULT_SCENARIO = os.path.join(BENCH_DIR, 'default.jsonl')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Latency increases smaller than this are treated as noise, whatever the ratio
+MIN_REGRESSION_MS = 1.0
+
+
+def load_scenario(path):
+    """Parse a JSONL scenario into a list of request dicts."""
+    requests = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}") from e
+            if 'path' not in entry:
+                raise ValueError(f"{path}:{lineno}: every request needs a 'path'")
+            entry.setdefault('method', 'GET')
+            entry.setdefault('name', f"{entry['method']} {entry['path']}")
+            expect = entry.get('expect', 200)
+            entry['expect'] = set(expect if isinstance(expect, list) else [expect])
+            entry['weight'] = float(entry.get('weight', 1))
+            requests.append(entry)
+    if not requests:
+        raise ValueError(f"{path}: scenario is empty")
+    return requests
+
+
+def encode_body(entry):
+    """Return (body bytes or None, extra headers) for a scenario request."""
+    headers = dict(entry.get('headers') or {})
+    if 'form' in entry:
+        headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        return urllib.parse.urlencode(entry['form']).encode('utf-8'), headers
+    if 'json' in entry:
+        headers.setdefault('Content-Type', 'application/json')
+        return json.dumps(entry['json']).encode('utf-8'), headers
+    return None, headers
+
+
+class InProcessClient:
+    """Sends scenario requests through the Flask test client (one per thread)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, entry):
+        body, headers = encode_body(entry)
+        with self.client.open(entry['path'], method=entry['method'], data=body, headers=headers) as response:
+            response.get_data()
+            return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpClient:
+    """Sends scenario requests over one persistent HTTP/1.1 connection."""
+
+    def __init__(self, base_url, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.prefix = parsed.path.rstrip('/')
+        self.connection = connection_class(parsed.hostname, parsed.port, timeout=timeout)
+
+    def send(self, entry):
+        body, headers = encode_body(entry)
+        for attempt in (1, 2):
+            try:
+                self.connection.request(entry['method'], self.prefix + entry['path'], body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # The server may close an idle keep-alive connection; reconnect once
+                self.connection.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        self.connection.close()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.4999)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, elapsed):
+    """Per-route stats from {name: [(seconds, ok), ...]}."""
+    routes = {}
+    for name, entries in sorted(samples.items()):
+        latencies = sorted(seconds for seconds, _ in entries)
+        routes[name] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, ok in entries if not ok),
+            "throughput_rps": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+    return routes
+
+
+def run(scenario, client_factory, clients=4, requests=1000, duration=None, warmup=1, seed=0):
+    """Replay the weighted request mix with ``clients`` threads; returns the report dict.
+
+    Each client first sends every scenario request ``warmup`` times, untimed.
+    The run stops after ``requests`` requests in total, or after ``duration``
+    seconds when that is given.
+    """
+    weights = [entry['weight'] for entry in scenario]
+    samples = {entry['name']: [] for entry in scenario}
+    lock = threading.Lock()
+    remaining = [requests]
+    errors = []
+
+    def take():
+        with lock:
+            if duration is None:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+            return True
+
+    def worker(index, deadline_holder):
+        rng = random.Random(seed + index)
+        client = client_factory()
+        local = []
+        try:
+            for entry in scenario * warmup:
+                client.send(entry)
+            barrier.wait()
+            while take() and (deadline_holder[0] is None or time.perf_counter() < deadline_holder[0]):
+                entry = rng.choices(scenario, weights)[0]
+                start = time.perf_counter()
+                status = client.send(entry)
+                local.append((entry['name'], time.perf_counter() - start, status in entry['expect']))
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+        finally:
+            client.close()
+            with lock:
+                for name, seconds, ok in local:
+                    samples[name].append((seconds, ok))
+
+    deadline = [None]
+    barrier = threading.Barrier(clients + 1)
+    threads = [threading.Thread(target=worker, args=(i, deadline), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    if duration is not None:
+        deadline[0] = started + duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    samples = {name: entries for name, entries in samples.items() if entries}
+    total = sum(len(entries) for entries in samples.values())
+    return {
+        "clients": clients,
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "routes": summarize(samples, elapsed),
+    }
+
+
+def compare(report, baseline, threshold=0.5, min_regression_ms=MIN_REGRESSION_MS):
+    """Return regression messages for routes slower (p95) or lower-throughput than the baseline."""
+    regressions = []
+    for name, base in baseline.get("routes", {}).items():
+        current = report["routes"].get(name)
+        if current is None:
+            continue
+        limit = base["p95_ms"] * (1 + threshold)
+        if current["p95_ms"] > limit and current["p95_ms"] - base["p95_ms"] >= min_regression_ms:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f}ms > {limit:.2f}ms "
+                               f"(baseline {base['p95_ms']:.2f}ms +{threshold:.0%})")
+        floor = base["throughput_rps"] * (1 - threshold)
+        if baseline.get("clients") == report.get("clients") and current["throughput_rps"] < floor:
+            regressions.append(f"{name}: throughput {current['throughput_rps']:.1f}/s < {floor:.1f}/s "
+                               f"(baseline {base['throughput_rps']:.1f}/s -{threshold:.0%})")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} unexpected status codes (baseline {base.get('errors', 0)})")
+    return regressions
+
+
+def print_report(report, stream=None):
+    stream = stream or sys.stdout
+    print(f"{'route':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", file=stream)
+    for name, route in report["routes"].items():
+        print(f"{name:<24} {route['requests']:>9} {route['errors']:>7} {route['throughput_rps']:>9.1f} "
+              f"{route['p50_ms']:>9.2f} {route['p95_ms']:>9.2f} {route['p99_ms']:>9.2f}", file=stream)
+    print(f"{'total':<24} {report['requests']:>9} {'':>7} {report['throughput_rps']:>9.1f}  "
+          f"({report['clients']} clients, {report['elapsed_s']}s)", file=stream)
+
+
+def in_process_factory():
+    # As in the tests: replayed contact submissions and metric files go to a scratch
+    # directory, not app/data, removed when the run ends
+    scratch = tempfile.mkdtemp(prefix='lab-loadtest-')
+    atexit.register(shutil.rmtree, scratch, True)
+    os.environ.setdefault('CONTACT_STORE_PATH', os.path.join(scratch, 'contact_submissions.jsonl'))
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(scratch, 'metrics'))
+    sys.path.insert(0, APP_DIR)
+    from app import app
+    app.config['TESTING'] = True
+    return lambda: InProcessClient(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a request scenario and report latency percentiles')
+    parser.add_argument('command', choices=['run'])
+    parser.add_argument('--scenario', default=DEFAULT_SCENARIO)
+    parser.add_argument('--url', help='Base URL of a running server; omit to run the app in-process')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=2000, help='Total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a request count')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--write-baseline', action='store_true', help='Save this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Allowed p95/throughput change, as a fraction')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    factory = (lambda: HttpClient(args.url)) if args.url else in_process_factory()
+    report = run(scenario, factory, clients=args.clients, requests=args.requests, duration=args.duration)
+    report["target"] = args.url or "in-process"
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote baseline {args.baseline}")
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("target") != report["target"]:
+            print(f"WARNING: baseline was recorded against {baseline.get('target')}, this run is {report['target']}")
+        regressions = compare(report, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import collections
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+HEADER = struct.Struct('<8sQQ')  # magic, allowed, rejected
+SLOT = struct.Struct('<Qdd')     # key hash, tokens, last refill (epoch seconds)
+MAGIC = b'LTHROT01'
+
+
+def key_hash(key):
+    """Stable 64-bit hash, identical in every worker process (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+
+class MemoryBackend:
+    """Per-process bucket state, LRU-bounded to ``max_keys`` entries."""
+
+    def __init__(self, max_keys=65536):
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.rejected = 0
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, tokens
+
+    def counters(self):
+        return self.allowed, self.rejected
+
+
+class MmapBackend:
+    """Bucket state in a memory-mapped file shared by every worker process.
+
+    The file is a small header with allowed/rejected counters followed by a
+    fixed table of direct-mapped slots. A key whose slot is taken by another
+    key simply starts a fresh bucket, which errs on the side of allowing.
+    Updates are serialized with an fcntl lock on the file plus a thread lock.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self._size = HEADER.size + SLOT.size * slots
+        self._map = None
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != self._size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._size)
+            mapped = mmap.mmap(fd, self._size)
+            if mapped[:8] != MAGIC:
+                HEADER.pack_into(mapped, 0, MAGIC, 0, 0)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        self._fd, self._map, self._pid = fd, mapped, os.getpid()
+        return mapped
+
+    def take(self, key, rate, burst, now):
+        h = key_hash(key)
+        offset = HEADER.size + SLOT.size * (h % self.slots)
+        with self._lock:
+            mapped = self._open()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                slot_key, tokens, last = SLOT.unpack_from(mapped, offset)
+                if slot_key != h:
+                    tokens, last = burst, now
+                tokens = min(burst, tokens + max(0.0, now - last) * rate)
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                SLOT.pack_into(mapped, offset, h, tokens, now)
+                magic, n_allowed, n_rejected = HEADER.unpack_from(mapped, 0)
+                if allowed:
+                    n_allowed += 1
+                else:
+                    n_rejected += 1
+                HEADER.pack_into(mapped, 0, magic, n_allowed, n_rejected)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            return allowed, tokens
+
+    def counters(self):
+        with self._lock:
+            _, allowed, rejected = HEADER.unpack_from(self._open(), 0)
+        return allowed, rejected
+
+
+class TokenBucket:
+    """Token bucket limiter: ``rate`` tokens per second up to ``burst`` per key."""
+
+    def __init__(self, rate, burst, backend):
+        self.rate = rate
+        self.burst = burst
+        self.backend = backend
+
+    def take(self, key):
+        """Consume a token for key. Returns (allowed, retry_after_seconds)."""
+        allowed, tokens = self.backend.take(key, self.rate, self.burst, time.time())
+        if allowed:
+            return True, 0
+        return False, max(1, int((1.0 - tokens) / self.rate + 0.999))
+
+    def stats(self):
+        allowed, rejected = self.backend.counters()
+        return {"allowed": allowed, "rejected": rejected, "rate_per_minute": self.rate * 60, "burst": self.burst}
+
+
+class LoginThrottle:
+    """Sheds login attempts per client IP and per username before any hash work."""
+
+    def __init__(self, by_ip, by_username):
+        self.by_ip = by_ip
+        self.by_username = by_username
+
+    @classmethod
+    def from_env(cls):
+        backend = os.environ.get('LOGIN_THROTTLE_BACKEND', 'mmap')
+        state_dir = os.environ.get('LOGIN_THROTTLE_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+
+        def make_backend(name):
+            if backend == 'memory':
+                return MemoryBackend()
+            return MmapBackend(os.path.join(state_dir, f'login-throttle-{name}.bin'))
+
+        ip_rate = float(os.environ.get('LOGIN_THROTTLE_IP_PER_MINUTE', 20))
+        user_rate = float(os.environ.get('LOGIN_THROTTLE_USER_PER_MINUTE', 10))
+        return cls(
+            TokenBucket(ip_rate / 60, float(os.environ.get('LOGIN_THROTTLE_IP_BURST', 10)), make_backend('ip')),
+            TokenBucket(user_rate / 60, float(os.environ.get('LOGIN_THROTTLE_USER_BURST', 5)), make_backend('user')),
+        )
+
+    def check(self, client_ip, username):
+        """Return (allowed, retry_after). The username bucket is only charged if the IP passes."""
+        allowed, retry_after = self.by_ip.take(client_ip or '-')
+        if not allowed:
+            return False, retry_after
+        if username:
+            return self.by_username.take(username.lower())
+        return True, 0
+
+    def stats(self):
+        return {"ip": self.by_ip.stats(), "username": self.by_username.stats()}
@@ -0,0 +1,192 @@
+"""Prometheus metrics shared across gunicorn worker processes.
+
+Built on prometheus_client's multiprocess mode: every process writes its
+samples to its own memory-mapped files in PROMETHEUS_MULTIPROC_DIR, and a
+scrape of /metrics, whichever worker answers it, reads and sums all of them.
+prometheus_client decides on multiprocess mode when it is first imported,
+so this module settles the directory before importing it: when
+PROMETHEUS_MULTIPROC_DIR is unset, a fresh directory under /dev/shm named
+after the creating process. With preload_app that happens once in the
+gunicorn master and forked workers inherit it.
+
+Counters and histograms of exited workers stay in the totals. Gauges such
+as requests in flight only count live processes: the gunicorn child_exit
+hook calls ``mark_process_dead``, which removes that worker's gauge files.
+A default directory is removed when the process that created it exits, and
+one left behind by a process that never ran its atexit hooks (SIGKILL, a
+crash) is removed by the next start.
+"""
+
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from flask import request
+
+DEFAULT_DIR_PREFIX = 'lab-metrics-'
+DEFAULT_DIR_RE = re.compile(re.escape(DEFAULT_DIR_PREFIX) + r'(\d+)-')
+# Files prometheus_client writes per process: counter_<pid>.db, gauge_livesum_<pid>.db, ...
+PROCESS_FILE_RE = re.compile(r'^[a-z_]+_(\d+)\.db$')
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def remove_orphaned_directories(base):
+    """Delete default metrics directories whose creating process is gone."""
+    for name in os.listdir(base):
+        match = DEFAULT_DIR_RE.match(name)
+        if match and not pid_alive(int(match.group(1))):
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+
+def _multiproc_dir():
+    """The multiprocess directory, and the pid that owns it if it is a default one."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        return directory, None
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    remove_orphaned_directories(base)
+    directory = tempfile.mkdtemp(prefix=f'{DEFAULT_DIR_PREFIX}{os.getpid()}-', dir=base)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = directory
+    return directory, os.getpid()
+
+
+MULTIPROC_DIR, _DEFAULT_DIR_OWNER = _multiproc_dir()
+
+# Only after PROMETHEUS_MULTIPROC_DIR is set: the import picks the value backend
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess  # noqa: E402
+from prometheus_client.exposition import CONTENT_TYPE_PLAIN_0_0_4, generate_latest  # noqa: E402
+
+CONTENT_TYPE = CONTENT_TYPE_PLAIN_0_0_4
+ENDPOINT_KEY = 'lab.metrics.endpoint'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Metric factories plus scraping and cleanup for one multiprocess directory.
+
+    Metrics are not registered in prometheus_client's global registry: a
+    scrape builds a fresh registry whose MultiProcessCollector reads every
+    process's files.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def from_env(cls):
+        registry = cls(MULTIPROC_DIR)
+        if _DEFAULT_DIR_OWNER is not None:
+            atexit.register(registry.remove_directory, _DEFAULT_DIR_OWNER)
+        else:
+            registry.remove_stale()
+        return registry
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(name, documentation, labelnames, registry=None)
+
+    def gauge(self, name, documentation, labelnames=()):
+        # livesum: the sum over live processes; dead workers' files go in mark_process_dead
+        return Gauge(name, documentation, labelnames, registry=None, multiprocess_mode='livesum')
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return Histogram(name, documentation, labelnames, registry=None, buckets=buckets)
+
+    def mark_process_dead(self, pid):
+        """Drop the gauges of an exited worker (its counters stay in the totals)."""
+        multiprocess.mark_process_dead(pid, self.directory)
+
+    def remove_stale(self):
+        """Delete files left in a reused PROMETHEUS_MULTIPROC_DIR by processes that are gone."""
+        for name in os.listdir(self.directory):
+            match = PROCESS_FILE_RE.match(name)
+            if match and not pid_alive(int(match.group(1))):
+                os.remove(os.path.join(self.directory, name))
+
+    def remove_directory(self, owner_pid):
+        """Delete a default (temporary) metrics directory; forked workers leave it alone."""
+        if os.getpid() == owner_pid:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def render(self):
+        """All metrics, summed over every process, in the Prometheus text format (0.0.4)."""
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, self.directory)
+        return generate_latest(registry)
+
+
+class RequestMetrics:
+    """Per-endpoint latency, status codes and requests in flight for a Flask app.
+
+    Timing is done by a WSGI middleware, which reads the endpoint that a
+    before_request hook stores in the environ, so a request costs one
+    context-local lookup plus the metric updates.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.requests = registry.counter(
+            'lab_http_requests', 'HTTP requests by endpoint, method and status code.', ('endpoint', 'method', 'status'))
+        self.latency = registry.histogram(
+            'lab_http_request_duration_seconds', 'Time spent handling a request, until the response is returned.',
+            ('endpoint', 'method'))
+        self.in_flight = registry.gauge('lab_http_requests_in_flight', 'Requests currently being handled.')
+        self.operations = registry.histogram(
+            'lab_operation_duration_seconds', 'Time spent in instrumented hot spots.', ('operation',))
+        self._series = {}
+
+    def init_app(self, app):
+        app.before_request_funcs.setdefault(None, []).insert(0, self._tag_endpoint)
+        app.wsgi_app = self.wrap(app.wsgi_app)
+
+    @staticmethod
+    def _tag_endpoint():
+        current = request._get_current_object()
+        current.environ[ENDPOINT_KEY] = current.endpoint
+
+    def wrap(self, wsgi_app):
+        in_flight = self.in_flight
+        record = self._record
+
+        def middleware(environ, start_response):
+            status = ['500']
+
+            def capture_status(code, headers, exc_info=None):
+                status[0] = code[:3]
+                return start_response(code, headers, exc_info)
+
+            in_flight.inc()
+            start = time.perf_counter()
+            try:
+                return wsgi_app(environ, capture_status)
+            finally:
+                record(environ.get(ENDPOINT_KEY) or 'none', environ.get('REQUEST_METHOD', ''), status[0],
+                       time.perf_counter() - start)
+                in_flight.dec()
+        return middleware
+
+    def _record(self, endpoint, method, status, seconds):
+        # Label lookups are cached per series: labels() formats and locks on every call
+        series = self._series.get((endpoint, method, status))
+        if series is None:
+            series = self._series[(endpoint, method, status)] = (
+                self.latency.labels(endpoint, method), self.requests.labels(endpoint, method, status))
+        latency, requests_total = series
+        latency.observe(seconds)
+        requests_total.inc()
+
+    def timed(self, operation):
+        """Context manager observing a hot spot into lab_operation_duration_seconds."""
+        return self.operations.labels(operation).time()
@@ -0,0 +1,452 @@
+"""Request and response validation compiled from openapi/openapi.json.
+
+Every operation in the spec is compiled once into a validator: one closure
+per query/path/header parameter and request body, built from its schema
+(type, enum, minimum/maximum, length, pattern, required/properties, items,
+nullable, $ref, allOf/anyOf/oneOf). A ``before_request`` hook looks the
+operation up by endpoint and answers 400 (or 415 for an unsupported body
+type) before the view runs. Routes that are not in the spec pass through.
+
+With ``validate_responses`` (OPENAPI_VALIDATE_RESPONSES=True) and the app
+in testing mode, responses are checked too: an undocumented status code,
+content type or a JSON body that does not match its schema raises
+ResponseValidationError.
+
+Usage:
+    python app/openapi_validation.py bench [--iterations N]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from flask import current_app, jsonify, request
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'openapi', 'openapi.json')
+METHODS = ('get', 'put', 'post', 'delete', 'patch', 'head', 'options')
+RULE_PARAM_RE = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+FORM_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+class ValidationError(ValueError):
+    """A value does not conform to its schema; the message is safe to return to clients."""
+
+
+class ResponseValidationError(AssertionError):
+    """A response does not conform to the spec (raised in testing mode only)."""
+
+
+TYPES = {
+    'string': (lambda v: isinstance(v, str), "a string"),
+    'integer': (lambda v: isinstance(v, int) and not isinstance(v, bool), "an integer"),
+    'number': (lambda v: isinstance(v, (int, float)) and not isinstance(v, bool), "a number"),
+    'boolean': (lambda v: isinstance(v, bool), "a boolean"),
+    'array': (lambda v: isinstance(v, list), "an array"),
+    'object': (lambda v: isinstance(v, dict), "an object"),
+}
+
+
+def resolve(spec, schema):
+    """Follow a local $ref (``#/components/...``) to the schema it points at."""
+    seen = set()
+    while isinstance(schema, dict) and '$ref' in schema:
+        ref = schema['$ref']
+        if ref in seen or not ref.startswith('#/'):
+            raise ValueError(f"unsupported or circular $ref {ref}")
+        seen.add(ref)
+        schema = spec
+        for part in ref[2:].split('/'):
+            schema = schema[part.replace('~1', '/').replace('~0', '~')]
+    return schema
+
+
+def compile_schema(schema, spec):
+    """Return ``check(value, where)`` raising ValidationError when value does not match schema."""
+    schema = resolve(spec, schema or {})
+    checks = []
+
+    kind = schema.get('type')
+    if kind in TYPES:
+        is_type, described = TYPES[kind]
+
+        def check_type(value, where):
+            if not is_type(value):
+                raise ValidationError(f"{where} must be {described}")
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+        listing = ", ".join(str(v) for v in allowed)
+
+        def check_enum(value, where):
+            if value not in allowed:
+                raise ValidationError(f"{where} must be one of {listing}")
+        checks.append(check_enum)
+
+    if 'minimum' in schema or 'maximum' in schema:
+        low, high = schema.get('minimum'), schema.get('maximum')
+        low_open, high_open = schema.get('exclusiveMinimum', False), schema.get('exclusiveMaximum', False)
+
+        def check_range(value, where):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return
+            if low is not None and (value <= low if low_open else value < low):
+                raise ValidationError(f"{where} must be {'>' if low_open else '>='} {low}")
+            if high is not None and (value >= high if high_open else value > high):
+                raise ValidationError(f"{where} must be {'<' if high_open else '<='} {high}")
+        checks.append(check_range)
+
+    if 'minLength' in schema or 'maxLength' in schema or 'pattern' in schema:
+        min_length, max_length = schema.get('minLength', 0), schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+
+        def check_string(value, where):
+            if not isinstance(value, str):
+                return
+            if len(value) < min_length:
+                raise ValidationError(f"{where} must be at least {min_length} characters")
+            if max_length is not None and len(value) > max_length:
+                raise ValidationError(f"{where} must be at most {max_length} characters")
+            if pattern is not None and not pattern.search(value):
+                raise ValidationError(f"{where} must match {pattern.pattern}")
+        checks.append(check_string)
+
+    if 'items' in schema or 'minItems' in schema or 'maxItems' in schema:
+        check_item = compile_schema(schema['items'], spec) if 'items' in schema else None
+        min_items, max_items = schema.get('minItems', 0), schema.get('maxItems')
+
+        def check_array(value, where):
+            if not isinstance(value, list):
+                return
+            if len(value) < min_items or (max_items is not None and len(value) > max_items):
+                raise ValidationError(f"{where} must have between {min_items} and {max_items or 'any number of'} items")
+            if check_item is not None:
+                for i, item in enumerate(value):
+                    check_item(item, f"{where}[{i}]")
+        checks.append(check_array)
+
+    if 'properties' in schema or 'required' in schema or schema.get('additionalProperties') is False:
+        properties = [(name, compile_schema(sub, spec)) for name, sub in schema.get('properties', {}).items()]
+        required = schema.get('required', [])
+        closed = schema.get('additionalProperties') is False
+        known = frozenset(schema.get('properties', {}))
+
+        def check_object(value, where):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    raise ValidationError(f"{where}.{name} is required")
+            for name, check in properties:
+                if name in value:
+                    check(value[name], f"{where}.{name}")
+            if closed:
+                extra = [name for name in value if name not in known]
+                if extra:
+                    raise ValidationError(f"{where} has unexpected field {extra[0]}")
+        checks.append(check_object)
+
+    if 'allOf' in schema:
+        parts = [compile_schema(sub, spec) for sub in schema['allOf']]
+
+        def check_all(value, where):
+            for check in parts:
+                check(value, where)
+        checks.append(check_all)
+
+    for keyword, exactly_one in (('anyOf', False), ('oneOf', True)):
+        if keyword in schema:
+            options = [compile_schema(sub, spec) for sub in schema[keyword]]
+
+            def check_choice(value, where, options=options, exactly_one=exactly_one):
+                matched = 0
+                for check in options:
+                    try:
+                        check(value, where)
+                    except ValidationError:
+                        continue
+                    matched += 1
+                if matched == 0 or (exactly_one and matched > 1):
+                    raise ValidationError(f"{where} does not match {'exactly one' if exactly_one else 'any'} of the allowed schemas")
+            checks.append(check_choice)
+
+    nullable = schema.get('nullable', False)
+
+    if len(checks) == 1:
+        only = checks[0]
+
+        def check(value, where):
+            if value is None:
+                if nullable:
+                    return
+                raise ValidationError(f"{where} must not be null")
+            only(value, where)
+        return check
+
+    def check(value, where):
+        if value is None:
+            if nullable:
+                return
+            raise ValidationError(f"{where} must not be null")
+        for c in checks:
+            c(value, where)
+    return check
+
+
+def coercer(schema, spec):
+    """Return a function converting a query/path/header string to the schema's type."""
+    kind = resolve(spec, schema or {}).get('type')
+    if kind == 'integer':
+        return int
+    if kind == 'number':
+        return float
+    if kind == 'boolean':
+        def to_bool(value):
+            if value in ('true', 'false'):
+                return value == 'true'
+            raise ValueError(value)
+        return to_bool
+    return None
+
+
+class Parameter:
+    """One compiled query, path or header parameter."""
+
+    LABELS = {'query': "Query parameter", 'path': "Path parameter", 'header': "Header"}
+
+    def __init__(self, definition, spec):
+        definition = resolve(spec, definition)
+        schema = resolve(spec, definition.get('schema', {}))
+        self.name = definition['name']
+        self.location = definition['in']
+        self.required = definition.get('required', self.location == 'path')
+        self.where = f"{self.LABELS.get(self.location, self.location)} '{self.name}'"
+        self.is_array = schema.get('type') == 'array'
+        item_schema = resolve(spec, schema.get('items', {})) if self.is_array else schema
+        self.coerce = coercer(item_schema, spec)
+        self.described = TYPES.get(item_schema.get('type'), (None, "valid"))[1]
+        self.check = compile_schema(schema, spec)
+
+    def validate(self, source):
+        # A membership test first: MultiDict.get() costs a KeyError for every absent parameter
+        if self.name not in source:
+            if self.required:
+                raise ValidationError(f"{self.where} is required")
+            return
+        raw = source.getlist(self.name) if self.is_array else source[self.name]
+        if self.coerce is not None:
+            try:
+                value = [self.coerce(v) for v in raw] if self.is_array else self.coerce(raw)
+            except (TypeError, ValueError):
+                raise ValidationError(f"{self.where} must be {self.described}") from None
+        else:
+            value = raw
+        self.check(value, self.where)
+
+
+class Operation:
+    """Compiled validators for one path + method of the spec."""
+
+    def __init__(self, path, method, definition, shared_parameters, spec):
+        self.path = path
+        self.method = method.upper()
+        by_key = {}
+        for param in list(shared_parameters) + list(definition.get('parameters', [])):
+            param = resolve(spec, param)
+            by_key[(param['name'], param['in'])] = param  # operation-level overrides path-level
+        params = [Parameter(p, spec) for p in by_key.values() if p['in'] in ('query', 'path', 'header')]
+        self.query = [p for p in params if p.location == 'query']
+        self.path_params = [p for p in params if p.location == 'path']
+        self.headers = [p for p in params if p.location == 'header']
+
+        body = resolve(spec, definition.get('requestBody')) if definition.get('requestBody') else None
+        self.body_required = bool(body and body.get('required'))
+        self.body_types = {}
+        for mimetype, media in (body or {}).get('content', {}).items():
+            self.body_types[mimetype] = compile_schema(media.get('schema'), spec)
+
+        self.responses = {}
+        for status, response in definition.get('responses', {}).items():
+            response = resolve(spec, response)
+            self.responses[str(status).upper()] = {
+                mimetype: compile_schema(media.get('schema'), spec)
+                for mimetype, media in response.get('content', {}).items()
+            }
+
+    def validate_request(self, req):
+        """Raise ValidationError (with an HTTP status attribute) if the request does not conform."""
+        if self.query:
+            args = req.args
+            for param in self.query:
+                param.validate(args)
+        if self.path_params:
+            view_args = req.view_args or {}
+            for param in self.path_params:
+                param.validate(view_args)
+        if self.headers:
+            headers = req.headers
+            for param in self.headers:
+                param.validate(headers)
+        if self.body_types or self.body_required:
+            self.validate_body(req)
+
+    def validate_body(self, req):
+        has_body = bool(req.content_length) or req.headers.get('Transfer-Encoding') == 'chunked'
+        if not has_body:
+            if self.body_required:
+                raise ValidationError("Request body is required")
+            return
+        check = self.body_types.get(req.mimetype)
+        if check is None:
+            error = ValidationError(f"Content type must be one of {', '.join(self.body_types)}")
+            error.status = 415
+            raise error
+        if req.mimetype in FORM_TYPES:
+            value = req.form.to_dict()
+        else:
+            value = req.get_json(silent=True)
+            if value is None:
+                raise ValidationError("Request body must be valid JSON")
+        check(value, "Request body")
+
+    def validate_response(self, response):
+        """Raise ResponseValidationError if the status, content type or JSON body is undocumented."""
+        status = str(response.status_code)
+        if response.status_code == 304:
+            return
+        content = self.responses.get(status, self.responses.get(f"{status[0]}XX", self.responses.get('DEFAULT')))
+        where = f"{self.method} {self.path} -> {status}"
+        if content is None:
+            raise ResponseValidationError(f"{where}: status code is not documented")
+        if not content:
+            return
+        check = content.get(response.mimetype)
+        if check is None:
+            raise ResponseValidationError(f"{where}: content type {response.mimetype} is not documented")
+        if response.is_streamed or response.mimetype != 'application/json':
+            return
+        try:
+            check(json.loads(response.get_data()), "response")
+        except ValidationError as e:
+            raise ResponseValidationError(f"{where}: {e}") from None
+
+
+class OpenAPIValidator:
+    """Validates requests (and optionally responses) against the operations in an OpenAPI spec."""
+
+    def __init__(self, spec, validate_responses=False):
+        self.spec = spec
+        self.validate_responses = validate_responses
+        self.operations = {}
+        for path, item in spec.get('paths', {}).items():
+            shared = item.get('parameters', [])
+            for method in METHODS:
+                if method in item:
+                    self.operations[(path, method.upper())] = Operation(path, method, item[method], shared, spec)
+        self.rejected = 0
+        self._by_endpoint = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_SPEC_PATH, validate_responses=False):
+        with open(path) as f:
+            return cls(json.load(f), validate_responses)
+
+    @classmethod
+    def from_env(cls):
+        return cls.load(
+            os.environ.get('OPENAPI_SPEC_PATH', DEFAULT_SPEC_PATH),
+            validate_responses=os.environ.get('OPENAPI_VALIDATE_RESPONSES', 'False') == 'True',
+        )
+
+    def init_app(self, app):
+        app.before_request(self._check_request)
+        if self.validate_responses:
+            app.after_request(self._check_response)
+
+    def operation_for(self, req):
+        """Operation matching the request's Flask rule and method, or None."""
+        method = 'GET' if req.method == 'HEAD' else req.method
+        key = (req.endpoint, method)
+        try:
+            return self._by_endpoint[key]
+        except KeyError:
+            pass
+        operation = None
+        if req.url_rule is not None:
+            path = RULE_PARAM_RE.sub(r'{\1}', req.url_rule.rule)
+            operation = self.operations.get((path, method))
+        self._by_endpoint[key] = operation
+        return operation
+
+    def _check_request(self):
+        req = request._get_current_object()
+        operation = self.operation_for(req)
+        if operation is None:
+            return None
+        try:
+            operation.validate_request(req)
+        except ValidationError as e:
+            self.rejected += 1
+            request.environ['lab.openapi_rejected'] = True
+            return jsonify({"error": str(e)}), getattr(e, 'status', 400)
+        return None
+
+    def _check_response(self, response):
+        # Rejections from _check_request are ours, whether or not the spec lists 400 for the operation
+        if current_app.testing and not request.environ.get('lab.openapi_rejected'):
+            operation = self.operation_for(request)
+            if operation is not None:
+                operation.validate_response(response)
+        return response
+
+
+BENCH_REQUESTS = [
+    '/api/status',
+    '/api/search?q=vibe+coding',
+    '/api/search?q=Karpathy&limit=5',
+    '/api/contact-submissions?limit=20&format=json&email=a@example.com',
+    '/api/search?limit=500',
+]
+
+
+def bench(app, validator, iterations):
+    """Time request validation alone (query parsing excluded) for a mix of API requests."""
+    for url in BENCH_REQUESTS:
+        with app.test_request_context(url):
+            req = request._get_current_object()
+            operation = validator.operation_for(req)
+            req.args  # parsed once per request anyway, by the view
+            latencies = []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                try:
+                    validator.operation_for(req).validate_request(req)
+                except ValidationError:
+                    pass
+                latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6
+        print(f"{operation.method} {url}: p50 {p50:.2f}us, p99 {p99:.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAPI validation tools')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--spec', default=os.environ.get('OPENAPI_SPEC_PATH', DEFAULT_SPEC_PATH))
+    parser.add_argument('--iterations', type=int, default=20000, help='Validations per request for bench')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    validator = OpenAPIValidator.load(args.spec)
+    print(f"Compiled {len(validator.operations)} operations in {(time.perf_counter() - t0) * 1000:.2f}ms")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+    bench(app, validator, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
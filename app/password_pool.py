@@ -0,0 +1,149 @@
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash
+
+
+class PoolSaturated(Exception):
+    """Raised when password verification cannot be admitted or did not finish in time."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordVerifier:
+    """Runs check_password_hash in a size-limited process pool.
+
+    PBKDF2 with a million iterations burns hundreds of milliseconds of CPU,
+    so it is kept off the request threads. At most ``max_pending``
+    verifications may be queued or running; beyond that ``verify`` fails
+    fast with PoolSaturated instead of piling up. ``workers=0`` verifies
+    inline on the calling thread but keeps the same admission control.
+    """
+
+    def __init__(self, workers, max_pending, timeout=5.0, retry_after=1, latency_window=512):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=latency_window)
+        self.pending = 0
+        self.verified = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls):
+        workers = int(os.environ.get('PASSWORD_POOL_WORKERS', min(2, os.cpu_count() or 1)))
+        max_pending = int(os.environ.get('PASSWORD_POOL_MAX_PENDING', max(1, workers) * 4))
+        timeout = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', 5.0))
+        retry_after = int(os.environ.get('PASSWORD_POOL_RETRY_AFTER', 1))
+        return cls(workers, max_pending, timeout, retry_after)
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork, so each gunicorn worker owns its pool.
+        # Spawned children re-import the __main__ script, so entry points (serve.py) keep
+        # their setup under `if __name__ == '__main__'` and app.py hands off to serve.py.
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def start(self):
+        """Spawn the pool processes ahead of the first login."""
+        if self.workers:
+            executor = self._get_executor()
+            list(executor.map(check_password_hash, ["x"] * self.workers, ["x"] * self.workers))
+
+    def _release(self, started):
+        with self._lock:
+            self.pending -= 1
+        self._latencies.append(time.perf_counter() - started)
+        self._slots.release()
+
+    def verify(self, pwhash, password):
+        """Return check_password_hash(pwhash, password), or raise PoolSaturated."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated("Password verification queue is full", self.retry_after)
+        with self._lock:
+            self.pending += 1
+        started = time.perf_counter()
+
+        if not self.workers:
+            try:
+                return check_password_hash(pwhash, password)
+            finally:
+                with self._lock:
+                    self.verified += 1
+                self._release(started)
+
+        try:
+            future = self._get_executor().submit(check_password_hash, pwhash, password)
+        except concurrent.futures.process.BrokenProcessPool:
+            self._release(started)
+            with self._lock:
+                self._executor = None
+            raise PoolSaturated("Password verification pool restarted", self.retry_after)
+        except Exception:
+            self._release(started)
+            raise
+        # The slot is held until the work really finishes, even if we stop waiting
+        future.add_done_callback(lambda f: self._release(started))
+        try:
+            result = future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolSaturated("Password verification timed out", self.retry_after)
+        except concurrent.futures.process.BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            raise PoolSaturated("Password verification pool restarted", self.retry_after)
+        with self._lock:
+            self.verified += 1
+        return result
+
+    def stats(self):
+        """Queue depth, counters and verify latency (ms) for sizing the pool."""
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "latency_ms": {
+                "samples": len(latencies),
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+        }
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
@@ -0,0 +1,127 @@
+"""Build-time prerendering of the static pages and Jinja bytecode warmup.
+
+Pages that only vary by login state are rendered twice at build time, once
+anonymous and once with a placeholder username, and written under
+app/build/prerendered/. At runtime PrerenderedPages serves them from memory,
+substituting the escaped username into the logged-in variant. The build
+also compiles every template into the Jinja bytecode cache so cold workers
+skip template compilation.
+
+Usage:
+    python app/prerender.py
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+from markupsafe import escape
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.path.join(APP_DIR, 'build')
+DEFAULT_OUTPUT_DIR = os.path.join(BUILD_DIR, 'prerendered')
+DEFAULT_BYTECODE_DIR = os.path.join(BUILD_DIR, 'jinja-cache')
+
+# endpoint -> template for pages with no request-specific input besides login state
+PAGES = {
+    'home': 'home.html',
+    'about': 'about.html',
+    'docs': 'docs.html',
+}
+USER_PLACEHOLDER = "__PRERENDERED_USER__"
+MANIFEST = 'manifest.json'
+# Static URLs and responsive image srcsets are baked into the pages, so a rebuilt
+# asset or image manifest also invalidates them
+STATIC_MANIFEST = os.path.join(APP_DIR, 'static', 'dist', 'manifest.json')
+IMAGE_MANIFEST = os.path.join(APP_DIR, 'static', 'dist', 'images.json')
+
+
+def templates_digest(template_dir):
+    """Hash of every template source and the static and image manifests, used to detect stale output."""
+    digest = hashlib.sha256()
+    paths = [os.path.join(template_dir, name) for name in sorted(os.listdir(template_dir))]
+    for path in paths + [STATIC_MANIFEST, IMAGE_MANIFEST]:
+        if os.path.isfile(path):
+            digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class PrerenderedPages:
+    """Prerendered page variants loaded into memory at startup."""
+
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+
+    @classmethod
+    def load(cls, output_dir, template_dir):
+        """Load prerendered pages, or an empty set if missing or built from other templates."""
+        try:
+            with open(os.path.join(output_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+            if manifest.get('templates') != templates_digest(template_dir):
+                return cls()
+            pages = {}
+            for endpoint, files in manifest['pages'].items():
+                variants = {}
+                for variant, filename in files.items():
+                    with open(os.path.join(output_dir, filename), 'rb') as f:
+                        variants[variant] = f.read()
+                pages[endpoint] = variants
+        except (OSError, ValueError, KeyError):
+            return cls()
+        return cls(pages)
+
+    def render(self, endpoint, user=None):
+        """Return the page body for the login state, or None if not prerendered."""
+        variants = self.pages.get(endpoint)
+        if variants is None:
+            return None
+        if not user:
+            return variants['anonymous']
+        return variants['user'].replace(USER_PLACEHOLDER.encode(), str(escape(user)).encode('utf-8'))
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def build(app, output_dir=DEFAULT_OUTPUT_DIR):
+    """Render every page variant to output_dir and compile all templates."""
+    from flask import render_template, session
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {'templates': templates_digest(os.path.join(app.root_path, app.template_folder)), 'pages': {}}
+    for endpoint, template in PAGES.items():
+        files = {}
+        for variant, user in (('anonymous', None), ('user', USER_PLACEHOLDER)):
+            with app.test_request_context('/'):
+                if user:
+                    session['user'] = user
+                body = render_template(template).encode('utf-8')
+            filename = f"{endpoint}.{variant}.html"
+            with open(os.path.join(output_dir, filename), 'wb') as f:
+                f.write(body)
+            files[variant] = filename
+        manifest['pages'][endpoint] = files
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Compiling through the environment populates its bytecode cache, if configured
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return manifest
+
+
+def main():
+    sys.path.insert(0, APP_DIR)
+    from app import app
+    manifest = build(app)
+    print(f"Prerendered {len(manifest['pages'])} pages to {DEFAULT_OUTPUT_DIR}")
+    if app.jinja_env.bytecode_cache is not None:
+        print(f"Compiled {len(app.jinja_env.list_templates())} templates into {app.jinja_env.bytecode_cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""On-demand request profiling for a live worker.
+
+RequestProfiler wraps the WSGI app and profiles a sample of requests
+(PROFILE_SAMPLE_RATE when PROFILE_ENABLED=True) plus any request carrying
+an ``X-Profile-Token`` header equal to PROFILE_TOKEN. Each profiled request
+is written to PROFILE_DIR/<endpoint>/ either as a cProfile pstats dump
+(PROFILE_FORMAT=pstats) or as sampled collapsed stacks ready for
+flamegraph.pl / speedscope (PROFILE_FORMAT=collapsed). The oldest dumps
+are deleted once PROFILE_MAX_FILES or PROFILE_MAX_MB is exceeded.
+
+When neither PROFILE_ENABLED nor PROFILE_TOKEN is set the middleware is
+not installed at all, so it costs nothing.
+
+Usage:
+    python app/request_profiler.py summarize [--dir DIR] [--endpoint NAME] [--top N]
+    python app/request_profiler.py merge --output FILE [--dir DIR] [--endpoint NAME]
+"""
+
+import argparse
+import cProfile
+import collections
+import hmac
+import itertools
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'lab-profiles')
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+EXTENSIONS = {'pstats': '.pstats', 'collapsed': '.folded'}
+_DONE = object()
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks."""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _Profile:
+    """One profiled request: starts on creation, written to disk by finish()."""
+
+    def __init__(self, profiler, environ, fmt):
+        self.profiler = profiler
+        self.environ = environ
+        self.fmt = fmt
+        self.name = f"{int(time.time() * 1000)}-{os.getpid()}-{next(profiler._sequence)}{EXTENSIONS[fmt]}"
+        self.finished = False
+        if fmt == 'pstats':
+            self.recorder = cProfile.Profile()
+        else:
+            self.recorder = StackSampler(threading.get_ident(), profiler.sample_interval)
+            self.recorder.start()
+
+    def resume(self):
+        if self.fmt == 'pstats':
+            self.recorder.enable()
+
+    def pause(self):
+        if self.fmt == 'pstats':
+            self.recorder.disable()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            if self.fmt == 'collapsed':
+                self.recorder.stop()
+            self.profiler.write(self)
+        except OSError as e:
+            print(f"WARNING: could not write request profile {self.name}: {e}")
+        finally:
+            self.profiler._active.release()
+
+
+class _ProfiledBody:
+    """Response iterable that keeps profiling while the body is generated."""
+
+    def __init__(self, body, profile):
+        self.body = body
+        self.profile = profile
+
+    def __iter__(self):
+        iterator = iter(self.body)
+        while True:
+            self.profile.resume()
+            try:
+                chunk = next(iterator, _DONE)
+            finally:
+                self.profile.pause()
+            if chunk is _DONE:
+                # Servers call close() too, but write the dump as soon as the body is done
+                self.profile.finish()
+                return
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.profile.finish()
+
+
+class RequestProfiler:
+    """WSGI middleware profiling sampled or explicitly requested requests."""
+
+    def __init__(self, output_dir=DEFAULT_DIR, sample_rate=0.0, token=None, fmt='pstats',
+                 max_files=200, max_bytes=50 * 1024 * 1024, sample_interval=0.001):
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"profile format must be one of {', '.join(EXTENSIONS)}")
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.token = token
+        self.fmt = fmt
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.sample_interval = sample_interval
+        self.url_map = None
+        self._sequence = itertools.count()
+        self._prune_lock = threading.Lock()
+        # One profiled request at a time per worker: bounds the overhead, and
+        # cProfile cannot run two profilers at once on newer Pythons
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Profiler configured from PROFILE_* variables, or None when profiling is off."""
+        enabled = os.environ.get('PROFILE_ENABLED', 'False') == 'True'
+        token = os.environ.get('PROFILE_TOKEN') or None
+        if not enabled and not token:
+            return None
+        return cls(
+            output_dir=os.environ.get('PROFILE_DIR', DEFAULT_DIR),
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01)) if enabled else 0.0,
+            token=token,
+            fmt=os.environ.get('PROFILE_FORMAT', 'pstats'),
+            max_files=int(os.environ.get('PROFILE_MAX_FILES', 200)),
+            max_bytes=int(float(os.environ.get('PROFILE_MAX_MB', 50)) * 1024 * 1024),
+        )
+
+    def init_app(self, app):
+        self.url_map = app.url_map
+        app.wsgi_app = self.wrap(app.wsgi_app)
+
+    def wanted(self, environ):
+        token = environ.get(TOKEN_HEADER)
+        if token and self.token and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8')):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def wrap(self, wsgi_app):
+        def middleware(environ, start_response):
+            if not self.wanted(environ) or not self._active.acquire(blocking=False):
+                return wsgi_app(environ, start_response)
+            profile = _Profile(self, environ, self.fmt)
+
+            def tag_response(status, headers, exc_info=None):
+                headers.append(('X-Profile-Dump', f"{self.endpoint(environ)}/{profile.name}"))
+                return start_response(status, headers, exc_info)
+
+            profile.resume()
+            try:
+                body = wsgi_app(environ, tag_response)
+            except BaseException:
+                profile.pause()
+                profile.finish()
+                raise
+            profile.pause()
+            return _ProfiledBody(body, profile)
+        return middleware
+
+    def endpoint(self, environ):
+        if self.url_map is None:
+            return 'app'
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match(method=environ.get('REQUEST_METHOD'))
+        except Exception:
+            return 'unmatched'
+        return endpoint.replace('/', '_')
+
+    def write(self, profile):
+        directory = os.path.join(self.output_dir, self.endpoint(profile.environ))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, profile.name)
+        if profile.fmt == 'pstats':
+            profile.recorder.dump_stats(path + '.tmp')
+        else:
+            profile.recorder.dump(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.prune()
+
+    def prune(self):
+        """Delete the oldest dumps until the file count and byte caps hold."""
+        with self._prune_lock:
+            dumps = list_dumps(self.output_dir)
+            total = sum(size for _, _, size in dumps)
+            excess = len(dumps) - self.max_files
+            for path, _, size in dumps:
+                if excess <= 0 and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                excess -= 1
+                total -= size
+
+
+def list_dumps(output_dir, endpoint=None):
+    """(path, mtime, size) for every dump under output_dir, oldest first."""
+    dumps = []
+    for root, _, files in os.walk(output_dir):
+        if endpoint is not None and os.path.basename(root) != endpoint:
+            continue
+        for name in files:
+            if name.endswith(tuple(EXTENSIONS.values())):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                dumps.append((path, st.st_mtime, st.st_size))
+    dumps.sort(key=lambda d: (d[1], d[0]))
+    return dumps
+
+
+def group_by_endpoint(dumps):
+    groups = collections.defaultdict(lambda: {'pstats': [], 'collapsed': []})
+    for path, _, _ in dumps:
+        fmt = 'pstats' if path.endswith(EXTENSIONS['pstats']) else 'collapsed'
+        groups[os.path.basename(os.path.dirname(path))][fmt].append(path)
+    return groups
+
+
+def read_folded(paths):
+    stacks = collections.Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def summarize(output_dir=DEFAULT_DIR, endpoint=None, top=15, stream=None):
+    """Print, per endpoint, the hottest functions across all of its dumps."""
+    stream = stream or sys.stdout
+    groups = group_by_endpoint(list_dumps(output_dir, endpoint))
+    if not groups:
+        print(f"No profiles under {output_dir}", file=stream)
+    for name in sorted(groups):
+        files = groups[name]
+        if files['pstats']:
+            stats = pstats.Stats(*files['pstats'], stream=stream)
+            print(f"== {name}: {len(files['pstats'])} profiles, {stats.total_tt:.3f}s total "
+                  f"({stats.total_tt / len(files['pstats']) * 1000:.1f}ms mean)", file=stream)
+            stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+        if files['collapsed']:
+            stacks = read_folded(files['collapsed'])
+            total = sum(stacks.values())
+            leaves = collections.Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            print(f"== {name}: {len(files['collapsed'])} sampled profiles, {total} samples", file=stream)
+            for frame, count in leaves.most_common(top):
+                print(f"{count / total * 100:6.1f}%  {frame}", file=stream)
+
+
+def merge(output, output_dir=DEFAULT_DIR, endpoint=None):
+    """Merge every dump (optionally for one endpoint) into a single pstats or folded file."""
+    dumps = [path for path, _, _ in list_dumps(output_dir, endpoint)]
+    if output.endswith(EXTENSIONS['pstats']):
+        paths = [p for p in dumps if p.endswith(EXTENSIONS['pstats'])]
+        if not paths:
+            return 0
+        pstats.Stats(*paths).dump_stats(output)
+        return len(paths)
+    paths = [p for p in dumps if p.endswith(EXTENSIONS['collapsed'])]
+    with open(output, 'w') as f:
+        for stack, count in read_folded(paths).most_common():
+            f.write(f"{stack} {count}\n")
+    return len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize or merge request profiles')
+    parser.add_argument('command', choices=['summarize', 'merge'])
+    parser.add_argument('--dir', default=os.environ.get('PROFILE_DIR', DEFAULT_DIR))
+    parser.add_argument('--endpoint', help='Only use dumps for this Flask endpoint')
+    parser.add_argument('--top', type=int, default=15, help='Functions to show per endpoint')
+    parser.add_argument('--output', help='Merged file: *.pstats for cProfile dumps, anything else for collapsed stacks')
+    args = parser.parse_args()
+    if args.command == 'summarize':
+        summarize(args.dir, args.endpoint, args.top)
+        return
+    if not args.output:
+        parser.error("merge requires --output")
+    count = merge(args.output, args.dir, args.endpoint)
+    print(f"Merged {count} profiles into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Full-text search over the docs corpus.
+
+Sections from a DocsIndex are tokenized once into an inverted index
+(term -> postings of section id, term frequency and first offset) and
+scored with BM25 at query time. The index can be written to a compact
+zlib-compressed JSON file so workers load it instead of re-tokenizing.
+
+Usage:
+    python app/search_index.py build [--out PATH]
+    python app/search_index.py bench [--iterations N]
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import time
+import zlib
+
+from markupsafe import escape
+
+from docs_index import DocsIndex
+
+FORMAT_VERSION = 1
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+# BM25 tuning constants
+K1 = 1.2
+B = 0.75
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DOC_PATH = os.path.join(APP_DIR, '..', 'docs', 'Vibe-Coding.txt')
+DEFAULT_INDEX_PATH = os.path.join(APP_DIR, 'data', 'search_index.json.z')
+
+
+def tokenize(text):
+    """Yield (term, offset) pairs for every indexable word in text."""
+    for match in TOKEN_RE.finditer(text.lower()):
+        term = match.group()
+        if term not in STOPWORDS:
+            yield term, match.start()
+
+
+def fingerprint(sections):
+    digest = hashlib.sha1()
+    for heading, text in sections.items():
+        digest.update(heading.encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(text.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SearchIndex:
+    """BM25-ranked inverted index over a mapping of heading -> section text."""
+
+    def __init__(self, docs, postings, doc_lengths, source_fingerprint):
+        self.docs = docs
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.fingerprint = source_fingerprint
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        n = len(docs)
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def build(cls, sections):
+        docs = list(sections.items())
+        postings = {}
+        doc_lengths = []
+        for doc_id, (heading, text) in enumerate(docs):
+            counts = {}
+            length = 0
+            # Headings are indexed with the body so a title match ranks the section
+            for term, offset in tokenize(text):
+                entry = counts.get(term)
+                if entry is None:
+                    counts[term] = [1, offset]
+                else:
+                    entry[0] += 1
+                length += 1
+            for term, (tf, first) in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf, first))
+            doc_lengths.append(length)
+        return cls(docs, postings, doc_lengths, fingerprint(sections))
+
+    def save(self, path):
+        """Write the index as zlib-compressed JSON with flattened postings."""
+        data = {
+            "format": FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "docs": self.docs,
+            "lengths": self.doc_lengths,
+            "postings": {term: [n for posting in plist for n in posting] for term, plist in self.postings.items()},
+        }
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(raw, 9))
+        os.replace(tmp_path, path)
+        return len(raw)
+
+    @classmethod
+    def load(cls, path, expected_fingerprint=None):
+        """Load a saved index; returns None if missing, unreadable or stale."""
+        try:
+            with open(path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if data.get("format") != FORMAT_VERSION:
+            return None
+        if expected_fingerprint and data.get("fingerprint") != expected_fingerprint:
+            return None
+        postings = {}
+        for term, flat in data["postings"].items():
+            postings[term] = [tuple(flat[i:i + 3]) for i in range(0, len(flat), 3)]
+        docs = [tuple(doc) for doc in data["docs"]]
+        return cls(docs, postings, data["lengths"], data["fingerprint"])
+
+    def search(self, query, limit=10):
+        """Return the top ``limit`` (score, doc_id, first_offset) hits and the query terms."""
+        terms = {term for term, _ in tokenize(query)}
+        scores = {}
+        offsets = {}
+        avg = self.avg_length or 1.0
+        for term in terms:
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf, first in plist:
+                norm = K1 * (1 - B + B * self.doc_lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                if first < offsets.get(doc_id, first + 1):
+                    offsets[doc_id] = first
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, doc_id, offsets[doc_id]) for doc_id, score in best], terms
+
+    def snippet(self, doc_id, offset, terms, width=240):
+        """Return an HTML-escaped excerpt around offset with query terms in <mark>."""
+        text = self.docs[doc_id][1]
+        start = max(0, offset - width // 3)
+        end = min(len(text), start + width)
+        if start > 0:
+            space = text.find(' ', start)
+            if space != -1 and space < offset:
+                start = space + 1
+        if end < len(text):
+            space = text.rfind(' ', offset, end)
+            if space != -1:
+                end = space
+        excerpt = text[start:end]
+        parts = []
+        last = 0
+        for match in TOKEN_RE.finditer(excerpt.lower()):
+            if match.group() in terms:
+                parts.append(str(escape(excerpt[last:match.start()])))
+                parts.append("<mark>" + str(escape(excerpt[match.start():match.end()])) + "</mark>")
+                last = match.end()
+        parts.append(str(escape(excerpt[last:])))
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        return prefix + "".join(parts).replace("\n", " ") + suffix
+
+    def query(self, query, limit=10):
+        """Ranked results ready to serialize for the search API."""
+        hits, terms = self.search(query, limit)
+        return [
+            {
+                "section": self.docs[doc_id][0],
+                "score": round(score, 4),
+                "snippet": self.snippet(doc_id, offset, terms),
+            }
+            for score, doc_id, offset in hits
+        ]
+
+
+def load_or_build(docs_index, path=None):
+    """Use the persisted index when it matches the current docs, else build in memory."""
+    sections = docs_index.sections
+    if path:
+        index = SearchIndex.load(path, fingerprint(sections))
+        if index is not None:
+            return index
+    return SearchIndex.build(sections)
+
+
+BENCH_QUERIES = [
+    "vibe coding",
+    "security vulnerabilities",
+    "Karpathy",
+    "ChatGPT Copilot Cursor",
+    "best practices code review",
+    "prototype speed",
+    "technical debt maintainability",
+    "no such term here",
+]
+
+
+def bench(index, iterations):
+    """Run the benchmark query mix and print throughput and latency."""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        q = BENCH_QUERIES[i % len(BENCH_QUERIES)]
+        t0 = time.perf_counter()
+        index.query(q)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6
+    print(f"{iterations} queries in {elapsed:.3f}s: {iterations / elapsed:,.0f} q/s, p50 {p50:.1f}us, p99 {p99:.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Docs search index tools')
+    parser.add_argument('command', choices=['build', 'bench'])
+    parser.add_argument('--docs', default=DEFAULT_DOC_PATH, help='Source text document')
+    parser.add_argument('--out', default=os.environ.get('SEARCH_INDEX_PATH', DEFAULT_INDEX_PATH), help='Index file to write')
+    parser.add_argument('--iterations', type=int, default=20000, help='Queries to run for bench')
+    args = parser.parse_args()
+
+    docs_index = DocsIndex(args.docs)
+    docs_index.refresh(force=True)
+    if not docs_index.sections:
+        print(f"Error: no sections found in {args.docs}")
+        sys.exit(1)
+
+    if args.command == 'build':
+        t0 = time.perf_counter()
+        index = SearchIndex.build(docs_index.sections)
+        raw_size = index.save(args.out)
+        print(f"Indexed {len(index.docs)} sections, {len(index.postings)} terms in {(time.perf_counter() - t0) * 1000:.1f}ms")
+        print(f"Wrote {args.out} ({os.path.getsize(args.out)} bytes, {raw_size} uncompressed)")
+    elif args.command == 'bench':
+        bench(SearchIndex.build(docs_index.sections), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
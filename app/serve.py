@@ -0,0 +1,65 @@
+"""Serving entry point for the lab app.
+
+SERVE_MODE selects how the app runs:
+
+    gthread - gunicorn with threaded workers (default, used by the container)
+    async   - gunicorn with gevent workers (requires gevent)
+    dev     - Werkzeug development server with FLASK_DEBUG honored (jump host only)
+
+Gunicorn settings live in app/gunicorn_conf.py. Send SIGHUP to the gunicorn
+master for a graceful reload: new workers boot and old ones finish their
+in-flight requests before exiting.
+
+Usage:
+    SERVE_MODE=gthread python app/serve.py
+"""
+
+import os
+import signal
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_dev():
+    sys.path.insert(0, APP_DIR)
+    from app import app, warm
+    warm()
+    # The dev server dies on SIGTERM without running atexit hooks, which write out
+    # queued contact submissions and remove the default metrics directory
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # Binding to 0.0.0.0 for container compatibility; 5001 for local host testing
+    # (the container still exposes 5000 internally)
+    port = int(os.environ.get('PORT', 5001))
+    app.run(host='0.0.0.0', port=port, debug=app.config['DEBUG'])
+
+
+def run_gunicorn():
+    # Production serving never runs the debugger, whatever the lab default is
+    os.environ['FLASK_DEBUG'] = 'False'
+    from gunicorn.app.wsgiapp import WSGIApplication
+
+    sys.argv = [sys.argv[0], '--config', os.path.join(APP_DIR, 'gunicorn_conf.py'), 'app:app']
+
+    class LabApplication(WSGIApplication):
+        def load_wsgiapp(self):
+            app_module = __import__('app')
+            app_module.warm()
+            return app_module.app
+
+    LabApplication("%(prog)s [OPTIONS] [APP_MODULE]").run()
+
+
+def main():
+    mode = os.environ.get('SERVE_MODE', 'gthread')
+    if mode == 'dev':
+        run_dev()
+    elif mode in ('gthread', 'async'):
+        run_gunicorn()
+    else:
+        print(f"Error: unknown SERVE_MODE '{mode}' (expected gthread, async or dev)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
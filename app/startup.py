@@ -0,0 +1,207 @@
+"""Startup timing and readiness for the lab app.
+
+app.py creates a StartupTimer before its other imports and calls
+``mark(phase)`` after each block of startup work, so the time since the
+previous mark is charged to that phase (imports, app, data, ...). Work
+that must finish before the process takes traffic is registered with
+``require(name)`` and reported with ``complete(name)``; ``/readyz`` answers
+200 only once nothing is pending, while ``/healthz`` answers as soon as the
+server is up.
+
+Usage:
+    python app/startup.py report [--top N]    # phase breakdown and slowest imports of a fresh process
+    python app/startup.py probe [--port N]    # time from exec to first 200 on /healthz and /readyz via serve.py
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# argparse, subprocess and http.client are imported inside the CLI functions:
+# this module is the first thing app.py imports, so it stays minimal
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = logging.getLogger('lab.startup')
+
+
+def process_age():
+    """Seconds since this process was exec'd (Linux /proc), or None where unavailable."""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Per-phase startup durations plus the set of components readiness waits for."""
+
+    def __init__(self, required=('preload',)):
+        self.started = time.perf_counter()
+        self.before_start = process_age()
+        self.phases = {}
+        self.pending = set(required)
+        self.begun = set()
+        self.ready_at = None
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Charge the time since the previous mark to ``phase``."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a block (which may run later, or on another thread) as ``name``."""
+        self.begun.add(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - t0)
+
+    def require(self, name):
+        with self._lock:
+            self.pending.add(name)
+            self.ready_at = None
+
+    def complete(self, name):
+        with self._lock:
+            self.pending.discard(name)
+            if self.pending or self.ready_at is not None:
+                return
+            self.ready_at = time.perf_counter()
+        log.info("ready", extra={"fields": self.report()})
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    def report(self):
+        before = self.before_start
+        ready_after = None
+        if self.ready_at is not None:
+            ready_after = round(((before or 0.0) + self.ready_at - self.started) * 1000, 1)
+        return {
+            "ready": self.ready,
+            "pending": sorted(self.pending),
+            "pid": os.getpid(),
+            "interpreter_ms": round(before * 1000, 1) if before is not None else None,
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "ready_after_ms": ready_after,
+        }
+
+
+def parse_importtime(text):
+    """(module, depth, self_us, cumulative_us) rows from ``python -X importtime`` output."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the column header
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+REPORT_CODE = """
+import json, sys
+sys.path.insert(0, {app_dir!r})
+import app
+app.warm()
+print(json.dumps(app.startup.report()))
+"""
+
+
+def report(top=15, stream=None):
+    """Import and warm the app in a fresh interpreter and print where the startup time went."""
+    import subprocess
+    stream = stream or sys.stdout
+    env = dict(os.environ, FLASK_DEBUG='False')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', REPORT_CODE.format(app_dir=APP_DIR)],
+                          capture_output=True, text=True, env=env, cwd=APP_DIR)
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        raise SystemExit(proc.returncode)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"interpreter startup  {result['interpreter_ms']} ms (before app.py; inflated by -X importtime)", file=stream)
+    for name, ms in result['phases_ms'].items():
+        print(f"{name:<20} {ms:>8.1f} ms", file=stream)
+    print(f"{'ready after':<20} {result['ready_after_ms']:>8.1f} ms", file=stream)
+    # importtime lists children before their parent: app.py's own imports are the
+    # rows one level deeper than it, back to the previous row at its level
+    rows = parse_importtime(proc.stderr)
+    end = next(i for i, row in enumerate(rows) if row[0] == 'app')
+    start = end
+    while start > 0 and rows[start - 1][1] > rows[end][1]:
+        start -= 1
+    direct = [row for row in rows[start:end] if row[1] == rows[end][1] + 1]
+    print("\nslowest imports of app.py (cumulative):", file=stream)
+    for name, _, _, cumulative in sorted(direct, key=lambda row: -row[3])[:top]:
+        print(f"  {name:<32} {cumulative / 1000:>8.1f} ms", file=stream)
+    return result
+
+
+def probe(port=5099, timeout=60.0, stream=None):
+    """Start app/serve.py and time the first 200 from /healthz and from /readyz."""
+    import http.client
+    import subprocess
+    stream = stream or sys.stdout
+    env = dict(os.environ, PORT=str(port))
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(APP_DIR, 'serve.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = {}
+    try:
+        deadline = started + timeout
+        while len(times) < 2 and time.perf_counter() < deadline and proc.poll() is None:
+            for path in ('/healthz', '/readyz'):
+                if path in times:
+                    continue
+                try:
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                    conn.request('GET', path)
+                    if conn.getresponse().status == 200:
+                        times[path] = time.perf_counter() - started
+                    conn.close()
+                except OSError:
+                    pass
+            time.sleep(0.005)
+    finally:
+        proc.terminate()
+        proc.wait()
+    for path in ('/healthz', '/readyz'):
+        value = f"{times[path] * 1000:.0f} ms" if path in times else "no 200 before timeout"
+        print(f"first 200 on {path:<9} {value}", file=stream)
+    return times
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Startup time report and cold-start probe')
+    parser.add_argument('command', choices=['report', 'probe'])
+    parser.add_argument('--top', type=int, default=15, help='Imports to list in the report')
+    parser.add_argument('--port', type=int, default=5099, help='Port for the probe server')
+    args = parser.parse_args()
+    if args.command == 'report':
+        report(args.top)
+    else:
+        probe(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Content-hashed, precompressed static assets.
+
+The build step copies every file under app/static to app/static/dist with
+a content hash in its name, writes gzip and brotli variants when they are
+meaningfully smaller, and records everything in dist/manifest.json. At
+runtime StaticAssets rewrites url_for('static', ...) to the hashed names and
+serves them with the best encoding the client accepts and a one-year
+immutable Cache-Control.
+
+Usage:
+    python app/static_pipeline.py build
+    python app/static_pipeline.py report
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+DIST_NAME = 'dist'
+MANIFEST = 'manifest.json'
+
+# Keep a compressed variant only if it saves at least this fraction of the bytes
+MIN_SAVING = 0.05
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def hashed_name(relpath, digest):
+    stem, ext = os.path.splitext(relpath)
+    return f"{stem}.{digest[:12]}{ext}"
+
+
+def source_files(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(static_dir, DIST_NAME))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def build(static_dir=STATIC_DIR):
+    """Write hashed and precompressed assets plus the manifest. Returns the manifest."""
+    dist_dir = os.path.join(static_dir, DIST_NAME)
+    manifest = {}
+    for relpath, path in source_files(static_dir):
+        with open(path, 'rb') as f:
+            data = f.read()
+        st = os.stat(path)
+        target = hashed_name(relpath, hashlib.sha256(data).hexdigest())
+        out_path = os.path.join(dist_dir, target)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        entry = {"path": target, "size": len(data), "mtime_ns": st.st_mtime_ns, "encodings": {}}
+        variants = [('gzip', '.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+        for encoding, suffix, compressed in variants:
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                with open(out_path + suffix, 'wb') as f:
+                    f.write(compressed)
+                entry["encodings"][encoding] = len(compressed)
+        manifest[relpath] = entry
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(os.path.join(dist_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def report(manifest):
+    """Print per-asset and total bytes for the smallest variant of each file."""
+    total = best_total = 0
+    print(f"{'asset':<48} {'original':>10} {'gzip':>10} {'brotli':>10} {'saved':>10}")
+    for relpath, entry in sorted(manifest.items()):
+        encodings = entry["encodings"]
+        best = min([entry["size"]] + list(encodings.values()))
+        total += entry["size"]
+        best_total += best
+        print(f"{relpath:<48} {entry['size']:>10} {encodings.get('gzip', '-'):>10} "
+              f"{encodings.get('br', '-'):>10} {entry['size'] - best:>10}")
+    saved = total - best_total
+    pct = (saved / total * 100) if total else 0
+    print(f"{'total':<48} {total:>10} {'':>10} {'':>10} {saved:>10} ({pct:.1f}%)")
+
+
+class StaticAssets:
+    """Serves the hashed assets described by dist/manifest.json."""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST_NAME)
+        self.urls = {}
+        self.files = {}
+        self.load()
+
+    def load(self):
+        """Read the manifest, skipping assets whose source changed since the build."""
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        urls, files = {}, {}
+        for relpath, entry in manifest.items():
+            try:
+                st = os.stat(os.path.join(self.static_dir, relpath))
+            except OSError:
+                continue
+            if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+                continue
+            urls[relpath] = f"{DIST_NAME}/{entry['path']}"
+            files[entry["path"]] = (mimetypes.guess_type(relpath)[0] or 'application/octet-stream', entry["encodings"])
+        self.urls, self.files = urls, files
+
+    def init_app(self, app):
+        app.url_defaults(self.hashed_url)
+        self._fallback = app.view_functions['static']
+        app.view_functions['static'] = self.send
+
+    def hashed_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.urls:
+            values['filename'] = self.urls[values['filename']]
+
+    def send(self, filename):
+        """Serve a hashed asset, choosing brotli/gzip from Accept-Encoding."""
+        prefix = DIST_NAME + '/'
+        info = self.files.get(filename[len(prefix):]) if filename.startswith(prefix) else None
+        if info is None:
+            response = self._fallback(filename=filename)
+            if filename.startswith(prefix) and response.status_code == 200:
+                # Everything under dist/ carries a content hash in its name
+                response.headers['Cache-Control'] = IMMUTABLE
+            return response
+        mimetype, encodings = info
+        path = os.path.join(self.dist_dir, filename[len(prefix):])
+        chosen = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                chosen, path = encoding, path + suffix
+                break
+        # send_file hands the open file to wsgi.file_wrapper, which gunicorn serves with sendfile()
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+        if chosen:
+            response.headers['Content-Encoding'] = chosen
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Static asset pipeline')
+    parser.add_argument('command', choices=['build', 'report'])
+    args = parser.parse_args()
+    if args.command == 'build':
+        manifest = build()
+        if brotli is None:
+            print("WARNING: brotli is not installed; only gzip variants were written")
+    else:
+        with open(os.path.join(STATIC_DIR, DIST_NAME, MANIFEST)) as f:
+            manifest = json.load(f)
+    report(manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Structured (JSON lines) logging with a background writer.
+
+Records from the ``lab`` logger tree are checked on the calling thread
+against per-logger sampling rates and rate caps, then queued; formatting,
+PII redaction and the write to stdout happen on a background thread, in
+batches. Every record carries the id of the request it was logged from
+(``X-Request-ID``, generated when the client does not send one), and the
+access log line for a request carries its duration, so log lines can be
+matched with latency data.
+
+Environment:
+    LOG_LEVEL            minimum level for the ``lab`` loggers (default INFO)
+    LOG_SAMPLING         per-logger sample rates, e.g. "lab.access=0.01,lab.contact=1"
+    LOG_RATE_LIMITS      per-logger caps in records/second, e.g. "lab.contact=20"
+    LOG_REDACT_FIELDS    field names whose values are masked (default email,first_name,last_name,password)
+    LOG_QUEUE_SIZE       records waiting for the writer before new ones are dropped (default 10000)
+
+Sampling only applies below WARNING; rate caps apply to every level. The
+rate-limited count is attached to the next record that gets through.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+DEFAULT_SAMPLING = "lab.access=0.01"
+DEFAULT_RATE_LIMITS = "lab.access=50,lab.contact=20"
+DEFAULT_REDACT_FIELDS = "email,first_name,last_name,password"
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+EMAIL_RE = re.compile(r'([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def parse_rates(value):
+    """Parse "name=rate,name=rate" into {name: float}."""
+    rates = {}
+    for item in (value or '').split(','):
+        name, sep, rate = item.partition('=')
+        if sep and name.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def mask_email(value):
+    return EMAIL_RE.sub(lambda m: f"***@{m.group(2)}", value)
+
+
+def redact(fields, names):
+    """Copy of ``fields`` with the named values masked (emails keep their domain)."""
+    clean = {}
+    for key, value in fields.items():
+        if key in names and value is not None:
+            value = mask_email(value) if isinstance(value, str) and '@' in value else '***'
+        elif isinstance(value, str) and '@' in value:
+            value = mask_email(value)
+        clean[key] = value
+    return clean
+
+
+class LogPolicy:
+    """Per-logger sampling and token-bucket rate caps, matched by logger-name prefix."""
+
+    def __init__(self, sampling=None, rate_limits=None):
+        self.sampling = sampling or {}
+        self.rate_limits = rate_limits or {}
+        self.sampled_out = 0
+        self.rate_limited = {}
+        self._rules = {}
+        self._buckets = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lookup(table, name):
+        while name:
+            if name in table:
+                return name, table[name]
+            name = name.rpartition('.')[0]
+        return None, None
+
+    def _rule(self, name):
+        rule = self._rules.get(name)
+        if rule is None:
+            _, rate = self._lookup(self.sampling, name)
+            bucket, limit = self._lookup(self.rate_limits, name)
+            rule = self._rules[name] = (1.0 if rate is None else rate, bucket, limit)
+        return rule
+
+    def sampled(self, name, levelno=logging.INFO):
+        """True if a record at this level survives the logger's sample rate."""
+        rate = self._rule(name)[0]
+        if levelno >= logging.WARNING or rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def admit(self, name):
+        """Take a token from the logger's bucket; returns (allowed, records suppressed since the last one)."""
+        _, bucket, limit = self._rule(name)
+        if limit is None:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(bucket, (limit, now))
+            tokens = min(limit, tokens + (now - stamp) * limit)
+            if tokens < 1:
+                self._buckets[bucket] = (tokens, now)
+                self._suppressed[bucket] = self._suppressed.get(bucket, 0) + 1
+                self.rate_limited[bucket] = self.rate_limited.get(bucket, 0) + 1
+                return False, 0
+            self._buckets[bucket] = (tokens - 1, now)
+            return True, self._suppressed.pop(bucket, 0)
+
+
+class AsyncJsonHandler(logging.Handler):
+    """Queues records on the caller's thread and writes them as JSON lines from a background thread."""
+
+    def __init__(self, policy=None, stream=None, redact_fields=(), queue_size=10000,
+                 batch_size=256, flush_interval=0.1):
+        super().__init__()
+        self.policy = policy or LogPolicy()
+        self.stream = stream
+        self.redact_fields = frozenset(redact_fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            policy=LogPolicy(parse_rates(os.environ.get('LOG_SAMPLING', DEFAULT_SAMPLING)),
+                             parse_rates(os.environ.get('LOG_RATE_LIMITS', DEFAULT_RATE_LIMITS))),
+            redact_fields=[f.strip() for f in os.environ.get('LOG_REDACT_FIELDS', DEFAULT_REDACT_FIELDS).split(',') if f.strip()],
+            queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+        )
+
+    def _ensure_writer(self):
+        # Started lazily, and again after a fork, so each worker owns its writer
+        if self._writer is None or self._writer_pid != os.getpid():
+            with self._writer_lock:
+                if self._writer is None or self._writer_pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._writer = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                    self._writer_pid = os.getpid()
+                    self._writer.start()
+
+    def filter(self, record):
+        if not getattr(record, 'presampled', False) and not self.policy.sampled(record.name, record.levelno):
+            return False
+        allowed, suppressed = self.policy.admit(record.name)
+        if suppressed:
+            record.suppressed = suppressed
+        return allowed and super().filter(record)
+
+    def emit(self, record):
+        # Resolve everything that depends on the calling thread or on mutable args now;
+        # JSON encoding and redaction are left to the writer
+        record.request_id = request_id_var.get()
+        record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.queued += 1
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": mask_email(record.message) if '@' in record.message else record.message,
+            "pid": record.process,
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(redact(fields, self.redact_fields))
+        if getattr(record, 'suppressed', 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+    def _run(self):
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                stream = self.stream or sys.stdout
+                stream.write("".join(self.format(record) + "\n" for record in batch))
+                stream.flush()
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                print(f"WARNING: could not write {len(batch)} log records: {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def stats(self):
+        return {
+            "queued": self.queued,
+            "pending": self._queue.qsize(),
+            "dropped_queue_full": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "sampled_out": self.policy.sampled_out,
+            "rate_limited": dict(self.policy.rate_limited),
+        }
+
+
+class StructuredLogging:
+    """Installs the async JSON handler on the ``lab`` loggers and tags requests with ids."""
+
+    def __init__(self, handler=None, level=logging.INFO, root='lab'):
+        self.handler = handler or AsyncJsonHandler()
+        self.logger = logging.getLogger(root)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.access = logging.getLogger(f'{root}.access')
+        atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls):
+        return cls(AsyncJsonHandler.from_env(), os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    def init_app(self, app):
+        app.wsgi_app = self.wrap(app.wsgi_app)
+
+    def wrap(self, wsgi_app):
+        policy = self.handler.policy
+        access = self.access
+
+        def middleware(environ, start_response):
+            request_id = environ.get(REQUEST_ID_HEADER)
+            if not request_id or not REQUEST_ID_RE.match(request_id):
+                request_id = uuid.uuid4().hex
+            environ['lab.request_id'] = request_id
+            token = request_id_var.set(request_id)
+            status = []
+
+            def tag_response(status_line, headers, exc_info=None):
+                status.append(status_line)
+                headers.append(('X-Request-ID', request_id))
+                return start_response(status_line, headers, exc_info)
+
+            start = time.perf_counter()
+            try:
+                return wsgi_app(environ, tag_response)
+            finally:
+                # Sample before building the record: most requests are not logged at all
+                if access.isEnabledFor(logging.INFO) and policy.sampled(access.name):
+                    access.info("request", extra={"presampled": True, "fields": {
+                        "method": environ.get('REQUEST_METHOD'),
+                        "path": environ.get('PATH_INFO'),
+                        "status": int(status[0].split(' ', 1)[0]) if status else 500,
+                        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    }})
+                request_id_var.reset(token)
+        return middleware
+
+    def flush(self):
+        self.handler.flush()
+
+    def stats(self):
+        return self.handler.stats()
@@ -0,0 +1,343 @@
+import collections
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+log = logging.getLogger('lab.submission_store')
+
+_STOP = object()
+
+
+class SubmissionStore:
+    """Bounded store for contact form submissions.
+
+    Recent submissions are kept in a fixed-size ring buffer. When ``path`` is
+    set, a background writer appends them to a JSONL file in batches, with
+    one write and one fsync per batch (group commit). The request thread only
+    enqueues; when the queue is full ``overflow`` decides whether to drop the
+    write ('drop') or wait up to ``block_timeout`` seconds ('block').
+    The writer is a daemon thread, so ``close()`` must run at process exit
+    (atexit, gunicorn ``worker_exit``) to write out what is still queued.
+    """
+
+    def __init__(self, path=None, recent=100, queue_size=1000, batch_size=256,
+                 flush_interval=0.2, overflow='drop', block_timeout=0.05, fsync=True):
+        self.path = path
+        self.recent = collections.deque(maxlen=recent)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.fsync = fsync
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self.index = SubmissionIndex(path) if path else None
+        if path:
+            self._load_recent()
+
+    @classmethod
+    def from_env(cls, default_path):
+        return cls(
+            path=os.environ.get('CONTACT_STORE_PATH', default_path) or None,
+            recent=int(os.environ.get('CONTACT_STORE_RECENT', 100)),
+            queue_size=int(os.environ.get('CONTACT_STORE_QUEUE', 1000)),
+            overflow=os.environ.get('CONTACT_STORE_OVERFLOW', 'drop'),
+            fsync=os.environ.get('CONTACT_STORE_FSYNC', 'True') == 'True',
+        )
+
+    def _load_recent(self, block=65536):
+        """Fill the ring buffer from the tail of the file without reading all of it."""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                pos = f.tell()
+                data = b""
+                while pos > 0 and data.count(b"\n") <= self.recent.maxlen:
+                    step = min(block, pos)
+                    pos -= step
+                    f.seek(pos)
+                    data = f.read(step) + data
+        except OSError:
+            return
+        lines = data.splitlines()
+        if pos > 0:
+            lines = lines[1:]  # first line may be partial
+        for line in lines[-self.recent.maxlen:] if self.recent.maxlen else []:
+            try:
+                self.recent.append(json.loads(line))
+            except ValueError:
+                continue
+
+    def _ensure_writer(self):
+        # Started lazily, and again after a fork, so each worker owns its writer
+        if self._writer is None or self._writer_pid != os.getpid():
+            with self._lock:
+                if self._writer is None or self._writer_pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._writer = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                    self._writer_pid = os.getpid()
+                    self._writer.start()
+
+    def add(self, submission):
+        """Record a submission. Returns False if it could not be queued for disk."""
+        record = dict(submission)
+        record.setdefault('id', uuid.uuid4().hex)
+        record.setdefault('submitted_at', round(time.time(), 3))
+        self.recent.append(record)
+        self.accepted += 1
+        if not self.path:
+            return True
+        self._ensure_writer()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        pending = self._queue
+        stopping = False
+        while not stopping:
+            item = pending.get()
+            if item is _STOP:
+                pending.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    pending.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+            except OSError as e:
+                log.warning("could not persist contact submissions", extra={"fields": {
+                    "count": len(batch), "path": self.path, "error": str(e)}})
+            else:
+                self._update_index()
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def _update_index(self):
+        # Indexing here keeps the query path down to the lines other workers wrote since
+        try:
+            self.index.catch_up()
+        except (OSError, sqlite3.Error) as e:
+            log.warning("could not update the contact submission index", extra={"fields": {
+                "path": self.index.index_path, "error": str(e)}})
+
+    def _write(self, batch):
+        data = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in batch).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.written += len(batch)
+        self.batches += 1
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def close(self, timeout=5.0):
+        """Write out everything queued and stop this process's writer.
+
+        Waits at most ``timeout`` seconds; a later ``add()`` starts a new writer.
+        """
+        with self._lock:
+            writer = self._writer
+            if writer is None or self._writer_pid != os.getpid():
+                return
+            self._writer = None
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            log.warning("contact submission writer did not drain at shutdown", extra={"fields": {"timeout": timeout}})
+            return
+        writer.join(timeout)
+
+    def stats(self):
+        return {
+            "recent": len(self.recent),
+            "accepted": self.accepted,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+        }
+
+    def __len__(self):
+        return len(self.recent)
+
+    def __iter__(self):
+        return iter(list(self.recent))
+
+
+class SubmissionIndex:
+    """Secondary index over the submissions JSONL file, persisted to SQLite.
+
+    A side file (``<path>.index.sqlite3`` by default) holds the byte offset
+    of every record with its (submitted_at, seq) key and lowercased email,
+    indexed on both, so a page is an index range scan and a few seeks
+    instead of a scan of the JSONL. Nothing is kept in memory per worker;
+    all workers share the side file and it survives restarts.
+
+    ``catch_up()`` indexes lines appended since the last call (by any
+    process). The submission writer calls it after each batch and app.py's
+    preload calls it once at startup, so queries only index a bounded tail
+    (``inline_bytes``) themselves and never scan the whole file on a
+    request thread.
+    """
+
+    def __init__(self, path, index_path=None, inline_bytes=1 << 20, batch_size=5000):
+        self.path = path
+        self.index_path = index_path or path + '.index.sqlite3'
+        self.inline_bytes = inline_bytes
+        self.batch_size = batch_size
+        self._db = None
+        self._db_pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # One connection per process: SQLite connections must not cross a fork
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.index_path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY, offset INTEGER NOT NULL,
+                    submitted_at REAL NOT NULL, email TEXT);
+                CREATE INDEX IF NOT EXISTS records_time ON records (submitted_at, seq);
+                CREATE INDEX IF NOT EXISTS records_email ON records (email, submitted_at, seq);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """)
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def catch_up(self, max_bytes=None):
+        """Index up to ``max_bytes`` (default: all) of the lines appended since the last call."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT value FROM meta WHERE key = 'indexed_to'").fetchone()
+            if row and row[0] == size:
+                return
+            # The write lock makes concurrent workers index each line once
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._index_tail(db, size, max_bytes)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _index_tail(self, db, size, max_bytes):
+        row = db.execute("SELECT value FROM meta WHERE key = 'indexed_to'").fetchone()
+        pos = row[0] if row else 0
+        if size < pos:
+            # File was truncated or replaced; start over
+            db.execute("DELETE FROM records")
+            pos = 0
+        stop = size if max_bytes is None else min(size, pos + max_bytes)
+        seq = db.execute("SELECT coalesce(max(seq) + 1, 0) FROM records").fetchone()[0]
+        rows = []
+        with open(self.path, 'rb') as f:
+            f.seek(pos)
+            while pos < stop:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # partial write still in progress
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    pos += len(line)
+                    continue
+                email = (record.get('email') or '').lower() or None
+                rows.append((seq, pos, float(record.get('submitted_at') or 0), email))
+                seq += 1
+                pos += len(line)
+                if len(rows) >= self.batch_size:
+                    db.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+                    rows = []
+        db.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_to', ?)", (pos,))
+
+    def page(self, email=None, since=None, until=None, after=None, limit=50):
+        """Return (records, last_key) for up to ``limit`` records after the ``after`` key."""
+        self.catch_up(self.inline_bytes)
+        where, params = [], []
+        if email is not None:
+            where.append("email = ?")
+            params.append(email.lower())
+        if since is not None:
+            where.append("submitted_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("submitted_at <= ?")
+            params.append(until)
+        if after is not None:
+            where.append("(submitted_at, seq) > (?, ?)")
+            params.extend(after)
+        query = "SELECT submitted_at, seq, offset FROM records"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY submitted_at, seq LIMIT ?"
+        with self._lock:
+            rows = self._connect().execute(query, params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            return [], None
+        with open(self.path, 'rb') as f:
+            records = []
+            for _, _, offset in rows:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records, (tuple(rows[-1][:2]) if more else None)
+
+    def iter_records(self, email=None, since=None, until=None, chunk=500):
+        """Yield matching records in time order, one page of offsets at a time."""
+        after = None
+        while True:
+            records, after = self.page(email, since, until, after, chunk)
+            yield from records
+            if after is None:
+                return
+
+    def __len__(self):
+        self.catch_up(self.inline_bytes)
+        with self._lock:
+            return self._connect().execute("SELECT coalesce(max(seq) + 1, 0) FROM records").fetchone()[0]
@@ -5,6 +5,13 @@ import os
 # Add the parent directory to sys.path to allow importing the app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Keep contact submissions written during tests out of app/data
+import tempfile
+os.environ.setdefault('CONTACT_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'contact_submissions.jsonl'))
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp())
+# Every /api/* response in the suite is checked against openapi/openapi.json
+os.environ.setdefault('OPENAPI_VALIDATE_RESPONSES', 'True')
+
 from app import app
 
 @pytest.fixture
@@ -37,6 +44,32 @@ def test_healthz_route(client):
     assert rv.status_code == 200
     assert rv.data == b"OK"
 
+def test_readyz_flips_after_warmup(client):
+    """Test that /readyz warms the app if needed and reports ready with its startup phases."""
+    rv = client.get('/readyz')
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert data['ready'] is True and data['pending'] == []
+    assert {'imports', 'preload'} <= set(data['phases_ms'])
+
+def test_startup_timer_waits_for_required_components():
+    """Test that readiness stays off until every required component completes."""
+    import startup
+    timer = startup.StartupTimer(required=('preload',))
+    timer.mark('imports')
+    with timer.phase('preload'):
+        pass
+    timer.require('password_pool')
+    timer.complete('preload')
+    assert not timer.ready and timer.report()['pending'] == ['password_pool']
+    timer.complete('password_pool')
+    assert timer.ready and timer.report()['ready_after_ms'] is not None
+    assert set(timer.report()['phases_ms']) == {'imports', 'preload'}
+    rows = startup.parse_importtime("import time: self [us] | cumulative | imported package\n"
+                                    "import time:       120 |        120 |   json.decoder\n"
+                                    "import time:       300 |        420 | json\n")
+    assert rows == [('json.decoder', 1, 120, 120), ('json', 0, 300, 420)]
+
 def test_alive_route(client):
     """Test that the alive route returns the content 'UP'."""
     rv = client.get('/alive')
@@ -133,3 +166,1059 @@ def test_contact_post(client):
     assert rv.status_code == 200
     assert b"Submission Received" in rv.data
     assert b"Thank you, John" in rv.data
+
+def test_docs_index_reloads_on_change(tmp_path):
+    """Test that the docs index only re-parses the file when it changes."""
+    from docs_index import DocsIndex
+    doc = tmp_path / "doc.txt"
+    doc.write_text("Intro\nFirst body line.\nSecond Heading\nSecond body line.\n")
+    index = DocsIndex(str(doc), check_interval=0)
+    assert index.refresh(force=True)
+    assert index.section("Second Heading") == "Second Heading\nSecond body line."
+    version = index.version
+    assert not index.refresh()
+    doc.write_text("Intro\nFirst body line.\nOther Heading\nReplaced body text here.\n")
+    assert index.refresh()
+    assert index.version == version + 1
+    assert index.section("Second Heading") is None
+    assert "Replaced body" in index.section("Other Heading")
+
+def test_api_vibe_coding_serves_prebuilt_body(client):
+    """Test that repeated /api/vibe-coding calls reuse the same encoded body."""
+    import app as app_module
+    client.get('/api/vibe-coding')
+    cached = app_module._vibe_payloads['definition']
+    rv = client.get('/api/vibe-coding')
+    assert rv.data == cached[1]
+    assert app_module._vibe_payloads['definition'] is cached
+
+def test_api_search(client):
+    """Test the /api/search endpoint returns ranked, highlighted sections."""
+    rv = client.get('/api/search?q=Karpathy&limit=2')
+    assert rv.status_code == 200
+    assert rv.headers['Content-Type'] == 'application/json'
+    json_data = rv.get_json()
+    assert json_data['count'] == len(json_data['results']) <= 2
+    assert json_data['results'][0]['section'] == "Definition and History"
+    assert "<mark>Karpathy</mark>" in json_data['results'][0]['snippet']
+
+def test_api_search_requires_query(client):
+    """Test that /api/search rejects a missing query."""
+    rv = client.get('/api/search')
+    assert rv.status_code == 400
+    assert 'error' in rv.get_json()
+
+def test_search_index_roundtrip(tmp_path):
+    """Test that a persisted search index loads back with identical results."""
+    import app as app_module
+    import search_index
+    built = search_index.SearchIndex.build(app_module.vibe_index.sections)
+    path = str(tmp_path / "index.json.z")
+    built.save(path)
+    loaded = search_index.SearchIndex.load(path, built.fingerprint)
+    assert loaded.query("security risks") == built.query("security risks")
+    assert search_index.SearchIndex.load(path, "stale") is None
+
+def test_user_store_reload_and_last_good_snapshot(tmp_path):
+    """Test that the user store reloads on change and keeps serving after a bad reload."""
+    from user_store import UserStore
+    path = tmp_path / "users.json"
+    path.write_text('{"alice": "hash-a"}')
+    store = UserStore(str(path), check_interval=0)
+    assert store.get("alice") == "hash-a"
+    path.write_text('{"alice": "hash-a", "bob": "hash-b"}')
+    assert store.get("bob") == "hash-b"
+    path.write_text('{"broken json')
+    assert store.get("bob") == "hash-b"
+    assert store.last_error is not None
+
+def test_user_store_backs_off_after_failed_reload(tmp_path, monkeypatch):
+    """Test that a broken users file is retried only once it changes, even after SIGHUP."""
+    import user_store
+    from user_store import UserStore
+    warnings = []
+    monkeypatch.setattr(user_store.log, 'warning', lambda msg, *args, **kwargs: warnings.append(msg))
+    path = tmp_path / "users.json"
+    path.write_text('{"alice": "hash-a"}')
+    store = UserStore(str(path), check_interval=0)
+    assert store.get("alice") == "hash-a"
+    path.write_text('{"broken json')
+    store.invalidate()
+    for _ in range(5):
+        assert store.get("alice") == "hash-a"
+    assert warnings == ["keeping last good user snapshot, reload failed"]
+    path.write_text('{"alice": "hash-a2"}')
+    assert store.get("alice") == "hash-a2"
+    assert store.last_error is None
+
+def test_user_store_unavailable_is_not_invalid_password(tmp_path):
+    """Test that a failed initial user load returns 503 instead of a login error."""
+    import app as app_module
+    from user_store import UserStore
+    original = app_module.user_store
+    app_module.user_store = UserStore(str(tmp_path / "missing.json"))
+    try:
+        app_module.app.config['TESTING'] = True
+        rv = app_module.app.test_client().post('/login', data=dict(username='f5user', password='f5password'))
+        assert rv.status_code == 503
+        assert b"temporarily unavailable" in rv.data
+    finally:
+        app_module.user_store = original
+
+def test_login_fails_fast_when_verify_pool_is_full(client):
+    """Test that a saturated verification pool answers 503 with Retry-After."""
+    import app as app_module
+    from password_pool import PasswordVerifier
+    original = app_module.password_verifier
+    app_module.password_verifier = PasswordVerifier(workers=0, max_pending=1, retry_after=3)
+    app_module.password_verifier._slots.acquire()
+    try:
+        rv = client.post('/login', data=dict(username='f5user', password='f5password'))
+        assert rv.status_code == 503
+        assert rv.headers['Retry-After'] == '3'
+        assert app_module.password_verifier.stats()['rejected'] == 1
+    finally:
+        app_module.password_verifier = original
+
+def test_password_pool_children_do_not_import_app(tmp_path):
+    """Test that spawned password pool children never import the app or Flask from a serve.py-style entry."""
+    import subprocess
+    import textwrap
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    entry = tmp_path / "entry.py"
+    entry.write_text(textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {app_dir!r})
+
+        if __name__ == '__main__':
+            import app
+            executor = app.password_verifier._get_executor()
+            probe = "sorted({{'app', 'flask'}} & set(__import__('sys').modules))"
+            print(executor.submit(eval, probe).result())
+            app.password_verifier.shutdown()
+    """))
+    env = dict(os.environ, PASSWORD_POOL_WORKERS='1', PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"),
+               CONTACT_STORE_PATH=str(tmp_path / "contact.jsonl"))
+    result = subprocess.run([sys.executable, str(entry)], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+def test_running_app_py_hands_off_to_serve_py(tmp_path):
+    """Test that `python app/app.py` re-execs as serve.py, so pool children never re-import app.py."""
+    import time
+    import socket
+    import subprocess
+    import urllib.request
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='False', PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"),
+               CONTACT_STORE_PATH=str(tmp_path / "contact.jsonl"))
+    proc = subprocess.Popen([sys.executable, os.path.join(app_dir, 'app.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("dev server did not start")
+        with open(f'/proc/{proc.pid}/cmdline', 'rb') as f:
+            argv = f.read().split(b'\0')
+        assert argv[1].endswith(b'serve.py')
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+def test_password_pool_stats(client):
+    """Test that the password pool exposes queue depth and latency."""
+    rv = client.get('/internal/password-pool')
+    assert rv.status_code == 200
+    json_data = rv.get_json()
+    assert {'workers', 'max_pending', 'pending', 'latency_ms'} <= set(json_data)
+
+def test_mmap_token_bucket_is_shared_between_instances(tmp_path):
+    """Test that two limiter instances over one file (as in two workers) share buckets."""
+    from login_throttle import MmapBackend, TokenBucket
+    path = str(tmp_path / "throttle.bin")
+    first = TokenBucket(rate=0.001, burst=2, backend=MmapBackend(path, slots=64))
+    second = TokenBucket(rate=0.001, burst=2, backend=MmapBackend(path, slots=64))
+    assert first.take("10.0.0.1")[0]
+    assert second.take("10.0.0.1")[0]
+    allowed, retry_after = first.take("10.0.0.1")
+    assert not allowed and retry_after >= 1
+    assert second.take("10.0.0.2")[0]
+    assert second.stats()['allowed'] == 3
+    assert second.stats()['rejected'] == 1
+
+def test_login_throttle_rejects_before_hash_check(client):
+    """Test that throttled logins get 429 without reaching password verification."""
+    import app as app_module
+    from login_throttle import LoginThrottle, MemoryBackend, TokenBucket
+    original = app_module.login_throttle
+    app_module.login_throttle = LoginThrottle(
+        TokenBucket(rate=0.001, burst=5, backend=MemoryBackend()),
+        TokenBucket(rate=0.001, burst=1, backend=MemoryBackend()),
+    )
+    try:
+        client.post('/login', data=dict(username='f5user', password='wrong'))
+        verified_before = app_module.password_verifier.stats()['verified']
+        assert verified_before >= 1
+        rv = client.post('/login', data=dict(username='f5user', password='f5password'))
+        assert rv.status_code == 429
+        assert 'Retry-After' in rv.headers
+        stats = client.get('/internal/login-throttle').get_json()
+        assert stats['username']['rejected'] == 1
+        assert app_module.password_verifier.stats()['verified'] == verified_before
+    finally:
+        app_module.login_throttle = original
+
+def test_login_throttle_keys_on_forwarded_client_ip(client):
+    """Test that behind a trusted proxy each X-Forwarded-For client gets its own IP bucket."""
+    import app as app_module
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from login_throttle import LoginThrottle, MemoryBackend, TokenBucket
+    original_throttle, original_wsgi = app_module.login_throttle, app_module.app.wsgi_app
+    app_module.login_throttle = LoginThrottle(
+        TokenBucket(rate=0.001, burst=1, backend=MemoryBackend()),
+        TokenBucket(rate=0.001, burst=5, backend=MemoryBackend()),
+    )
+    app_module.app.wsgi_app = ProxyFix(original_wsgi, x_for=1)
+    try:
+        first = {'X-Forwarded-For': '198.51.100.7'}
+        assert client.post('/login', data=dict(username='nobody', password='x'), headers=first).status_code == 200
+        assert client.post('/login', data=dict(username='nobody', password='x'), headers=first).status_code == 429
+        other = {'X-Forwarded-For': '203.0.113.9'}
+        assert client.post('/login', data=dict(username='nobody', password='x'), headers=other).status_code == 200
+    finally:
+        app_module.login_throttle, app_module.app.wsgi_app = original_throttle, original_wsgi
+
+def test_gunicorn_conf_sizing():
+    """Test that the gunicorn config sizes workers from the available CPUs."""
+    import gunicorn_conf
+    assert gunicorn_conf.available_cpus() >= 1
+    assert gunicorn_conf.workers >= 1
+    assert gunicorn_conf.preload_app is True
+    assert gunicorn_conf.resolve_worker_class('gthread') == 'gthread'
+
+def test_submission_store_ring_buffer_and_group_commit(tmp_path):
+    """Test that the submission store stays bounded and persists in batches."""
+    from submission_store import SubmissionStore
+    path = str(tmp_path / "submissions.jsonl")
+    store = SubmissionStore(path, recent=5, queue_size=100)
+    for i in range(20):
+        assert store.add({"email": f"user{i}@example.com"})
+    store.flush()
+    assert len(store) == 5
+    assert store.stats()['written'] == 20
+    assert store.stats()['batches'] < 20
+    with open(path) as f:
+        assert len(f.readlines()) == 20
+    reloaded = SubmissionStore(path, recent=3)
+    assert [s['email'] for s in reloaded] == ["user17@example.com", "user18@example.com", "user19@example.com"]
+
+def test_submission_store_drops_when_queue_full(tmp_path):
+    """Test that a full write queue drops instead of blocking the request thread."""
+    import threading
+    from submission_store import SubmissionStore
+    store = SubmissionStore(str(tmp_path / "submissions.jsonl"), queue_size=1, batch_size=1)
+    gate = threading.Event()
+    original_write = store._write
+    store._write = lambda batch: (gate.wait(5), original_write(batch))
+    results = [store.add({"n": i}) for i in range(5)]
+    gate.set()
+    store.flush()
+    assert not all(results)
+    assert store.stats()['dropped'] == results.count(False)
+
+def test_submission_store_close_writes_queued_records(tmp_path):
+    """Test that closing the store (as at worker exit) persists everything still queued."""
+    from submission_store import SubmissionStore
+    path = str(tmp_path / "submissions.jsonl")
+    store = SubmissionStore(path, flush_interval=30)
+    for i in range(10):
+        assert store.add({"n": i})
+    store.close()
+    assert store.stats()['written'] == 10
+    assert [record["n"] for record in SubmissionStore(path).index.iter_records()] == list(range(10))
+
+def test_submission_index_is_persisted_and_caught_up_incrementally(tmp_path):
+    """Test that the submission index lives in an SQLite side file and only indexes new lines."""
+    import json
+    from submission_store import SubmissionIndex, SubmissionStore
+    path = str(tmp_path / "submissions.jsonl")
+    store = SubmissionStore(path)
+    for i in range(6):
+        store.add({"n": i, "email": "A@example.com" if i % 2 else "b@example.com", "submitted_at": 100.0 + i})
+    store.close()
+    assert os.path.exists(path + ".index.sqlite3")
+    with open(path, 'a') as f:
+        f.write("".join(json.dumps({"n": i, "submitted_at": 100.0 + i}) + "\n" for i in range(6, 9)))
+    index = SubmissionIndex(path, inline_bytes=1)
+    # each query indexes at most a bounded tail (here one line) written by another process
+    assert len(index) == 7
+    assert [r["n"] for r in index.page(email="a@EXAMPLE.com")[0]] == [1, 3, 5]
+    assert len(index) == 9
+    index.catch_up()
+    records, last_key = index.page(since=103, limit=3)
+    assert [r["n"] for r in records] == [3, 4, 5] and last_key == (105.0, 5)
+    assert [r["n"] for r in index.page(since=103, after=last_key)[0]] == [6, 7, 8]
+    open(path, 'w').close()
+    assert len(SubmissionIndex(path)) == 0
+
+@pytest.fixture
+def submissions(tmp_path):
+    """Swap in a persisted submission store with a few known entries."""
+    import app as app_module
+    from submission_store import SubmissionStore
+    original = app_module.contact_submissions
+    store = SubmissionStore(str(tmp_path / "submissions.jsonl"))
+    for i in range(5):
+        store.add({"first_name": f"User{i}", "last_name": "Doe", "email": "a@example.com" if i % 2 else "b@example.com",
+                   "message": "hi", "submitted_at": 1000.0 + i})
+    store.flush()
+    app_module.contact_submissions = store
+    yield store
+    app_module.contact_submissions = original
+
+def test_contact_submissions_requires_login(client, submissions):
+    """Test that the contact submissions API needs a logged-in session."""
+    rv = client.get('/api/contact-submissions')
+    assert rv.status_code == 401
+
+def test_contact_submissions_cursor_pagination(client, submissions):
+    """Test cursor pagination and email/time filters on contact submissions."""
+    with client.session_transaction() as sess:
+        sess['user'] = 'f5user'
+    rv = client.get('/api/contact-submissions?limit=2')
+    page = rv.get_json()
+    assert [item['first_name'] for item in page['items']] == ['User0', 'User1']
+    rv = client.get(f"/api/contact-submissions?limit=2&cursor={page['next_cursor']}")
+    assert [item['first_name'] for item in rv.get_json()['items']] == ['User2', 'User3']
+    rv = client.get('/api/contact-submissions?email=A@example.com')
+    assert [item['first_name'] for item in rv.get_json()['items']] == ['User1', 'User3']
+    rv = client.get('/api/contact-submissions?since=1002&until=1003')
+    data = rv.get_json()
+    assert [item['first_name'] for item in data['items']] == ['User2', 'User3']
+    assert data['next_cursor'] is None
+
+def test_contact_submissions_streaming_export(client, submissions):
+    """Test NDJSON and CSV streaming exports of contact submissions."""
+    with client.session_transaction() as sess:
+        sess['user'] = 'f5user'
+    rv = client.get('/api/contact-submissions?format=ndjson')
+    assert rv.is_streamed
+    lines = rv.data.decode().splitlines()
+    assert len(lines) == 5
+    rv = client.get('/api/contact-submissions?format=csv&email=b@example.com')
+    rows = rv.data.decode().splitlines()
+    assert rows[0].startswith('id,submitted_at,first_name')
+    assert len(rows) == 4
+
+def test_conditional_get_returns_304(client):
+    """Test that pages and APIs send ETags and answer If-None-Match with 304."""
+    for path in ('/about', '/api/vibe-coding'):
+        rv = client.get(path)
+        etag = rv.headers['ETag']
+        assert 'public' in rv.headers['Cache-Control']
+        assert 'Surrogate-Control' in rv.headers
+        rv = client.get(path, headers={'If-None-Match': etag})
+        assert rv.status_code == 304
+        assert rv.data == b""
+
+def test_cached_doc_routes_follow_doc_edits(client, tmp_path, monkeypatch):
+    """Test that editing the doc changes the cached API body and its ETag."""
+    import shutil
+    import app as app_module
+    from docs_index import DocsIndex
+    doc = tmp_path / "Vibe-Coding.txt"
+    shutil.copy(app_module.VIBE_DOC_PATH, doc)
+    monkeypatch.setattr(app_module, 'vibe_index', DocsIndex(str(doc), check_interval=0))
+    monkeypatch.setattr(app_module, '_vibe_payloads', {})
+    app_module.response_cache.clear()
+    try:
+        before = client.get('/api/vibe-coding')
+        assert client.get('/api/vibe-coding', headers={'If-None-Match': before.headers['ETag']}).status_code == 304
+        heading = app_module.VIBE_TOPICS['definition'].encode()
+        doc.write_bytes(doc.read_bytes().replace(heading, heading + b"\nEdited for the cache test.", 1))
+        after = client.get('/api/vibe-coding', headers={'If-None-Match': before.headers['ETag']})
+        assert after.status_code == 200
+        assert after.headers['ETag'] != before.headers['ETag']
+        assert "Edited for the cache test." in after.get_json()['content']
+        assert "Edited for the cache test." not in before.get_json()['content']
+    finally:
+        app_module.response_cache.clear()
+
+def test_cached_pages_respect_login_state(client):
+    """Test that logged-in page variants are private and not shared with anonymous users."""
+    anonymous = client.get('/')
+    with client.session_transaction() as sess:
+        sess['user'] = 'f5user'
+    rv = client.get('/', headers={'If-None-Match': anonymous.headers['ETag']})
+    assert rv.status_code == 200
+    assert b"Welcome," in rv.data
+    assert rv.headers['Cache-Control'].startswith('private')
+    assert 'Cookie' in rv.headers['Vary']
+
+def test_prerendered_pages_match_live_render(tmp_path):
+    """Test that prerendered page variants equal what Jinja renders live."""
+    import app as app_module
+    import prerender
+    flask_app = app_module.app
+    template_dir = os.path.join(flask_app.root_path, flask_app.template_folder)
+    prerender.build(flask_app, str(tmp_path))
+    pages = prerender.PrerenderedPages.load(str(tmp_path), template_dir)
+    assert len(pages) == len(prerender.PAGES)
+    from flask import render_template, session
+    with flask_app.test_request_context('/'):
+        assert pages.render('home') == render_template('home.html').encode('utf-8')
+        session['user'] = '<f5user>'
+        assert pages.render('docs', '<f5user>') == render_template('docs.html').encode('utf-8')
+    assert pages.render('contact') is None
+
+def test_prerendered_pages_go_stale_with_image_manifest(tmp_path, monkeypatch):
+    """Test that rebuilding the responsive images invalidates the prerendered pages."""
+    import prerender
+    template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates')
+    images = tmp_path / "images.json"
+    images.write_text('{"img/logo.png": {"480": "img/logo.aaaa.480w.webp"}}')
+    monkeypatch.setattr(prerender, 'IMAGE_MANIFEST', str(images))
+    before = prerender.templates_digest(template_dir)
+    images.write_text('{"img/logo.png": {"480": "img/logo.bbbb.480w.webp"}}')
+    assert prerender.templates_digest(template_dir) != before
+
+def test_static_pipeline_hashed_precompressed_assets(tmp_path):
+    """Test hashed static URLs, Accept-Encoding negotiation and immutable caching."""
+    import shutil
+    from flask import Flask, url_for
+    import static_pipeline
+    static_dir = tmp_path / "static"
+    shutil.copytree(os.path.join(os.path.dirname(__file__), '..', 'static', 'css'), static_dir / "css")
+    manifest = static_pipeline.build(str(static_dir))
+    assert 'gzip' in manifest['css/style.css']['encodings']
+    flask_app = Flask(__name__, static_folder=str(static_dir))
+    static_pipeline.StaticAssets(str(static_dir)).init_app(flask_app)
+    with flask_app.test_request_context('/'):
+        url = url_for('static', filename='css/style.css')
+    assert url.startswith('/static/dist/css/style.') and url.endswith('.css')
+    client = flask_app.test_client()
+    rv = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert rv.status_code == 200
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert 'Accept-Encoding' in rv.headers['Vary']
+    import gzip
+    assert gzip.decompress(rv.data) == (static_dir / "css" / "style.css").read_bytes()
+    rv.close()
+    rv = client.get(url)
+    assert 'Content-Encoding' not in rv.headers
+    rv.close()
+    assert client.get('/static/css/style.css').status_code == 200
+
+def test_image_pipeline_derivatives_and_srcset(tmp_path):
+    """Test that image derivatives are cached by source hash and rendered as srcset."""
+    Image = pytest.importorskip('PIL.Image')
+    from flask import Flask
+    import image_pipeline
+    (tmp_path / "images").mkdir()
+    Image.new('RGB', (1000, 500), 'red').save(tmp_path / "images" / "hero.png")
+    Image.new('RGB', (1000, 500), 'blue').save(tmp_path / "images" / "unused.png")
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "home.html").write_text("{{ responsive_image('images/hero.png', alt='Hero') }}")
+    manifest = image_pipeline.build(str(tmp_path), widths=(480,), template_dir=str(templates))
+    assert list(manifest) == ['images/hero.png']
+    webp = manifest['images/hero.png']['derivatives']['webp']
+    assert [variant[0] for variant in webp] == [480, 1000]
+    derivative = tmp_path / webp[0][1]
+    mtime = derivative.stat().st_mtime_ns
+    image_pipeline.build(str(tmp_path), widths=(480,), template_dir=str(templates))
+    assert derivative.stat().st_mtime_ns == mtime
+    # new encoder settings get new names, so cached URLs never serve the old encoding
+    requality = image_pipeline.build(str(tmp_path), widths=(480,), template_dir=str(templates),
+                                     quality={'avif': 40, 'webp': 60})
+    assert requality['images/hero.png']['hash'] != manifest['images/hero.png']['hash']
+    assert not derivative.exists()
+    manifest = image_pipeline.build(str(tmp_path), widths=(480,), template_dir=str(templates))
+    webp = manifest['images/hero.png']['derivatives']['webp']
+    flask_app = Flask(__name__, static_folder=str(tmp_path))
+    images = image_pipeline.ResponsiveImages(str(tmp_path))
+    images.init_app(flask_app)
+    with flask_app.test_request_context('/'):
+        html = str(images.picture('images/hero.png', alt='Hero', class_='w-full'))
+        assert '<source type="image/webp"' in html
+        assert 'hero.' in html and '480w' in html
+        assert 'class="w-full"' in html
+        assert str(images.picture('images/missing.png', alt='x')).startswith('<img ')
+
+def test_tailwind_stylesheet_covers_template_classes(client):
+    """Test that pages use the prebuilt Tailwind stylesheet and that it styles every template class."""
+    import re
+    rv = client.get('/')
+    assert b"cdn.tailwindcss.com" not in rv.data
+    assert b"css/app." in rv.data
+    app_dir = os.path.join(os.path.dirname(__file__), '..')
+    with open(os.path.join(app_dir, 'static', 'css', 'app.css'), encoding='utf-8') as f:
+        css = f.read()
+    classes = set()
+    for name in os.listdir(os.path.join(app_dir, 'templates')):
+        with open(os.path.join(app_dir, 'templates', name), encoding='utf-8') as f:
+            for value in re.findall(r'class="([^"]*)"', f.read()):
+                classes.update(value.split())
+    # the CLI silently drops classes it has no utility for (typos, v3-only names, plugin classes)
+    unstyled = [c for c in sorted(classes) if '.' + re.sub(r'([^\w-])', r'\\\1', c) not in css]
+    assert unstyled == []
+
+def test_tailwind_stylesheet_is_current(tmp_path):
+    """Test that the committed stylesheet is what the pinned Tailwind CLI builds from the templates."""
+    import shutil
+    import subprocess
+    cli = shutil.which('tailwindcss')
+    if cli is None:
+        pytest.skip("Tailwind CLI not installed (pip install --require-hashes -r requirements-tailwind.txt)")
+    app_dir = os.path.join(os.path.dirname(__file__), '..')
+    out = tmp_path / "app.css"
+    subprocess.run([cli, '-i', os.path.join(app_dir, 'tailwind.css'), '-o', str(out), '--minify'],
+                   check=True, capture_output=True)
+    with open(os.path.join(app_dir, 'static', 'css', 'app.css'), encoding='utf-8') as f:
+        assert f.read() == out.read_text(encoding='utf-8'), \
+            "run tailwindcss -i app/tailwind.css -o app/static/css/app.css --minify"
+
+def test_metrics_endpoint(client):
+    """Test that /metrics exports per-endpoint request counters and latency histograms."""
+    client.get('/api/status')
+    client.get('/does-not-exist')
+    rv = client.get('/metrics')
+    assert rv.status_code == 200
+    assert rv.content_type.startswith('text/plain; version=0.0.4')
+    text = rv.data.decode('utf-8')
+    assert '# TYPE lab_http_request_duration_seconds histogram' in text
+    assert 'lab_http_requests_total{endpoint="api_status",method="GET",status="200"}' in text
+    assert 'lab_http_requests_total{endpoint="none",method="GET",status="404"}' in text
+    assert 'lab_http_request_duration_seconds_bucket{endpoint="api_status",le="+Inf",method="GET"}' in text
+    assert 'lab_http_requests_in_flight 1.0' in text
+
+def test_metrics_aggregate_across_processes():
+    """Test that samples written by a forked worker are summed and its gauges dropped on exit."""
+    import metrics
+    import app as app_module
+    registry = app_module.metrics_registry
+    requests_total = registry.counter('t_requests', 'Requests.', ('endpoint',))
+    latency = registry.histogram('t_latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    in_flight = registry.gauge('t_in_flight', 'In flight.')
+    requests_total.labels('home').inc()
+    latency.observe(0.05)
+    pid = os.fork()
+    if pid == 0:
+        requests_total.labels('home').inc(2)
+        latency.observe(0.5)
+        in_flight.inc()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    text = registry.render().decode('utf-8')
+    assert 't_requests_total{endpoint="home"} 3.0' in text
+    assert 't_latency_seconds_bucket{le="0.1"} 1.0' in text
+    assert 't_latency_seconds_bucket{le="1.0"} 2.0' in text
+    assert 't_latency_seconds_bucket{le="+Inf"} 2.0' in text
+    assert 't_latency_seconds_count 2.0' in text
+    assert 't_in_flight 1.0' in text
+    registry.mark_process_dead(pid)
+    text = registry.render().decode('utf-8')
+    assert 't_in_flight 0.0' in text
+    assert 't_requests_total{endpoint="home"} 3.0' in text
+    assert metrics.MULTIPROC_DIR == os.environ['PROMETHEUS_MULTIPROC_DIR']
+
+def test_metrics_remove_files_and_directories_of_dead_processes(tmp_path):
+    """Test that stale per-process files and orphaned default directories are deleted."""
+    import metrics
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    for name in (f"counter_{pid}.db", f"gauge_livesum_{pid}.db", f"counter_{os.getpid()}.db", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    metrics.MetricsRegistry(str(tmp_path)).remove_stale()
+    assert sorted(os.listdir(tmp_path)) == [f"counter_{os.getpid()}.db", "notes.txt"]
+    base = tmp_path / "shm"
+    for name in (f"lab-metrics-{pid}-abc", f"lab-metrics-{os.getpid()}-def", "other"):
+        (base / name).mkdir(parents=True)
+    metrics.remove_orphaned_directories(str(base))
+    assert sorted(os.listdir(base)) == [f"lab-metrics-{os.getpid()}-def", "other"]
+    registry = metrics.MetricsRegistry(str(base / f"lab-metrics-{os.getpid()}-def"))
+    registry.remove_directory(os.getpid() + 1)
+    assert os.path.exists(registry.directory)
+    registry.remove_directory(os.getpid())
+    assert not os.path.exists(registry.directory)
+
+def test_dev_server_removes_default_metrics_dir_on_sigterm(tmp_path):
+    """Test that SIGTERM to the dev server still runs atexit, so its /dev/shm metrics dir goes away."""
+    import glob
+    import time
+    import socket
+    import subprocess
+    import urllib.request
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='False', SERVE_MODE='dev',
+               CONTACT_STORE_PATH=str(tmp_path / "contact.jsonl"))
+    del env['PROMETHEUS_MULTIPROC_DIR']
+    proc = subprocess.Popen([sys.executable, os.path.join(app_dir, 'serve.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("dev server did not start")
+        pattern = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                               f"lab-metrics-{proc.pid}-*")
+        assert len(glob.glob(pattern)) == 1
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    assert glob.glob(pattern) == []
+
+def test_request_profiler_dumps_per_route_with_cap(tmp_path, monkeypatch):
+    """Test token-triggered profiling, per-endpoint dumps, the ring-buffer cap and the summary CLI."""
+    import io
+    from flask import Flask
+    import request_profiler
+    monkeypatch.delenv('PROFILE_ENABLED', raising=False)
+    monkeypatch.delenv('PROFILE_TOKEN', raising=False)
+    assert request_profiler.RequestProfiler.from_env() is None
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule('/work', 'work', lambda: str(sum(range(10000))))
+    profiler = request_profiler.RequestProfiler(str(tmp_path), token='s3cret', max_files=2)
+    profiler.init_app(flask_app)
+    client = flask_app.test_client()
+    assert 'X-Profile-Dump' not in client.get('/work').headers
+    assert 'X-Profile-Dump' not in client.get('/work', headers={'X-Profile-Token': 'wrong'}).headers
+    for _ in range(3):
+        with client.get('/work', headers={'X-Profile-Token': 's3cret'}) as rv:
+            assert rv.headers['X-Profile-Dump'].startswith('work/')
+    assert len(os.listdir(tmp_path / 'work')) == 2
+    assert os.path.basename(rv.headers['X-Profile-Dump']) in os.listdir(tmp_path / 'work')
+    out = io.StringIO()
+    request_profiler.summarize(str(tmp_path), stream=out)
+    assert '== work: 2 profiles' in out.getvalue()
+    merged = tmp_path / 'merged.pstats'
+    assert request_profiler.merge(str(merged), str(tmp_path)) == 2
+    assert merged.exists()
+
+def test_request_profiler_collapsed_stacks(tmp_path):
+    """Test that sampled stacks are written in collapsed (flamegraph) format."""
+    import time as time_module
+    from flask import Flask
+    import request_profiler
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule('/slow', 'slow', lambda: time_module.sleep(0.05) or 'done')
+    request_profiler.RequestProfiler(str(tmp_path), sample_rate=1.0, fmt='collapsed').init_app(flask_app)
+    assert flask_app.test_client().get('/slow').data == b'done'
+    (dump,) = os.listdir(tmp_path / 'slow')
+    assert dump.endswith('.folded')
+    stacks = request_profiler.read_folded([str(tmp_path / 'slow' / dump)])
+    assert sum(stacks.values()) > 0
+    assert any('<lambda>' in stack for stack in stacks)
+
+def test_loadtest_report_and_regression_gate(tmp_path):
+    """Test the load-test harness: scenario parsing, per-route percentiles and baseline comparison."""
+    import loadtest
+    scenario_file = tmp_path / 'scenario.jsonl'
+    scenario_file.write_text(
+        '# comment lines are skipped\n'
+        '{"name": "status", "path": "/api/status", "weight": 3}\n'
+        '{"name": "missing", "path": "/no-such-page", "expect": [404]}\n'
+    )
+    scenario = loadtest.load_scenario(str(scenario_file))
+    assert [entry['name'] for entry in scenario] == ['status', 'missing']
+    assert loadtest.percentile([1, 2, 3, 4], 50) == 2
+    assert loadtest.percentile(list(range(1, 101)), 95) == 95
+    app.config['TESTING'] = True
+    report = loadtest.run(scenario, lambda: loadtest.InProcessClient(app), clients=2, requests=40)
+    assert report['requests'] == 40
+    assert set(report['routes']) == {'status', 'missing'}
+    assert all(route['errors'] == 0 for route in report['routes'].values())
+    assert loadtest.compare(report, report) == []
+    faster = {'clients': 2, 'routes': {'status': dict(report['routes']['status'], p95_ms=0.001, throughput_rps=1e9)}}
+    regressions = loadtest.compare(report, faster, threshold=0.5, min_regression_ms=0)
+    assert any(message.startswith('status: p95') for message in regressions)
+    assert any(message.startswith('status: throughput') for message in regressions)
+
+def test_loadtest_in_process_run_keeps_data_out_of_app(tmp_path):
+    """Test that an in-process load test writes submissions and metric files to a scratch dir it removes."""
+    import subprocess
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    env = {k: v for k, v in os.environ.items() if k not in ('CONTACT_STORE_PATH', 'PROMETHEUS_MULTIPROC_DIR')}
+    code = ("import os, loadtest; loadtest.in_process_factory(); "
+            "print(os.environ['CONTACT_STORE_PATH']); print(os.environ['PROMETHEUS_MULTIPROC_DIR'])")
+    proc = subprocess.run([sys.executable, '-c', code], cwd=app_dir, env=env, capture_output=True, text=True, check=True)
+    store_path, metrics_dir = proc.stdout.split()
+    scratch = os.path.dirname(store_path)
+    assert os.path.dirname(metrics_dir) == scratch
+    assert not scratch.startswith(app_dir) and not os.path.exists(scratch)
+
+@pytest.mark.skipif(os.environ.get('RUN_BENCHMARKS') != '1', reason='set RUN_BENCHMARKS=1 to run the latency regression gate')
+def test_benchmark_against_baseline():
+    """Replay the default scenario in-process and fail on p95/throughput regressions."""
+    import json
+    import loadtest
+    with open(loadtest.DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+    app.config['TESTING'] = True
+    report = loadtest.run(loadtest.load_scenario(loadtest.DEFAULT_SCENARIO), lambda: loadtest.InProcessClient(app),
+                          clients=baseline['clients'], requests=baseline['requests'])
+    threshold = float(os.environ.get('BENCHMARK_THRESHOLD', 0.5))
+    assert loadtest.compare(report, baseline, threshold) == []
+
+def test_structured_logging_redacts_and_tags_request_ids():
+    """Test JSON log lines: request id propagation, PII redaction and the access log."""
+    import io
+    import json
+    import logging
+    from flask import Flask
+    import structured_log
+    stream = io.StringIO()
+    handler = structured_log.AsyncJsonHandler(stream=stream, redact_fields=['email', 'first_name'])
+    logs = structured_log.StructuredLogging(handler, root='t_lab')
+    flask_app = Flask(__name__)
+
+    @flask_app.route('/submit')
+    def submit():
+        logging.getLogger('t_lab.contact').info("mail from bob@example.com", extra={"fields": {
+            "email": "bob@example.com", "first_name": "Bob", "message_chars": 12}})
+        return 'ok'
+
+    logs.init_app(flask_app)
+    client = flask_app.test_client()
+    rv = client.get('/submit', headers={'X-Request-ID': 'req-123'})
+    assert rv.headers['X-Request-ID'] == 'req-123'
+    generated = client.get('/submit', headers={'X-Request-ID': 'bad id; x'}).headers['X-Request-ID']
+    assert generated != 'bad id; x' and len(generated) == 32
+    logs.flush()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    contact = [line for line in lines if line['logger'] == 't_lab.contact']
+    assert contact[0]['request_id'] == 'req-123'
+    assert contact[0]['email'] == '***@example.com'
+    assert contact[0]['first_name'] == '***'
+    assert contact[0]['message_chars'] == 12
+    assert contact[0]['msg'] == 'mail from ***@example.com'
+    assert contact[1]['request_id'] == generated
+    access = [line for line in lines if line['logger'] == 't_lab.access']
+    assert access[0]['path'] == '/submit' and access[0]['status'] == 200 and 'duration_ms' in access[0]
+    assert 'bob@example.com' not in stream.getvalue()
+
+def test_structured_logging_sampling_and_rate_caps():
+    """Test that sampling drops low-level records only and rate caps report what they suppressed."""
+    import io
+    import json
+    import logging
+    import structured_log
+    assert structured_log.parse_rates("lab.access=0.01, lab=5") == {'lab.access': 0.01, 'lab': 5.0}
+    policy = structured_log.LogPolicy(sampling={'t_cap.noisy': 0.0}, rate_limits={'t_cap.flood': 3})
+    stream = io.StringIO()
+    handler = structured_log.AsyncJsonHandler(policy, stream=stream)
+    structured_log.StructuredLogging(handler, root='t_cap')
+    noisy = logging.getLogger('t_cap.noisy')
+    noisy.info("dropped")
+    noisy.warning("kept")
+    flood = logging.getLogger('t_cap.flood.child')
+    for i in range(10):
+        flood.info("flood %d", i)
+    policy._buckets['t_cap.flood'] = (1, policy._buckets['t_cap.flood'][1])
+    flood.info("after the burst")
+    handler.flush()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line['msg'] for line in lines] == ['kept', 'flood 0', 'flood 1', 'flood 2', 'after the burst']
+    assert lines[-1]['suppressed'] == 7
+    stats = handler.stats()
+    assert stats['sampled_out'] == 1
+    assert stats['rate_limited'] == {'t_cap.flood': 7}
+    assert stats['written'] == 5
+
+def test_openapi_validation_rejects_bad_requests(client):
+    """Test that /api/* query parameters are validated against the spec before the view runs."""
+    rv = client.get('/api/search?q=vibe&limit=abc')
+    assert rv.status_code == 400
+    assert rv.get_json() == {"error": "Query parameter 'limit' must be an integer"}
+    rv = client.get('/api/search?q=vibe&limit=500')
+    assert rv.get_json() == {"error": "Query parameter 'limit' must be <= 50"}
+    assert client.get('/api/search?q=vibe&limit=5').status_code == 200
+    # login-only APIs check the session first: anonymous callers get 401 whatever the parameters
+    rv = client.get('/api/contact-submissions?limit=0&format=xml')
+    assert rv.status_code == 401
+    assert rv.get_json() == {"error": "Login required"}
+    with client.session_transaction() as sess:
+        sess['user'] = 'f5user'
+    rv = client.get('/api/contact-submissions?format=xml')
+    assert rv.status_code == 400
+    assert rv.get_json() == {"error": "Query parameter 'format' must be one of json, ndjson, csv"}
+    assert client.get('/api/contact-submissions?limit=501').status_code == 400
+
+def test_openapi_validation_bodies_and_responses():
+    """Test request body validation (400/415) and the testing-mode response conformance check."""
+    from flask import Flask, jsonify as flask_jsonify
+    import openapi_validation
+    schema = {"type": "object", "required": ["name"], "additionalProperties": False,
+              "properties": {"name": {"type": "string", "minLength": 1}, "tags": {"type": "array", "items": {"$ref": "#/components/schemas/Tag"}}}}
+    spec = {
+        "components": {"schemas": {"Tag": {"type": "string", "enum": ["a", "b"]}}},
+        "paths": {"/items/{item_id}": {
+            "parameters": [{"name": "item_id", "in": "path", "required": True, "schema": {"type": "integer", "minimum": 1}}],
+            "put": {
+                "requestBody": {"required": True, "content": {"application/json": {"schema": schema}}},
+                "responses": {"200": {"content": {"application/json": {"schema": {"type": "object", "required": ["id"],
+                                                                                   "properties": {"id": {"type": "integer"}}}}}}},
+            },
+        }},
+    }
+    flask_app = Flask(__name__)
+    flask_app.testing = True
+
+    @flask_app.route('/items/<item_id>', methods=['PUT'])
+    def put_item(item_id):
+        return flask_jsonify({"id": item_id if item_id == '7' else int(item_id)})
+
+    openapi_validation.OpenAPIValidator(spec, validate_responses=True).init_app(flask_app)
+    client = flask_app.test_client()
+    assert client.put('/items/3', json={"name": "x", "tags": ["a"]}).status_code == 200
+    rv = client.put('/items/3', json={"name": "x", "tags": ["c"]})
+    assert rv.get_json() == {"error": "Request body.tags[0] must be one of a, b"}
+    assert client.put('/items/3', json={"tags": []}).get_json() == {"error": "Request body.name is required"}
+    assert client.put('/items/3', json={"name": "x", "extra": 1}).status_code == 400
+    assert client.put('/items/3', data="name=x", content_type='text/plain').status_code == 415
+    assert client.put('/items/3').get_json() == {"error": "Request body is required"}
+    assert client.put('/items/0', json={"name": "x"}).get_json() == {"error": "Path parameter 'item_id' must be >= 1"}
+    with pytest.raises(openapi_validation.ResponseValidationError, match='response.id must be an integer'):
+        client.put('/items/7', json={"name": "x"})
+
+@pytest.fixture
+def workload_manager():
+    pytest.importorskip('requests_pkcs12')
+    scripts = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    import workload_manager as module
+    return module
+
+@pytest.fixture
+def f5xc_mock(workload_manager):
+    pytest.importorskip('cryptography')
+    import f5xc_mock as mock_module
+    with mock_module.MockF5XC(scheduled_after=0, ready_after=0, retry_after=0.01) as mock:
+        yield mock
+
+def test_workload_manager_field_diff(workload_manager):
+    """Test field extraction from a workload object, the diff and its one-line rendering."""
+    live = {"spec": {"service": {
+        "num_replicas": 2,
+        "containers": [{"image": {"name": "reg/app:1", "container_registry": {"name": "acr"}}}],
+        "deploy_options": {"deploy_ce_virtual_sites": {"virtual_site": [
+            {"namespace": "shared", "name": "ce-2"}, {"namespace": "shared", "name": "ce-1"}]}},
+        "advertise_options": {"advertise_in_cluster": {"port": {"info": {"port": 5000}}}},
+    }}}
+    fields = workload_manager.workload_fields(live)
+    assert fields == {"image": "reg/app:1", "registry": "acr", "replicas": 2, "port": 5000,
+                      "sites": ["shared/ce-1", "shared/ce-2"]}
+    assert workload_manager.workload_fields(None) == {"image": None, "registry": None, "replicas": 1, "port": None, "sites": []}
+    assert workload_manager.diff_fields(fields, dict(fields)) == {}
+    changes = workload_manager.diff_fields(fields, dict(fields, image="reg/app:2", replicas=1, sites=["shared/ce-1", "shared/ce-3"]))
+    assert changes == {"image": ("reg/app:1", "reg/app:2"), "replicas": (2, 1),
+                       "sites": (["shared/ce-1", "shared/ce-2"], ["shared/ce-1", "shared/ce-3"])}
+    assert workload_manager.format_diff(changes) == "image reg/app:1 -> reg/app:2, replicas 2 -> 1, sites +shared/ce-3 -shared/ce-2"
+    assert workload_manager.format_diff(workload_manager.diff_fields({}, {"port": 80})) == "port None -> 80"
+
+@pytest.mark.parametrize("document, error", [
+    ([], "expected a mapping with a 'workloads' list"),
+    ({"workloads": ["app"]}, r"workloads\[0\]: expected a mapping"),
+    ({"workloads": [{"name": "a", "sites": ["s"], "imgae": "x"}]}, "unknown keys imgae"),
+    ({"workloads": [{"name": "a", "sites": ["s"], "state": "gone"}]}, "state must be 'present' or 'absent'"),
+    ({"workloads": [{"name": "a", "state": "absent"}]}, "missing sites"),
+    ({"workloads": [{"name": "a-{site}", "sites": ["s", "t"]}, {"name": "a-t", "sites": ["t"]}]},
+     "workload a-t in namespace n is declared twice"),
+])
+def test_workload_manager_manifest_errors(workload_manager, document, error):
+    """Test that malformed manifests are rejected with the offending entry named."""
+    if isinstance(document, dict):
+        document = dict(document, defaults={"api_url": "https://x", "tenant": "t", "namespace": "n",
+                                            "image": "reg/app:1", "registry": "acr", "port": 5000})
+    with pytest.raises(ValueError, match=error):
+        workload_manager.parse_manifest(document, env={})
+
+def test_workload_manager_retry_policy_and_limiter(workload_manager):
+    """Test which responses are retried (never a POST that may have applied) and the adaptive host cap."""
+    import time
+    import requests
+    manager = workload_manager.VolterraWorkloadManager('https://x', 't', 'n', None, None, retries=2, max_concurrency=8)
+
+    def response(status, retry_after=None):
+        r = requests.Response()
+        r.status_code = status
+        if retry_after is not None:
+            r.headers['Retry-After'] = retry_after
+        return r
+
+    assert manager._retry_delay("POST", response(500), 0) is None
+    assert manager._retry_delay("POST", response(409), 0) is None
+    assert manager._retry_delay("POST", response(503, '2'), 0) == 2.0
+    assert manager._retry_delay("PUT", response(429, 'soon'), 0) is not None
+    assert 0.25 <= manager._retry_delay("GET", response(500), 0) <= 0.5
+    assert manager._retry_delay("GET", response(502), 2) is None
+    assert manager._retry_delay("GET", response(404), 0) is None
+    assert workload_manager.retry_after_seconds(response(429, '9999')) == workload_manager.RETRY_AFTER_MAX
+
+    limiter = manager.limiter
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert (limiter.limit, limiter.throttled) == (2, 2)
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 3
+    limiter.acquire()
+    limiter.release(throttled=True, retry_after=0.2)
+    assert limiter.limit == 1
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    limiter.release()
+
+def test_workload_manager_upsert_against_mock_api(f5xc_mock):
+    """Test create/unchanged/replace round trips, --wait polling and the client-certificate check."""
+    import requests
+    manager = f5xc_mock.manager(retries=1)
+    try:
+        result, action, _ = manager.upsert_workload('app', 'reg/app:1', 'ce-1', 5000, 'acr', 'shared')
+        assert action == 'created'
+        assert f5xc_mock.snapshot()['requests'] == 2
+        _, action, changes = manager.upsert_workload('app', 'reg/app:1', 'ce-1', 5000, 'acr', 'shared')
+        assert (action, changes) == ('unchanged', {})
+        assert f5xc_mock.snapshot()['requests'] == 3
+        result, action, changes = manager.upsert_workload('app', 'reg/app:2', ['ce-1', 'ce-2'], 5000, 'acr', 'shared')
+        assert action == 'replaced'
+        assert f5xc_mock.workloads[('mock-ns', 'app')]['spec']['service']['containers'][0]['image']['name'] == 'reg/app:2'
+        import workload_manager
+        assert workload_manager.format_diff(changes) == 'image reg/app:1 -> reg/app:2, sites +shared/ce-2'
+        timings = manager.wait_for_rollout('app', ['ce-1', 'ce-2'], timeout=5, since=workload_manager.modification_timestamp(result))
+        assert timings['phase'] == 'ready' and set(timings['sites']) == {'ce-1', 'ce-2'}
+        assert manager.timing_summary()['new_connections'] == 1
+
+        f5xc_mock.fail_next(409, method='POST')
+        with pytest.raises(requests.exceptions.HTTPError) as excinfo:
+            manager.create_workload('other', 'reg/app:1', 'ce-1', 5000, 'acr', 'shared')
+        assert excinfo.value.response.status_code == 409
+    finally:
+        manager.close()
+    with pytest.raises(requests.exceptions.SSLError):
+        requests.get(f5xc_mock.url + '/config/namespaces/mock-ns/workloads/app', verify=f5xc_mock.ca_file, timeout=5)
+    assert f5xc_mock.snapshot()['rejected_connections'] == 1
+
+def test_workload_manager_apply_retries_and_reports_failures(f5xc_mock):
+    """Test manifest fan-out: 429/503 are retried, a failed POST fails only its own row."""
+    import io
+    import workload_manager
+    specs = workload_manager.parse_manifest({
+        "defaults": {"api_url": f5xc_mock.url, "tenant": "mock", "namespace": "mock-ns", "registry": "acr", "port": 5000},
+        "workloads": [{"name": "app-{site}", "image": "reg/app:1", "sites": ["ce-1", "ce-2", "ce-3"]},
+                      {"name": "gone", "sites": ["ce-1"], "state": "absent"}],
+    }, env={})
+    assert [spec['name'] for spec in specs] == ['app-ce-1', 'app-ce-2', 'app-ce-3', 'gone']
+    with pytest.raises(ValueError, match='missing image'):
+        workload_manager.parse_manifest({"defaults": {"api_url": "x", "tenant": "t", "namespace": "n"},
+                                         "workloads": [{"name": "a", "sites": ["s"], "registry": "r", "port": 1}]}, env={})
+    f5xc_mock.fail_next(429, count=2)
+    f5xc_mock.fail_next(503, path='/workloads/app-ce-2')
+    f5xc_mock.fail_next(500, method='POST', path='/workloads')
+    make = lambda api_url, tenant, namespace: f5xc_mock.manager(namespace, tenant, max_concurrency=2)
+    rows, managers = workload_manager.apply_manifest(specs, make, parallel=4, wait=5)
+    try:
+        by_name = {row['workload']: row for row in rows}
+        assert by_name['gone']['action'] == 'absent'
+        failed = [row for row in rows if not row['ok']]
+        assert len(failed) == 1 and failed[0]['status'] == 500
+        assert sum(1 for row in rows if row['action'] == 'created' and row['rollout']['phase'] == 'ready') == 2
+        assert len(managers) == 1
+        assert managers[0].timing_summary()['retries'] >= 3
+        assert managers[0].limiter.throttled >= 3
+    finally:
+        for manager in managers:
+            manager.close()
+    out = io.StringIO()
+    workload_manager.print_results(rows, out)
+    assert '1 failed' in out.getvalue()
+
+def test_workload_manager_delete_dry_run_looks_up_the_workload(f5xc_mock, monkeypatch, capsys):
+    """Test that delete --dry-run reports 'absent' or 'would delete' from a GET, as apply does."""
+    import json
+    import workload_manager
+    manager = f5xc_mock.manager()
+    try:
+        manager.create_workload('app', 'reg/app:1', 'ce-1', 5000, 'acr', 'shared')
+    finally:
+        manager.close()
+    env = {'F5XC_API_URL': f5xc_mock.url, 'F5XC_TENANT': 'mock', 'F5XC_NAMESPACE': 'mock-ns', 'F5XC_SITE_NAME': 'ce-1',
+           'IMAGE_REF': 'reg/app:1', 'F5XC_REGISTRY_NAME': 'acr', 'F5XC_WORKLOAD_PORT': '5000',
+           'F5XC_API_P12_FILE': f5xc_mock.p12_file, 'VES_P12_PASSWORD': f5xc_mock.p12_password,
+           'REQUESTS_CA_BUNDLE': f5xc_mock.ca_file, 'LOG_FORMAT': 'json'}
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    handlers = list(workload_manager.log.handlers)
+    actions = {}
+    try:
+        for name in ('app', 'missing'):
+            monkeypatch.setenv('F5XC_WORKLOAD_NAME', name)
+            monkeypatch.setattr(sys, 'argv', ['workload_manager.py', 'delete', '--dry-run'])
+            workload_manager.main()
+            entries = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+            actions[name] = next(entry['action'] for entry in entries if entry['msg'].startswith('Action'))
+    finally:
+        workload_manager.log.handlers[:] = handlers
+    assert actions == {'app': 'would delete', 'missing': 'absent'}
+    assert f5xc_mock.snapshot().get('requests', 0) == 3
+    assert not any(key.startswith('DELETE') for key in f5xc_mock.snapshot())
+    assert ('mock-ns', 'app') in f5xc_mock.workloads
+
+def test_workload_manager_inventory_fetches_only_changed(f5xc_mock, tmp_path):
+    """Test the namespace inventory: concurrent listing, snapshot reuse and removal of deleted workloads."""
+    import io
+    import workload_manager
+    manager = f5xc_mock.manager(max_concurrency=4)
+    other = manager.for_namespace('other-ns')
+    try:
+        for i in range(5):
+            manager.create_workload(f'app-{i}', 'reg/app:1', 'ce-1', 5000, 'acr', 'shared')
+        other.create_workload('svc', 'reg/svc:1', ['ce-1', 'ce-2'], 8080, 'acr', 'shared', replicas=2)
+        snapshot = {}
+        rows, stats = workload_manager.inventory(manager, ['mock-ns', 'other-ns'], snapshot)
+        assert (stats['workloads'], stats['fetched'], stats['cached']) == (6, 6, 0)
+        assert rows[-1] == {'namespace': 'other-ns', 'name': 'svc', 'resource_version': '6', 'image': 'reg/svc:1',
+                            'registry': 'acr', 'replicas': 2, 'port': 8080, 'sites': ['shared/ce-1', 'shared/ce-2']}
+
+        path = str(tmp_path / 'cache' / 'snapshot.json')
+        workload_manager.save_snapshot(path, snapshot)
+        snapshot = workload_manager.load_snapshot(path)
+        before = f5xc_mock.snapshot()['requests']
+        again, stats = workload_manager.inventory(manager, ['mock-ns', 'other-ns'], snapshot)
+        assert again == rows and stats['fetched'] == 0
+        assert f5xc_mock.snapshot()['requests'] - before == 2  # one list call per namespace
+
+        manager.replace_workload('app-1', 'reg/app:2', 'ce-1', 5000, 'acr', 'shared')
+        manager.delete_workload('app-4')
+        rows, stats = workload_manager.inventory(manager, ['mock-ns', 'other-ns'], snapshot)
+        assert (stats['workloads'], stats['fetched']) == (5, 1)
+        assert {row['name']: row['image'] for row in rows}['app-1'] == 'reg/app:2'
+        assert 'mock-ns/app-4' not in snapshot
+    finally:
+        manager.close()
+    out = io.StringIO()
+    workload_manager.print_inventory(rows, out)
+    assert 'reg/app:2' in out.getvalue()
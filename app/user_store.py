@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+log = logging.getLogger('lab.user_store')
+
+_NOTHING_FAILED = object()
+
+
+class UserStoreError(Exception):
+    """Raised when no usable user snapshot can be loaded."""
+
+
+class UserStore:
+    """Cached view of the flat-file user database.
+
+    The JSON file is parsed once and kept in memory as a dict, so lookups
+    are O(1) and logins never touch the disk. The file is re-read only when
+    its mtime/size changes (checked at most every ``check_interval`` seconds)
+    or after ``invalidate()`` (wired to SIGHUP). If a reload fails the last
+    good snapshot keeps being served, and that version of the file is not
+    retried (or warned about again) until its mtime/size changes.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error = None
+        self._users = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._stale = False
+        self._failed_stamp = _NOTHING_FAILED
+        self._lock = threading.Lock()
+
+    def _read(self):
+        st = os.stat(self.path)
+        with open(self.path, 'r') as f:
+            users = json.load(f)
+        if not isinstance(users, dict):
+            raise ValueError(f"{self.path} must contain a JSON object of username -> hash")
+        return users, (st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force=False):
+        """Reload the file if it changed. Returns True when a new snapshot was loaded."""
+        now = time.monotonic()
+        if not (force or self._stale or self._users is None) and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            retry = force or self._stale
+            self._stale = False
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stamp = None
+            if not retry and self._users is not None and stamp in (self._stamp, self._failed_stamp):
+                return False
+            try:
+                users, stamp = self._read()
+            except (OSError, ValueError) as e:
+                self.last_error = e
+                if self._users is None:
+                    raise UserStoreError(f"Could not load users from {self.path}: {e}") from e
+                self._failed_stamp = stamp
+                log.warning("keeping last good user snapshot, reload failed", extra={"fields": {
+                    "path": self.path, "error": str(e)}})
+                return False
+            self._users = users
+            self._stamp = stamp
+            self._failed_stamp = _NOTHING_FAILED
+            self.last_error = None
+            self.version += 1
+            return True
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        self._stale = True
+
+    def get(self, username):
+        """Return the stored password hash for username, or None."""
+        self.refresh()
+        return self._users.get(username)
+
+    def users(self):
+        self.refresh()
+        return self._users
+
+    def __len__(self):
+        return len(self.users())
+
+    def install_sighup_handler(self):
+        """Invalidate the snapshot on SIGHUP, chaining to any previous handler.
+
+        Gunicorn workers reset signal handlers when they boot, so with
+        ``preload_app`` this must be called again from ``post_worker_init``.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        previous = signal.getsignal(signal.SIGHUP)
+
+        def handle_sighup(signum, frame):
+            self.invalidate()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGHUP, handle_sighup)
+        return True
@@ -0,0 +1,470 @@
+"""Local stand-in for the F5 XC workloads API, for exercising workload_manager.py offline.
+
+MockF5XC serves /api/config/namespaces/{ns}/workloads[/{name}] over HTTPS
+on 127.0.0.1 from an in-memory store. A throwaway CA, server certificate and
+client P12 are generated at start, and connections without a client
+certificate from that CA are refused, as the real API refuses them. Every
+request can be delayed (latency, jitter) and answered with an injected error
+(429 with Retry-After, 404, 409, 5xx), either queued for the next matching
+requests or at a random rate. A workload's status turns scheduled and then
+ready a set time after each write, and status GETs carry an ETag.
+
+The counters (requests by method and status, TLS connections) let a run be
+measured in round trips as well as wall time.
+
+Usage:
+    python scripts/f5xc_mock.py serve [--port N] [--latency S] [--errors 429=0.1,503=0.05]
+    python scripts/f5xc_mock.py bench [--sites N] [--latency S] [--parallel N] [--per-host N] [--json]
+
+GET .../workloads (no name) lists a namespace's workloads with their
+resource versions, and a status GET is one with
+response_format=GET_RSP_FORMAT_STATUS.
+"""
+
+import argparse
+import collections
+import datetime
+import hashlib
+import http.server
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import workload_manager
+
+WORKLOADS_RE = re.compile(r'^/api/config/namespaces/([^/]+)/workloads(?:/([^/]+))?$')
+P12_PASSWORD = 'mock-password'
+ERROR_MESSAGES = {404: "object not found", 409: "object already exists", 429: "too many requests",
+                  500: "internal error", 502: "bad gateway", 503: "service unavailable", 504: "gateway timeout"}
+
+
+def make_credentials(directory, password=P12_PASSWORD):
+    """Write a CA, a localhost server cert/key and a client P12 signed by the CA; returns their paths."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.serialization import pkcs12
+    from cryptography.x509.oid import NameOID
+    import ipaddress
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def issue(common_name, issuer=None, ca=False, san=None):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        builder = (x509.CertificateBuilder()
+                   .subject_name(name)
+                   .issuer_name(issuer[1].subject if issuer else name)
+                   .public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(minutes=5))
+                   .not_valid_after(now + datetime.timedelta(days=1))
+                   .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True))
+        if san:
+            builder = builder.add_extension(x509.SubjectAlternativeName(san), critical=False)
+        return key, builder.sign(issuer[0] if issuer else key, hashes.SHA256())
+
+    ca = issue("f5xc-mock CA", ca=True)
+    server = issue("localhost", ca, san=[x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))])
+    client = issue("f5xc-mock client", ca)
+    pem = serialization.Encoding.PEM
+    paths = {name: os.path.join(directory, name) for name in ('ca.pem', 'server.pem', 'client.p12')}
+    with open(paths['ca.pem'], 'wb') as f:
+        f.write(ca[1].public_bytes(pem))
+    with open(paths['server.pem'], 'wb') as f:
+        f.write(server[1].public_bytes(pem))
+        f.write(server[0].private_bytes(pem, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    with open(paths['client.p12'], 'wb') as f:
+        f.write(pkcs12.serialize_key_and_certificates(
+            b"client", client[0], client[1], None, serialization.BestAvailableEncryption(password.encode())))
+    return paths
+
+
+def timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, mock, address, context):
+        self.mock = mock
+        self.context = context
+        super().__init__(address, _Handler)
+
+    def finish_request(self, request, client_address):
+        # The TLS handshake runs on the connection's own thread, not the accept loop
+        try:
+            request = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            self.mock._count('rejected_connections')
+            request.close()
+            return
+        self.mock._count('connections')
+        try:
+            super().finish_request(request, client_address)
+        finally:
+            request.close()
+
+    def handle_error(self, request, client_address):
+        pass  # clients dropping keep-alive connections are expected
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        parsed = urllib.parse.urlsplit(self.path)
+        status, body, headers = mock.handle(self.command, parsed.path, urllib.parse.parse_qs(parsed.query),
+                                            raw, self.headers)
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+
+class MockF5XC:
+    """In-memory F5 XC workloads API on an HTTPS port that requires a client certificate."""
+
+    def __init__(self, latency=0.0, jitter=0.0, scheduled_after=0.05, ready_after=0.2, error_rates=None,
+                 retry_after=0.1, require_client_cert=True, port=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.scheduled_after = scheduled_after
+        self.ready_after = ready_after
+        self.error_rates = dict(error_rates or {})
+        self.retry_after = retry_after
+        self.require_client_cert = require_client_cert
+        self.port = port
+        self.workloads = {}
+        self.stats = collections.Counter()
+        self._failures = []
+        self._random = random.Random(seed)
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._dir = None
+
+    def start(self):
+        self._dir = tempfile.TemporaryDirectory(prefix='f5xc-mock-')
+        paths = make_credentials(self._dir.name)
+        self.ca_file = paths['ca.pem']
+        self.p12_file = paths['client.p12']
+        self.p12_password = P12_PASSWORD
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(paths['server.pem'])
+        if self.require_client_cert:
+            context.verify_mode = ssl.CERT_REQUIRED
+            context.load_verify_locations(self.ca_file)
+        self._server = _Server(self, ('127.0.0.1', self.port), context)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='f5xc-mock', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._dir is not None:
+            self._dir.cleanup()
+            self._dir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        return f"https://127.0.0.1:{self.port}/api"
+
+    def manager(self, namespace='mock-ns', tenant='mock', **options):
+        """A VolterraWorkloadManager pointed at this server with the generated client P12."""
+        return workload_manager.VolterraWorkloadManager(self.url, tenant, namespace, self.p12_file, self.p12_password,
+                                                        verify=self.ca_file, **options)
+
+    def fail_next(self, status, count=1, method=None, path=None):
+        """Answer the next ``count`` requests matching ``method``/``path`` (a substring) with ``status``."""
+        with self._lock:
+            self._failures.append([status, count, method, path])
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def _injected(self, method, path):
+        with self._lock:
+            for rule in self._failures:
+                status, count, rule_method, rule_path = rule
+                if (rule_method is None or rule_method == method) and (rule_path is None or rule_path in path):
+                    rule[1] -= 1
+                    if rule[1] <= 0:
+                        self._failures.remove(rule)
+                    return status
+            for status, rate in self.error_rates.items():
+                if self._random.random() < rate:
+                    return status
+        return None
+
+    def handle(self, method, path, query, raw, headers):
+        """(status, JSON body or None, extra headers) for one request."""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        status, body, extra = self._respond(method, path, query, raw, headers)
+        self._count('requests', f"{method} {status}")
+        return status, body, extra
+
+    def _error(self, status):
+        extra = {'Retry-After': f"{self.retry_after:g}"} if status == 429 else {}
+        return status, {"code": status, "message": ERROR_MESSAGES.get(status, "error")}, extra
+
+    def _respond(self, method, path, query, raw, headers):
+        match = WORKLOADS_RE.match(path)
+        if not match:
+            return 404, {"code": 5, "message": f"no route for {path}"}, {}
+        injected = self._injected(method, path)
+        if injected is not None:
+            self._count('injected')
+            return self._error(injected)
+        namespace, name = match.groups()
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            return 400, {"code": 3, "message": "invalid JSON"}, {}
+
+        with self._lock:
+            key = (namespace, name)
+            if method == 'POST' and name is None:
+                name = ((body or {}).get('metadata') or {}).get('name')
+                if not name:
+                    return 400, {"code": 3, "message": "metadata.name is required"}, {}
+                if (namespace, name) in self.workloads:
+                    return self._error(409)
+                return 200, self._write(namespace, name, body), {}
+            if name is None:
+                if method != 'GET':
+                    return 405, {"code": 12, "message": "method not allowed"}, {}
+                return 200, {"items": [
+                    {"name": obj_name, "namespace": obj_namespace, "tenant": "mock",
+                     "resource_version": obj["resource_version"], "system_metadata": obj["system_metadata"]}
+                    for (obj_namespace, obj_name), obj in sorted(self.workloads.items()) if obj_namespace == namespace
+                ], "errors": []}, {}
+            current = self.workloads.get(key)
+            if current is None:
+                return self._error(404)
+            if method == 'GET':
+                if query.get('response_format') == ['GET_RSP_FORMAT_STATUS']:
+                    return self._status(current, headers)
+                return 200, self._public(current), {}
+            if method == 'PUT':
+                return 200, self._write(namespace, name, body, current), {}
+            if method == 'DELETE':
+                del self.workloads[key]
+                return 200, {}, {}
+        return 405, {"code": 12, "message": "method not allowed"}, {}
+
+    def _write(self, namespace, name, body, current=None):
+        now = time.time()
+        created = current['system_metadata']['creation_timestamp'] if current else timestamp(now)
+        obj = {
+            "metadata": dict((body or {}).get('metadata') or {}, name=name, namespace=namespace),
+            "spec": (body or {}).get('spec') or {},
+            "system_metadata": {"creation_timestamp": created, "modification_timestamp": timestamp(now)},
+            "resource_version": str(next(self._versions)),
+            "_written": now,
+        }
+        self.workloads[(namespace, name)] = obj
+        return self._public(obj)
+
+    @staticmethod
+    def _public(obj):
+        return {key: value for key, value in obj.items() if not key.startswith('_')}
+
+    def _status(self, obj, headers):
+        written = obj['_written']
+        age = time.time() - written
+        conditions = []
+        if age >= self.scheduled_after:
+            conditions.append({"type": "Scheduled", "status": "True", "last_update_time": timestamp(written + self.scheduled_after)})
+        if age >= self.ready_after:
+            conditions.append({"type": "Ready", "status": "True", "last_update_time": timestamp(written + self.ready_after)})
+        service = obj['spec'].get('service') or {}
+        sites = ((service.get('deploy_options') or {}).get('deploy_ce_virtual_sites') or {}).get('virtual_site') or []
+        body = {"status": [{"site": site.get('name'), "conditions": conditions} for site in sites],
+                "resource_version": obj['resource_version']}
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()[:16] + '"'
+        if headers.get('If-None-Match') == etag:
+            return 304, None, {'ETag': etag}
+        return 200, body, {'ETag': etag}
+
+
+def parse_error_rates(value):
+    """Parse "429=0.1,503=0.05" into {429: 0.1, 503: 0.05}."""
+    rates = {}
+    for item in (value or '').split(','):
+        status, sep, rate = item.partition('=')
+        if sep:
+            rates[int(status)] = float(rate)
+    return rates
+
+
+def _measure(mock, name, run):
+    before = mock.snapshot()
+    started = time.perf_counter()
+    detail = run()
+    wall = time.perf_counter() - started
+    after = mock.snapshot()
+    return dict({
+        "scenario": name,
+        "round_trips": after.get('requests', 0) - before.get('requests', 0),
+        "connections": after.get('connections', 0) - before.get('connections', 0),
+        "wall_ms": round(wall * 1000, 1),
+    }, **(detail or {}))
+
+
+def bench(sites=20, latency=0.05, parallel=16, per_host=8, ready_after=0.2, stream=None):
+    """Time single and fan-out deployments against a fresh mock; returns one row per scenario.
+
+    Each scenario uses a new manager, i.e. a new session, the way one CLI run would.
+    """
+    site_names = [f"ce-{i}" for i in range(1, sites + 1)]
+    rows = []
+    with MockF5XC(latency=latency, scheduled_after=ready_after / 4, ready_after=ready_after) as mock:
+
+        def single(image, wait=False):
+            def run():
+                manager = mock.manager()
+                try:
+                    result, action, _ = manager.upsert_workload('bench-app', image, 'ce-1', 5000, 'bench-registry', 'shared')
+                    if wait:
+                        manager.wait_for_rollout('bench-app', ['ce-1'], timeout=30, initial_interval=ready_after / 4,
+                                                 since=workload_manager.modification_timestamp(result))
+                    return {"actions": action}
+                finally:
+                    manager.close()
+            return run
+
+        def fan_out(image, wait=False):
+            specs = workload_manager.parse_manifest({
+                "defaults": {"api_url": mock.url, "tenant": "mock", "namespace": "mock-ns",
+                             "registry": "bench-registry", "port": 5000},
+                "workloads": [{"name": "bench-{site}", "image": image, "sites": site_names}],
+            }, 'bench', env={})
+
+            def run():
+                make = lambda api_url, tenant, namespace: mock.manager(
+                    namespace, tenant, pool_size=per_host, max_concurrency=per_host)
+                results, managers = workload_manager.apply_manifest(specs, make, parallel,
+                                                                    wait=30 if wait else None)
+                for manager in managers:
+                    manager.close()
+                actions = collections.Counter(row['action'] for row in results)
+                return {"actions": ",".join(f"{count} {action}" for action, count in sorted(actions.items())),
+                        "failed": sum(1 for row in results if not row['ok'])}
+            return run
+
+        rows.append(_measure(mock, "single create", single('bench:1')))
+        rows.append(_measure(mock, "single unchanged", single('bench:1')))
+        rows.append(_measure(mock, "single replace", single('bench:2')))
+        rows.append(_measure(mock, "single replace + wait", single('bench:3', wait=True)))
+        rows.append(_measure(mock, f"fan-out {sites} create", fan_out('bench:1')))
+        rows.append(_measure(mock, f"fan-out {sites} unchanged", fan_out('bench:1')))
+        rows.append(_measure(mock, f"fan-out {sites} replace + wait", fan_out('bench:2', wait=True)))
+
+        snapshot = {}
+
+        def audit():
+            manager = mock.manager(pool_size=per_host, max_concurrency=per_host)
+            try:
+                found, stats = workload_manager.inventory(manager, ['mock-ns'], snapshot, parallel)
+            finally:
+                manager.close()
+            return {"actions": f"{stats['workloads']} listed, {stats['fetched']} fetched"}
+
+        rows.append(_measure(mock, f"inventory {sites} cold", audit))
+        rows.append(_measure(mock, f"inventory {sites} snapshot", audit))
+    for row in rows:
+        # What the same round trips would cost one after another
+        row["serial_ms"] = round(row["round_trips"] * latency * 1000, 1)
+    return rows
+
+
+def print_bench(rows, latency, stream=None):
+    stream = stream or sys.stdout
+    print(f"{'scenario':<28} {'round trips':>11} {'conns':>6} {'wall ms':>9} {'serial ms':>10}  actions", file=stream)
+    for row in rows:
+        print(f"{row['scenario']:<28} {row['round_trips']:>11} {row['connections']:>6} {row['wall_ms']:>9.1f} "
+              f"{row['serial_ms']:>10.1f}  {row.get('actions', '')}", file=stream)
+    print(f"(API latency {latency * 1000:.0f} ms per call)", file=stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local F5 XC workloads API stand-in and workload_manager benchmark')
+    parser.add_argument('command', choices=['serve', 'bench'])
+    parser.add_argument('--port', type=int, default=8443, help='Port for serve')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay per call, up to this many seconds (serve)')
+    parser.add_argument('--ready-after', type=float, default=0.2, help='Seconds from a write until the workload reports ready')
+    parser.add_argument('--errors', help='Injected error rates for serve, e.g. 429=0.1,503=0.05')
+    parser.add_argument('--sites', type=int, default=20, help='Sites in the fan-out scenarios (bench)')
+    parser.add_argument('--parallel', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help='Print the bench results as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        rows = bench(args.sites, args.latency, args.parallel, args.per_host, args.ready_after)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_bench(rows, args.latency)
+        return
+
+    mock = MockF5XC(latency=args.latency, jitter=args.jitter, ready_after=args.ready_after,
+                    scheduled_after=args.ready_after / 4, error_rates=parse_error_rates(args.errors), port=args.port)
+    mock.start()
+    print(f"Mock F5 XC API on {mock.url}; point workload_manager.py at it with:")
+    print(f"  export F5XC_API_URL={mock.url} F5XC_TENANT=mock")
+    print(f"  export F5XC_API_P12_FILE={mock.p12_file} VES_P12_PASSWORD={mock.p12_password}")
+    print(f"  export REQUESTS_CA_BUNDLE={mock.ca_file}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+        print(json.dumps(mock.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,29 @@ It supports creating, replacing, getting, deleting, and upserting workloads on C
 
 Usage:
     python workload_manager.py [operation]
+    python workload_manager.py apply -f manifest.yaml [--parallel N] [--per-host N] [--dry-run]
+
+Add --dry-run to any write operation to log what would change without writing.
+Add --wait to create/replace/upsert/apply to poll the workload's status until
+every virtual site reports it ready (or --wait-timeout passes, exit 1), and
+--timings FILE to save the accept -> scheduled -> ready breakdown as JSON.
+
+    python workload_manager.py inventory [--namespaces ns1,ns2] [--output table|json] [--refresh]
+
+inventory lists every workload in the namespaces (default F5XC_NAMESPACE)
+with its image, replicas, port and sites. Namespaces are listed
+concurrently, and only workloads whose resource version differs from the
+on-disk snapshot (--snapshot, default under ~/.cache) are fetched, also
+concurrently. Only F5XC_API_URL, F5XC_TENANT and the P12 variables are required.
 
 Operations:
     create  - Create a new workload
     replace - Replace an existing workload configuration
     get     - Retrieve workload details
     delete  - Delete a workload
-    upsert  - Create if not exists, otherwise replace
+    upsert  - Create if not exists, replace if it differs, otherwise leave it alone
+    apply   - Upsert (or delete) every workload declared in a manifest, concurrently
+    inventory - List the workloads (image, replicas, port, sites) of one or more namespaces
 
 Required Environment Variables (GitLab CI/CD):
     F5XC_API_URL            - The API endpoint URL (e.g., https://tenant.console.ves.volterra.io/api)
@@ -28,6 +44,16 @@ Optional Environment Variables:
     F5XC_SITE_NAMESPACE     - Namespace for the virtual site (default: "shared")
     F5XC_REGISTRY_NAME      - Name of the container registry object (default: <namespace>-acr)
     F5XC_WORKLOAD_PORT      - The port the workload listens on (default: 5000)
+    F5XC_HTTP_POOL_SIZE     - Connections kept open to the API per host (default: 4)
+    F5XC_HTTP_KEEPALIVE     - "false" closes the connection after every call (default: true)
+    F5XC_HTTP_TIMEOUT       - Connect/read timeout in seconds for each API call (default: 30)
+    F5XC_HTTP_RETRIES       - Retries of an API call answered with 429 or 5xx (default: 3)
+    LOG_FORMAT              - "json" (default) for JSON-lines logs on stderr, "text" for plain messages
+
+Progress and errors are logged to stderr; the result of `get` is printed to stdout.
+upsert and apply compare the live workload's image, registry, replicas, port and
+virtual sites with the desired ones and skip the PUT when nothing differs; when
+something does, the changed fields are logged as "old -> new".
 
 Example:
     export F5XC_API_URL="https://my-tenant.console.ves.volterra.io/api"
@@ -42,43 +68,403 @@ Example:
     export F5XC_WORKLOAD_PORT=5000
 
     python workload_manager.py upsert
+
+Manifest (apply):
+    A YAML (or JSON) file listing the workloads to deploy. Keys left out of a
+    workload fall back to `defaults`, then to the environment variables above
+    (namespace, site_namespace, registry, port and image). A workload goes to
+    all of its `sites`; when its name contains "{site}" it is expanded into
+    one workload per site instead.
+
+        defaults:
+          namespace: my-ns
+          registry: appworld2026-az-cr
+          port: 5000
+        workloads:
+          - name: "my-app-{site}"
+            image: my-registry.azurecr.io/my-app:v2
+            sites: [ce-east, ce-west, ce-central]
+          - name: my-worker
+            sites: [ce-east]
+            replicas: 2
+          - name: old-app
+            sites: [ce-east]
+            state: absent          # deleted instead of upserted
+
+    Only F5XC_API_URL, F5XC_TENANT, F5XC_API_P12_FILE and VES_P12_PASSWORD
+    are required; `api_url` and `tenant` may also be set per workload.
+    Operations run on a bounded thread pool (--parallel) with at most
+    --per-host calls in flight per API host; that cap halves whenever the
+    API answers 429/5xx and grows back one call at a time. A result table is
+    printed to stdout and the exit code is 1 if any operation failed.
 """
 
 import os
 import requests
 import json
 import argparse
+import copy
+import datetime
+import logging
+import random
 import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from requests_pkcs12 import Pkcs12Adapter
 
+log = logging.getLogger('workload_manager')
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, with any ``extra={"fields": {...}}`` merged in."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextLogFormatter(logging.Formatter):
+    """The message followed by its fields as key=value pairs."""
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        parts = [record.getMessage()] + [f"{key}={json.dumps(value, default=str)}" for key, value in fields.items()]
+        if record.exc_info:
+            parts.append(self.formatException(record.exc_info))
+        return " ".join(parts)
+
+def configure_logging(fmt=None):
+    handler = logging.StreamHandler(sys.stderr)
+    if (fmt or os.getenv('LOG_FORMAT', 'json')) == 'json':
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(TextLogFormatter())
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+class _ConnectTimer(threading.local):
+    """Time spent opening connections (TCP connect + TLS handshake) on the current thread."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = 0.0
+        self.count = 0
+
+_connect_timer = _ConnectTimer()
+
+class _TimedConnect:
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_timer.seconds += time.perf_counter() - started
+            _connect_timer.count += 1
+
+class TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+TIMED_POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+class TimedPkcs12Adapter(Pkcs12Adapter):
+    """Pkcs12Adapter whose pools record how long each new connection took to open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        manager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+        return manager
+
+# Statuses worth retrying. A POST that failed with 500/502/504 may still have been
+# applied, so it is only retried when the API refused it outright
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+POST_RETRY_STATUSES = frozenset((429, 503))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_AFTER_MAX = 60.0
+
+def retry_after_seconds(response):
+    """The Retry-After header in seconds, or None when absent or not a number of seconds."""
+    value = response.headers.get('Retry-After')
+    try:
+        return min(RETRY_AFTER_MAX, max(0.0, float(value))) if value is not None else None
+    except ValueError:
+        return None
+
+class AdaptiveLimiter:
+    """Cap on concurrent calls to one API host that halves on 429/5xx and grows back by one per success."""
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.throttled = 0
+        self.resume_at = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight >= self.limit:
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(self, throttled=False, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1, self.limit // 2)
+                if retry_after:
+                    # Everyone waits out the server's Retry-After, not just the caller that got it
+                    self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+            self._cond.notify_all()
+
+def workload_fields(obj):
+    """The fields upsert manages, pulled out of a workload object (a payload or a GET result)."""
+    service = ((obj or {}).get('spec') or {}).get('service') or {}
+    containers = service.get('containers') or [{}]
+    image = containers[0].get('image') or {}
+    sites = ((service.get('deploy_options') or {}).get('deploy_ce_virtual_sites') or {}).get('virtual_site') or []
+    port = (((service.get('advertise_options') or {}).get('advertise_in_cluster') or {}).get('port') or {}).get('info') or {}
+    return {
+        "image": image.get('name'),
+        "registry": (image.get('container_registry') or {}).get('name'),
+        "replicas": service.get('num_replicas', 1),
+        "port": port.get('port'),
+        "sites": sorted(f"{site.get('namespace')}/{site.get('name')}" for site in sites),
+    }
+
+def diff_fields(live, desired):
+    """{field: (live value, desired value)} for every managed field that differs."""
+    return {key: (live.get(key), value) for key, value in desired.items() if live.get(key) != value}
+
+def format_diff(changes):
+    """Compact one-line rendering of diff_fields(), e.g. "image a:1 -> a:2, sites +shared/x"."""
+    parts = []
+    for key, (old, new) in changes.items():
+        if key == "sites" and old is not None:
+            parts.append("sites " + " ".join([f"+{s}" for s in new if s not in old] + [f"-{s}" for s in old if s not in new]))
+        else:
+            parts.append(f"{key} {old} -> {new}")
+    return ", ".join(parts)
+
+# Status polling: a status-only GET, sent with If-None-Match once the API has given an ETag
+STATUS_PARAMS = {"response_format": "GET_RSP_FORMAT_STATUS"}
+WAIT_INITIAL_INTERVAL = 1.0
+WAIT_MAX_INTERVAL = 10.0
+ROLLOUT_PHASES = ("pending", "scheduled", "ready")
+SCHEDULED_CONDITIONS = frozenset(("scheduled", "deployed", "created"))
+READY_CONDITIONS = frozenset(("ready", "available"))
+TRUE_STATUSES = frozenset(("true", "success"))
+
+class RolloutTimeout(Exception):
+    """The workload was not ready on every site before the deadline; ``timings`` has what was seen."""
+
+    def __init__(self, message, timings):
+        super().__init__(message)
+        self.timings = timings
+
+def parse_timestamp(value):
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+def modification_timestamp(obj):
+    """When the API accepted a write, from the object it returned (None if not reported)."""
+    return ((obj or {}).get('system_metadata') or {}).get('modification_timestamp')
+
+def site_phases(obj, sites, since=None):
+    """{site: "pending" | "scheduled" | "ready"} for the desired sites, from a workload's status objects.
+
+    Each status object names its ``site`` and carries ``conditions`` of
+    {type, status, last_update_time}. Conditions last updated before ``since``
+    (the write's modification timestamp) describe the previous version and
+    are ignored. This layout is the one scripts/f5xc_mock.py serves; it has
+    not been checked against a real tenant, so CI only waits when asked to.
+    """
+    phases = dict.fromkeys(sites, "pending")
+    since = parse_timestamp(since)
+    for entry in (obj or {}).get('status') or []:
+        site = entry.get('site') or (entry.get('metadata') or {}).get('site')
+        if site not in phases:
+            continue
+        conditions = entry.get('conditions') or (entry.get('object_status') or {}).get('conditions') or []
+        for condition in conditions:
+            if str(condition.get('status', '')).lower() not in TRUE_STATUSES:
+                continue
+            updated = parse_timestamp(condition.get('last_update_time'))
+            if since and updated and (since.tzinfo is None) == (updated.tzinfo is None) and updated < since:
+                continue
+            kind = str(condition.get('type', '')).lower()
+            if kind in READY_CONDITIONS:
+                phases[site] = "ready"
+            elif kind in SCHEDULED_CONDITIONS and phases[site] == "pending":
+                phases[site] = "scheduled"
+    return phases
+
 class VolterraWorkloadManager:
-    def __init__(self, api_url, tenant, namespace, p12_file, p12_password):
+    def __init__(self, api_url, tenant, namespace, p12_file, p12_password, pool_size=4, keep_alive=True, timeout=30,
+                 retries=3, max_concurrency=None, verify=True):
         self.api_url = api_url.rstrip('/') if api_url else None
         self.tenant = tenant
         self.namespace = namespace
         self.p12_file = p12_file
         self.p12_password = p12_password
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.retries = retries
+        self.verify = verify
+        self.limiter = AdaptiveLimiter(max_concurrency or pool_size)
+        self.calls = []
+        self._session = None
+        self._session_lock = threading.Lock()
 
     def _get_session(self):
+        """The manager's pooled session, created (and the P12 decrypted) on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
         session = requests.Session()
         
         if self.p12_file and os.path.exists(self.p12_file):
             # Mount Pkcs12Adapter to handle the P12 certificate directly
-            adapter = Pkcs12Adapter(
+            adapter = TimedPkcs12Adapter(
                 pkcs12_filename=self.p12_file,
-                pkcs12_password=self.p12_password
+                pkcs12_password=self.p12_password,
+                pool_connections=1,
+                pool_maxsize=self.pool_size,
             )
             session.mount(self.api_url, adapter)
         else:
-            print(f"Error: Certificate file not found at {self.p12_file}")
+            log.error("Certificate file not found", extra={"fields": {"p12_file": self.p12_file}})
             sys.exit(1)
 
         session.headers.update({
             "Content-Type": "application/json"
         })
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
         return session
 
-    def _get_payload(self, name, image, site_name, port, container_registry_name, site_namespace):
+    def for_namespace(self, namespace):
+        """A manager for another namespace sharing this one's session, limiter and call log."""
+        self._get_session()
+        other = copy.copy(self)
+        other.namespace = namespace
+        return other
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _retry_delay(self, method, response, attempt):
+        """Seconds to wait before retrying ``response``, or None when it should not be retried."""
+        retryable = POST_RETRY_STATUSES if method == "POST" else RETRY_STATUSES
+        if attempt >= self.retries or response.status_code not in retryable:
+            return None
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+    def _send(self, session, method, url, attempt, **kwargs):
+        self.limiter.acquire()
+        _connect_timer.reset()
+        started = time.perf_counter()
+        response = None
+        try:
+            # verify per call: a session-level CA would lose to REQUESTS_CA_BUNDLE
+            response = session.request(method, url, timeout=self.timeout, verify=self.verify, **kwargs)
+            return response
+        finally:
+            total = time.perf_counter() - started
+            status = response.status_code if response is not None else None
+            throttled = status in RETRY_STATUSES
+            self.limiter.release(throttled, retry_after_seconds(response) if throttled else None)
+            self.calls.append({
+                "method": method,
+                "path": url[len(self.api_url):] if self.api_url and url.startswith(self.api_url) else url,
+                "status": status,
+                "attempt": attempt + 1,
+                "new_connection": _connect_timer.count > 0,
+                "connect_ms": round(_connect_timer.seconds * 1000, 1),
+                "api_ms": round((total - _connect_timer.seconds) * 1000, 1),
+                "total_ms": round(total * 1000, 1),
+            })
+
+    def _request(self, method, url, **kwargs):
+        return self._parse_response(self._request_response(method, url, **kwargs))
+
+    def _request_response(self, method, url, **kwargs):
+        """Send one API call on the pooled session, retrying 429/5xx with backoff; timings go to ``self.calls``."""
+        session = self._get_session()
+        attempt = 0
+        while True:
+            response = self._send(session, method, url, attempt, **kwargs)
+            delay = self._retry_delay(method, response, attempt)
+            if delay is None:
+                break
+            attempt += 1
+            time.sleep(delay)
+        response.raise_for_status()
+        return response
+
+    def timing_summary(self):
+        """Totals over every call so far: connection setup versus time spent in the API."""
+        calls = list(self.calls)
+        return {
+            "calls": len(calls),
+            "retries": sum(1 for c in calls if c["attempt"] > 1),
+            "new_connections": sum(1 for c in calls if c["new_connection"]),
+            "connect_ms": round(sum(c["connect_ms"] for c in calls), 1),
+            "api_ms": round(sum(c["api_ms"] for c in calls), 1),
+            "total_ms": round(sum(c["total_ms"] for c in calls), 1),
+        }
+
+    def _get_payload(self, name, image, site_name, port, container_registry_name, site_namespace, replicas=1):
+        # site_name may be a list to deploy one workload to several virtual sites
+        site_names = [site_name] if isinstance(site_name, str) else list(site_name)
         return {
             "metadata": {
                 "name": name,
@@ -89,7 +475,7 @@ class VolterraWorkloadManager:
             },
             "spec": {
                 "service": {
-                    "num_replicas": 1,
+                    "num_replicas": replicas,
                     "containers": [
                         {
                             "name": name,
@@ -113,10 +499,11 @@ class VolterraWorkloadManager:
                         "deploy_ce_virtual_sites": {
                             "virtual_site": [
                                 {
-                                    "namespace": "shared",
-                                    "name": site_name,
+                                    "namespace": site_namespace,
+                                    "name": site,
                                     "kind": "virtual_site"
                                 }
+                                for site in site_names
                             ]
                         }
                     },
@@ -145,67 +532,473 @@ class VolterraWorkloadManager:
         try:
             return response.json()
         except json.JSONDecodeError:
-            print(f"Error: Received non-JSON response (HTTP {response.status_code})")
-            # If it looks like HTML, print a snippet to help debug proxy/auth issues
-            if response.text.strip().startswith('<'):
-                print(f"Response snippet: {response.text[:200]}...")
-            else:
-                print(f"Raw response: {response.text[:500]}...")
+            # If it looks like HTML, log a snippet to help debug proxy/auth issues
+            limit = 200 if response.text.strip().startswith('<') else 500
+            log.error("Received non-JSON response", extra={"fields": {
+                "status": response.status_code, "body": response.text[:limit]}})
             raise
 
-    def create_workload(self, name, image, site_name, port, container_registry_name, site_namespace):
+    def create_workload(self, name, image, site_name, port, container_registry_name, site_namespace, replicas=1):
         url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads"
-        payload = self._get_payload(name, image, site_name, port, container_registry_name, site_namespace)
-        
-        session = self._get_session()
-        response = session.post(url, json=payload)
-        response.raise_for_status()
-        return self._parse_response(response)
+        payload = self._get_payload(name, image, site_name, port, container_registry_name, site_namespace, replicas)
+        return self._request("POST", url, json=payload)
 
-    def replace_workload(self, name, image, site_name, port, container_registry_name, site_namespace):
+    def replace_workload(self, name, image, site_name, port, container_registry_name, site_namespace, replicas=1):
         url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads/{name}"
-        payload = self._get_payload(name, image, site_name, port, container_registry_name, site_namespace)
-        
-        session = self._get_session()
-        response = session.put(url, json=payload)
-        response.raise_for_status()
-        return self._parse_response(response)
+        payload = self._get_payload(name, image, site_name, port, container_registry_name, site_namespace, replicas)
+        return self._request("PUT", url, json=payload)
+
+    def list_workloads(self):
+        """Name and resource version of every workload in the namespace; one call, no specs."""
+        url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads"
+        return self._request("GET", url).get('items') or []
 
     def get_workload(self, name):
         url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads/{name}"
-        session = self._get_session()
-        response = session.get(url)
-        response.raise_for_status()
-        return self._parse_response(response)
+        return self._request("GET", url)
+
+    def get_workload_status(self, name, etag=None):
+        """Status-only GET; returns (object, etag), or (None, etag) when the API answers 304 Not Modified."""
+        url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads/{name}"
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self._request_response("GET", url, params=STATUS_PARAMS, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        return self._parse_response(response), response.headers.get('ETag')
+
+    def wait_for_rollout(self, name, sites, timeout=600.0, since=None, accepted_at=None,
+                         initial_interval=WAIT_INITIAL_INTERVAL, max_interval=WAIT_MAX_INTERVAL):
+        """Poll the workload's status until every site is ready; returns the rollout timing breakdown.
+
+        Polls back off exponentially (with jitter) up to ``max_interval`` and
+        send If-None-Match, so an unchanged status costs a 304 without a body.
+        Times are ms since ``accepted_at`` (a time.monotonic() value, default
+        now). Raises RolloutTimeout once ``timeout`` seconds have passed.
+        """
+        accepted_at = time.monotonic() if accepted_at is None else accepted_at
+        deadline = accepted_at + timeout
+        timings = {"phase": "pending", "scheduled_ms": None, "ready_ms": None, "polls": 0, "not_modified": 0,
+                   "sites": {site: {"scheduled_ms": None, "ready_ms": None} for site in sites}}
+        phases = dict.fromkeys(sites, "pending")
+        etag = None
+        attempt = 0
+        while True:
+            obj, etag = self.get_workload_status(name, etag)
+            elapsed_ms = round((time.monotonic() - accepted_at) * 1000, 1)
+            timings["polls"] += 1
+            if obj is None:
+                timings["not_modified"] += 1
+            else:
+                phases = site_phases(obj, sites, since)
+            for site, phase in phases.items():
+                site_timings = timings["sites"][site]
+                if phase != "pending" and site_timings["scheduled_ms"] is None:
+                    site_timings["scheduled_ms"] = elapsed_ms
+                if phase == "ready" and site_timings["ready_ms"] is None:
+                    site_timings["ready_ms"] = elapsed_ms
+            timings["phase"] = min(phases.values(), key=ROLLOUT_PHASES.index, default="ready")
+            if timings["phase"] != "pending" and timings["scheduled_ms"] is None:
+                timings["scheduled_ms"] = elapsed_ms
+            if timings["phase"] == "ready":
+                timings["ready_ms"] = elapsed_ms
+                return timings
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RolloutTimeout(f"workload {name} not ready after {timeout:g}s ({timings['phase']})", timings)
+            interval = min(max_interval, initial_interval * 2 ** attempt)
+            time.sleep(min(remaining, random.uniform(interval / 2, interval)))
+            attempt += 1
 
     def delete_workload(self, name):
         url = f"{self.api_url}/config/namespaces/{self.namespace}/workloads/{name}"
-        session = self._get_session()
         payload = {
             "name": name,
             "namespace": self.namespace
         }
-        response = session.delete(url, json=payload)
-        response.raise_for_status()
-        return self._parse_response(response)
+        return self._request("DELETE", url, json=payload)
 
-    def upsert_workload(self, name, image, site_name, port, container_registry_name, site_namespace):
+    def plan_delete(self, name):
+        """One GET, then "would delete", or "absent" when there is no such workload."""
         try:
             self.get_workload(name)
-            action = "replaced"
-            result = self.replace_workload(name, image, site_name, port, container_registry_name, site_namespace)
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                action = "created"
-                result = self.create_workload(name, image, site_name, port, container_registry_name, site_namespace)
-            else:
+            if e.response.status_code != 404:
                 raise
-        return result, action
+            return "absent"
+        return "would delete"
+
+    def plan_workload(self, name, image, site_name, port, container_registry_name, site_namespace, replicas=1):
+        """One GET, then ("create" | "replace" | "unchanged", field changes, live object or None)."""
+        desired = workload_fields(self._get_payload(name, image, site_name, port, container_registry_name,
+                                                    site_namespace, replicas))
+        try:
+            live = self.get_workload(name)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != 404:
+                raise
+            return "create", diff_fields({}, desired), None
+        changes = diff_fields(workload_fields(live), desired)
+        return ("replace" if changes else "unchanged"), changes, live
+
+    def upsert_workload(self, name, image, site_name, port, container_registry_name, site_namespace, replicas=1,
+                        dry_run=False):
+        """Create or replace the workload only if it differs; returns (result, action, changes).
+
+        With ``dry_run`` nothing is written and the action is "would create" or "would replace".
+        """
+        plan, changes, live = self.plan_workload(name, image, site_name, port, container_registry_name,
+                                                 site_namespace, replicas)
+        if plan == "unchanged":
+            return live, "unchanged", changes
+        if dry_run:
+            return live, f"would {plan}", changes
+        if plan == "create":
+            result = self.create_workload(name, image, site_name, port, container_registry_name, site_namespace, replicas)
+            return result, "created", changes
+        result = self.replace_workload(name, image, site_name, port, container_registry_name, site_namespace, replicas)
+        return result, "replaced", changes
+
+MANIFEST_KEYS = ('api_url', 'tenant', 'namespace', 'name', 'image', 'sites', 'port', 'registry',
+                 'site_namespace', 'replicas', 'state')
+
+def manifest_defaults(env=None):
+    """Manifest defaults taken from the single-workload environment variables."""
+    env = os.environ if env is None else env
+    defaults = {
+        'api_url': env.get('F5XC_API_URL'),
+        'tenant': env.get('F5XC_TENANT'),
+        'namespace': env.get('F5XC_NAMESPACE'),
+        'image': env.get('IMAGE_REF'),
+        'registry': env.get('F5XC_REGISTRY_NAME'),
+        'port': env.get('F5XC_WORKLOAD_PORT'),
+        'site_namespace': env.get('F5XC_SITE_NAMESPACE', 'shared'),
+        'replicas': 1,
+        'state': 'present',
+    }
+    return {key: value for key, value in defaults.items() if value is not None}
+
+def parse_manifest(data, source='manifest', env=None):
+    """Expand a manifest document into one operation spec per workload (and per site for "{site}" names)."""
+    if not isinstance(data, dict) or not isinstance(data.get('workloads'), list):
+        raise ValueError(f"{source}: expected a mapping with a 'workloads' list")
+    defaults = dict(manifest_defaults(env), **(data.get('defaults') or {}))
+    specs = []
+    for index, entry in enumerate(data['workloads']):
+        where = f"{source}: workloads[{index}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected a mapping")
+        unknown = set(entry) - set(MANIFEST_KEYS) - {'site'}
+        if unknown:
+            raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+        spec = dict(defaults, **entry)
+        sites = spec.pop('site', None) or spec.get('sites')
+        spec['sites'] = [sites] if isinstance(sites, str) else list(sites or [])
+        missing = [key for key in ('api_url', 'tenant', 'namespace', 'name', 'sites') if not spec.get(key)]
+        if spec['state'] == 'present':
+            missing += [key for key in ('image', 'registry', 'port') if not spec.get(key)]
+        elif spec['state'] != 'absent':
+            raise ValueError(f"{where}: state must be 'present' or 'absent'")
+        if missing:
+            raise ValueError(f"{where}: missing {', '.join(missing)}")
+        spec['port'] = int(spec['port']) if spec.get('port') is not None else None
+        spec['replicas'] = int(spec['replicas'])
+        if '{site}' in spec['name']:
+            specs.extend(dict(spec, name=spec['name'].replace('{site}', site), sites=[site]) for site in spec['sites'])
+        else:
+            specs.append(spec)
+    seen = set()
+    for spec in specs:
+        key = (spec['api_url'], spec['namespace'], spec['name'])
+        if key in seen:
+            raise ValueError(f"{source}: workload {spec['name']} in namespace {spec['namespace']} is declared twice")
+        seen.add(key)
+    return specs
+
+def load_manifest(path, env=None):
+    import yaml  # only needed for apply
+    with open(path) as f:
+        return parse_manifest(yaml.safe_load(f), path, env)
+
+def error_fields(e):
+    """Log fields describing a failed operation: the error plus the API status and body, never headers."""
+    fields = {"error": str(e)}
+    if getattr(e, 'response', None) is not None:
+        fields["status"] = e.response.status_code
+        try:
+            fields["response"] = e.response.json()
+        except ValueError:
+            fields["response"] = e.response.text
+    return fields
+
+def apply_spec(manager, spec, dry_run=False, wait=None):
+    """Run (or with ``dry_run``, plan) one manifest operation; returns its result row (never raises).
+
+    With ``wait`` (seconds) an upserted workload is also polled until it is
+    ready on all its sites, and the row gets the rollout timings.
+    """
+    started = time.monotonic()
+    row = {"workload": spec['name'], "namespace": spec['namespace'], "sites": spec['sites'],
+           "host": urllib.parse.urlsplit(spec['api_url']).netloc}
+    try:
+        if spec['state'] == 'absent' and dry_run:
+            row["action"] = manager.plan_delete(spec['name'])
+        elif spec['state'] == 'absent':
+            try:
+                manager.delete_workload(spec['name'])
+                row["action"] = "deleted"
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code != 404:
+                    raise
+                row["action"] = "absent"
+        else:
+            result, row["action"], changes = manager.upsert_workload(
+                spec['name'], spec['image'], spec['sites'], spec['port'], spec['registry'],
+                spec['site_namespace'], spec['replicas'], dry_run=dry_run)
+            row["accept_ms"] = round((time.monotonic() - started) * 1000, 1)
+            if changes and row["action"] not in ("created", "would create"):
+                row["changes"] = format_diff(changes)
+            if wait is not None and not dry_run:
+                since = modification_timestamp(result) if row["action"] != "unchanged" else None
+                row["rollout"] = manager.wait_for_rollout(spec['name'], spec['sites'], wait, since=since)
+        row["ok"] = True
+    except Exception as e:
+        row.update(error_fields(e), action=row.get("action", "failed"), ok=False)
+        if isinstance(e, RolloutTimeout):
+            row["rollout"] = e.timings
+    row["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    log.info(f"{row['action']} {spec['name']}", extra={"fields": row})
+    return row
+
+def apply_manifest(specs, make_manager, parallel=16, dry_run=False, wait=None):
+    """Run every spec on a bounded thread pool; one manager (session + limiter) per API host and tenant.
+
+    ``make_manager(api_url, tenant, namespace)`` builds a manager. Rows come
+    back in manifest order, along with the managers that were used.
+    """
+    managers = {}
+    lock = threading.Lock()
+
+    def manager_for(spec):
+        key = (spec['api_url'], spec['tenant'])
+        with lock:
+            if key not in managers:
+                managers[key] = make_manager(spec['api_url'], spec['tenant'], spec['namespace'])
+            return managers[key].for_namespace(spec['namespace'])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(specs) or 1)), thread_name_prefix='apply') as pool:
+        rows = list(pool.map(lambda spec: apply_spec(manager_for(spec), spec, dry_run, wait), specs))
+    return rows, list(managers.values())
+
+def item_version(item):
+    """Version of a list item or object, to tell whether a snapshot entry is current (None: unknown)."""
+    return item.get('resource_version') or modification_timestamp(item)
+
+def default_snapshot_path(api_url, tenant):
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    host = urllib.parse.urlsplit(api_url or '').netloc.replace(':', '_')
+    return os.path.join(cache, 'f5xc-workload-manager', f"inventory-{host}-{tenant}.json")
+
+def load_snapshot(path):
+    """{"ns/name": {"resource_version", "fields"}} from a previous inventory, or {} if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f).get('workloads') or {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def save_snapshot(path, workloads):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({"workloads": workloads}, f, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def inventory(manager, namespaces, snapshot=None, parallel=16):
+    """Managed fields of every workload in ``namespaces``; returns (rows, stats).
+
+    Namespaces are listed concurrently. Only workloads whose resource version
+    is new or differs from ``snapshot`` are fetched (concurrently too), and
+    ``snapshot`` is updated in place so it can be saved for the next run.
+    """
+    snapshot = {} if snapshot is None else snapshot
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(namespaces))), thread_name_prefix='list') as pool:
+        listings = list(pool.map(lambda namespace: manager.for_namespace(namespace).list_workloads(), namespaces))
+    listed = {}
+    stale = []
+    for namespace, items in zip(namespaces, listings):
+        for item in items:
+            name = item.get('name') or (item.get('metadata') or {}).get('name')
+            key = f"{namespace}/{name}"
+            version = item_version(item)
+            listed[key] = (namespace, name)
+            cached = snapshot.get(key)
+            if version is None or cached is None or cached.get('resource_version') != version:
+                stale.append((key, namespace, name, version))
+    for key in [key for key in snapshot if key.split('/', 1)[0] in namespaces and key not in listed]:
+        del snapshot[key]
+
+    def fetch(entry):
+        key, namespace, name, version = entry
+        try:
+            obj = manager.for_namespace(namespace).get_workload(name)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                return key, None  # deleted since it was listed
+            raise
+        return key, {"resource_version": item_version(obj) or version, "fields": workload_fields(obj)}
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(stale))), thread_name_prefix='fetch') as pool:
+            for key, entry in pool.map(fetch, stale):
+                if entry is None:
+                    listed.pop(key)
+                    snapshot.pop(key, None)
+                else:
+                    snapshot[key] = entry
+    rows = [dict(namespace=namespace, name=name, resource_version=snapshot[key]["resource_version"],
+                 **snapshot[key]["fields"]) for key, (namespace, name) in sorted(listed.items())]
+    return rows, {"namespaces": len(namespaces), "workloads": len(rows), "fetched": len(stale),
+                  "cached": len(rows) - sum(1 for key, *_ in stale if key in listed)}
+
+def print_inventory(rows, stream=None):
+    stream = stream or sys.stdout
+    print(f"{'NAMESPACE':<16} {'WORKLOAD':<28} {'IMAGE':<48} {'REPLICAS':>8} {'PORT':>6}  SITES", file=stream)
+    for row in rows:
+        print(f"{row['namespace']:<16} {row['name']:<28} {row['image'] or '-':<48} {row['replicas']:>8} "
+              f"{row['port'] or '-':>6}  {','.join(site.split('/', 1)[-1] for site in row['sites'])}", file=stream)
+
+def print_results(rows, stream=None):
+    stream = stream or sys.stdout
+    print(f"{'WORKLOAD':<28} {'NAMESPACE':<16} {'SITES':<28} {'ACTION':<14} {'MS':>8}  DETAIL", file=stream)
+    for row in rows:
+        detail = row.get("changes", "") if row["ok"] else f"{row.get('status', '')} {row['error']}".strip()
+        if row["ok"] and row.get("rollout"):
+            detail = f"ready after {row['rollout']['ready_ms'] / 1000:.1f}s {detail}".strip()
+        print(f"{row['workload']:<28} {row['namespace']:<16} {','.join(row['sites']):<28} {row['action']:<14} "
+              f"{row['elapsed_ms']:>8.1f}  {detail}", file=stream)
+    failed = sum(1 for row in rows if not row["ok"])
+    print(f"{len(rows)} operations, {len(rows) - failed} succeeded, {failed} failed", file=stream)
+
+def manager_from_env(api_url, tenant, namespace, **overrides):
+    options = dict(
+        pool_size=int(os.getenv('F5XC_HTTP_POOL_SIZE', 4)),
+        keep_alive=os.getenv('F5XC_HTTP_KEEPALIVE', 'true').lower() != 'false',
+        timeout=float(os.getenv('F5XC_HTTP_TIMEOUT', 30)),
+        retries=int(os.getenv('F5XC_HTTP_RETRIES', 3)),
+    )
+    options.update(overrides)
+    return VolterraWorkloadManager(api_url, tenant, namespace, os.getenv('F5XC_API_P12_FILE'),
+                                   os.getenv('VES_P12_PASSWORD'), **options)
+
+def write_timings(path, data):
+    """Save rollout timings as JSON for CI to keep as an artifact and trend across releases."""
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+def log_api_timing(managers):
+    # Per-call timing: new connections (TCP + TLS handshake) versus API time
+    for manager in managers:
+        for call in manager.calls:
+            log.info("API call", extra={"fields": call})
+        summary = manager.timing_summary()
+        summary["throttled"] = manager.limiter.throttled
+        log.info("API timing", extra={"fields": dict(summary, host=urllib.parse.urlsplit(manager.api_url or '').netloc)})
+        manager.close()
+
+def run_apply(args):
+    missing = [v for v in ('F5XC_API_P12_FILE', 'VES_P12_PASSWORD') if not os.getenv(v)]
+    if missing:
+        log.error("Missing required environment variables", extra={"fields": {"missing": missing}})
+        sys.exit(1)
+    try:
+        specs = load_manifest(args.file)
+    except (OSError, ValueError) as e:
+        log.error("Invalid manifest", extra={"fields": {"manifest": args.file, "error": str(e)}})
+        sys.exit(1)
+
+    def make_manager(api_url, tenant, namespace):
+        # Enough pooled connections for every call the limiter lets through
+        return manager_from_env(api_url, tenant, namespace, pool_size=args.per_host, max_concurrency=args.per_host)
+
+    log.info(f"apply {len(specs)} workloads from {args.file}", extra={"fields": {
+        "operation": "apply", "manifest": args.file, "workloads": len(specs),
+        "parallel": args.parallel, "per_host": args.per_host, "dry_run": args.dry_run,
+        "wait": args.wait}})
+    started = time.monotonic()
+    managers = []
+    try:
+        rows, managers = apply_manifest(specs, make_manager, args.parallel, args.dry_run,
+                                        args.wait_timeout if args.wait else None)
+    finally:
+        log_api_timing(managers)
+    failed = [row for row in rows if not row["ok"]]
+    summary = {
+        "operation": "apply", "workloads": len(rows), "failed": len(failed),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "slowest_ms": max((row["elapsed_ms"] for row in rows), default=0.0)}
+    log.info("Apply finished", extra={"fields": summary})
+    if args.timings:
+        write_timings(args.timings, dict(summary, workloads=[
+            {key: row.get(key) for key in ("workload", "namespace", "sites", "action", "ok", "accept_ms", "rollout")}
+            for row in rows]))
+    print_results(rows)
+    if failed:
+        sys.exit(1)
+
+def run_inventory(args):
+    api_url, tenant = os.getenv('F5XC_API_URL'), os.getenv('F5XC_TENANT')
+    namespaces = [ns.strip() for ns in (args.namespaces or os.getenv('F5XC_NAMESPACE') or '').split(',') if ns.strip()]
+    missing = [v for v in ('F5XC_API_URL', 'F5XC_TENANT', 'F5XC_API_P12_FILE', 'VES_P12_PASSWORD') if not os.getenv(v)]
+    if not namespaces:
+        missing.append('F5XC_NAMESPACE (or --namespaces)')
+    if missing:
+        log.error("Missing required environment variables", extra={"fields": {"missing": missing}})
+        sys.exit(1)
+    snapshot_path = args.snapshot or default_snapshot_path(api_url, tenant)
+    snapshot = {} if args.refresh else load_snapshot(snapshot_path)
+    manager = manager_from_env(api_url, tenant, namespaces[0], pool_size=args.per_host, max_concurrency=args.per_host)
+    started = time.monotonic()
+    try:
+        rows, stats = inventory(manager, namespaces, snapshot, args.parallel)
+    except Exception as e:
+        log.error("Error during inventory", extra={"fields": dict(namespaces=namespaces, **error_fields(e))})
+        sys.exit(1)
+    finally:
+        log_api_timing([manager])
+    save_snapshot(snapshot_path, snapshot)
+    log.info("Inventory", extra={"fields": dict(stats, snapshot=snapshot_path,
+                                               elapsed_ms=round((time.monotonic() - started) * 1000, 1))})
+    if args.output == 'json':
+        print(json.dumps(rows, indent=2))
+    else:
+        print_inventory(rows)
 
 def main():
     parser = argparse.ArgumentParser(description='F5XC Workload Manager')
-    parser.add_argument('operation', choices=['create', 'replace', 'delete', 'get', 'upsert'], help='Operation to perform')
-    
+    parser.add_argument('operation', choices=['create', 'replace', 'delete', 'get', 'upsert', 'apply', 'inventory'], help='Operation to perform')
+    parser.add_argument('-f', '--file', help='Manifest for apply (YAML or JSON)')
+    parser.add_argument('--parallel', type=int, default=16, help='Operations run at once by apply and inventory')
+    parser.add_argument('--per-host', type=int, default=8, help='API calls in flight per host during apply and inventory')
+    parser.add_argument('--dry-run', action='store_true', help='Report what create/replace/delete/upsert/apply would change without writing')
+    parser.add_argument('--wait', action='store_true', help='After create/replace/upsert/apply, wait until the workload is ready on every site')
+    parser.add_argument('--wait-timeout', type=float, default=600.0, help='Seconds --wait gives a rollout before failing')
+    parser.add_argument('--timings', metavar='FILE', help='Write the rollout timing breakdown (--wait) as JSON')
+    parser.add_argument('--namespaces', help='Comma-separated namespaces for inventory (default F5XC_NAMESPACE)')
+    parser.add_argument('--output', choices=['table', 'json'], default='table', help='inventory output format')
+    parser.add_argument('--snapshot', metavar='FILE', help='inventory snapshot file (default under ~/.cache)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore the inventory snapshot and fetch every workload')
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.operation == 'apply':
+        if not args.file:
+            parser.error("apply requires -f/--file")
+        run_apply(args)
+        return
+    if args.operation == 'inventory':
+        run_inventory(args)
+        return
+
     # Required Environment variables
     required_vars = [
         'F5XC_API_URL', 'F5XC_TENANT', 
@@ -216,7 +1009,7 @@ def main():
     
     missing = [v for v in required_vars if not os.getenv(v)]
     if missing:
-        print(f"Error: Missing required environment variables: {', '.join(missing)}")
+        log.error("Missing required environment variables", extra={"fields": {"missing": missing}})
         sys.exit(1)
 
     api_url = os.getenv('F5XC_API_URL')
@@ -231,46 +1024,64 @@ def main():
     # Optional Environment variables with defaults
     site_namespace = os.getenv('F5XC_SITE_NAMESPACE', 'shared')
 
+    manager = manager_from_env(api_url, tenant, namespace)
 
-    p12_file = os.getenv('F5XC_API_P12_FILE')
-    p12_password = os.getenv('VES_P12_PASSWORD')
-
-    manager = VolterraWorkloadManager(api_url, tenant, namespace, p12_file, p12_password)
-    args = parser.parse_args()
-
+    fields = {"operation": args.operation, "workload": workload_name, "namespace": namespace}
+    if args.dry_run and args.operation != 'get':
+        fields["dry_run"] = True
+    log.info(f"{args.operation} workload {workload_name} in namespace {namespace}", extra={"fields": fields})
+    started = time.monotonic()
     try:
-        if args.operation == 'create':
-            print(f"Creating workload {workload_name} in namespace {namespace}...")
+        if args.dry_run and args.operation == 'delete':
+            result = None
+            action = manager.plan_delete(workload_name)
+        elif args.dry_run and args.operation in ('create', 'replace'):
+            result = None
+            action = f"would {args.operation}"
+        elif args.operation == 'create':
             result = manager.create_workload(workload_name, image_name, site_name, port, container_registry_name, site_namespace)
-            print(f"Action: created")
+            action = "created"
         elif args.operation == 'replace':
-            print(f"Replacing workload {workload_name} in namespace {namespace}...")
             result = manager.replace_workload(workload_name, image_name, site_name, port, container_registry_name, site_namespace)
-            print(f"Action: replaced")
+            action = "replaced"
         elif args.operation == 'get':
-            print(f"Getting workload {workload_name} in namespace {namespace}...")
             result = manager.get_workload(workload_name)
+            action = "fetched"
             print(json.dumps(result, indent=2))
         elif args.operation == 'delete':
-            print(f"Deleting workload {workload_name} in namespace {namespace}...")
             result = manager.delete_workload(workload_name)
-            print(f"Action: deleted")
+            action = "deleted"
         elif args.operation == 'upsert':
-            print(f"Upserting workload {workload_name} in namespace {namespace}...")
-            result, action = manager.upsert_workload(workload_name, image_name, site_name, port, container_registry_name, site_namespace)
-            print(f"Action: {action}")
-            
-    except Exception as e:
-        print(f"Error during {args.operation}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            # Avoid printing full response if it might contain sensitive info, but usually 
-            # F5XC errors are safe. However, the rule says "never log full headers".
+            result, action, changes = manager.upsert_workload(workload_name, image_name, site_name, port, container_registry_name,
+                                                              site_namespace, dry_run=args.dry_run)
+            if changes and action not in ('created', 'would create'):
+                log.info(f"Changes: {format_diff(changes)}", extra={"fields": dict(fields, changes={
+                    key: {"from": old, "to": new} for key, (old, new) in changes.items()})})
+        accepted_at = time.monotonic()
+        log.info(f"Action: {action}", extra={"fields": dict(fields, action=action,
+                                                              elapsed_ms=round((accepted_at - started) * 1000, 1))})
+        if args.wait and action in ('created', 'replaced', 'unchanged'):
+            rollout = {"accept_ms": round((accepted_at - started) * 1000, 1)}
             try:
-                error_data = e.response.json()
-                print(f"Response Error: {json.dumps(error_data, indent=2)}")
-            except:
-                print(f"Response Error: {e.response.text}")
+                rollout.update(manager.wait_for_rollout(
+                    workload_name, [site_name], args.wait_timeout, accepted_at=accepted_at,
+                    since=modification_timestamp(result) if action != 'unchanged' else None))
+            except RolloutTimeout as e:
+                rollout.update(e.timings)
+                raise
+            finally:
+                if args.timings:
+                    write_timings(args.timings, dict(fields, action=action, image=image_name, **rollout))
+            log.info(f"Rollout ready after {rollout['ready_ms'] / 1000:.1f}s", extra={"fields": dict(fields, **rollout)})
+
+    except Exception as e:
+        error = dict(fields, elapsed_ms=round((time.monotonic() - started) * 1000, 1), **error_fields(e))
+        if isinstance(e, RolloutTimeout):
+            error["rollout"] = e.timings
+        log.error(f"Error during {args.operation}", extra={"fields": error})
         sys.exit(1)
+    finally:
+        log_api_timing([manager])
 
 if __name__ == "__main__":
     main()